@@ -0,0 +1,98 @@
+"""編集された領域だけを再計算する処理（インクリメンタルな再生成）の計測
+
+監視中のファイルに四角い筆跡を描き足した場合を想定し、編集の大きさごとに
+差分の検出・プレビューのプロキシ更新・フル解像度のSDF更新の時間を計測して、全体の再計算と比較する。
+デコードの時間は含まない（編集の大きさによらず同じ）。部分更新の結果が全体の再計算と一致することも確認する。
+
+使用例:
+    python benchmarks/bench_incremental.py --sizes 8192 --edits 16 256 2048
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdf_incremental import find_changes  # noqa: E402
+from sdf_preview import PreviewProxy  # noqa: E402
+from sdf_processor import GENERATION_MODES, GeneratorSettings, SDFProcessor, generate_sdf  # noqa: E402
+
+DEFAULT_SIZES = (4096, 8192)
+DEFAULT_EDITS = (16, 256, 2048)
+
+
+def make_source(size: int) -> np.ndarray:
+    """左右で明るさの変わるグラデーション（不透明）"""
+    source = np.empty((size, size, 4), dtype=np.uint8)
+    source[:, :, :3] = (np.arange(size) * 256 // size).astype(np.uint8)[np.newaxis, :, np.newaxis]
+    source[:, :, 3] = 255
+    return source
+
+
+def paint(source: np.ndarray, edit: int, seed: int) -> np.ndarray:
+    """edit×edit の四角い筆跡を描き足した新しい画像（保存し直した画像のデコード結果に相当）"""
+    edited = source.copy()
+    rng = np.random.default_rng(seed)
+    top, left = (int(v) for v in rng.integers(0, source.shape[0] - edit, 2))
+    edited[top:top + edit, left:left + edit, :3] = rng.integers(0, 256)
+    return edited
+
+
+def run(size: int, edits: List[int], mode: str):
+    settings = GeneratorSettings(mode)
+    source = make_source(size)
+    processor = SDFProcessor()
+    processor.incremental = True
+    processor.reuse_buffers = True
+    processor.settings = settings
+    processor.gradient_image = source
+
+    start = time.perf_counter()
+    processor.process_sdf()
+    proxy = PreviewProxy(source)
+    full_seconds = time.perf_counter() - start
+    print(f"{size}×{size} {mode}: 全体の再計算 {full_seconds * 1000:.0f} ms")
+
+    for index, edit in enumerate(edits):
+        edited = paint(processor.gradient_image, edit, index)
+        start = time.perf_counter()
+        changes = find_changes(processor.gradient_image, edited)
+        diff_seconds = time.perf_counter() - start
+        proxy.update(edited, changes)
+        proxy_seconds = time.perf_counter() - start - diff_seconds
+        processor.gradient_image = edited
+        processor.process_sdf()
+        total_seconds = time.perf_counter() - start
+
+        if processor.last_changes is None or not np.array_equal(processor.result_image,
+                                                               generate_sdf(edited, settings)):
+            raise RuntimeError(f"{edit}px の編集で部分更新の結果が全体の再計算と一致しません")
+        if not np.array_equal(proxy.pixels, PreviewProxy(edited).pixels):
+            raise RuntimeError(f"{edit}px の編集でプロキシが作り直した結果と一致しません")
+        print(f"  編集 {edit}×{edit}: 合計 {total_seconds * 1000:.1f} ms（差分 {diff_seconds * 1000:.1f} ms, "
+              f"プロキシ {proxy_seconds * 1000:.1f} ms, SDF {(total_seconds - diff_seconds - proxy_seconds) * 1000:.1f} ms, "
+              f"全体の {full_seconds / total_seconds:.1f} 倍速）", flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="インクリメンタルな再生成の計測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="画像の一辺のピクセル数（既定: 4096 8192）")
+    parser.add_argument("--edits", type=int, nargs="+", default=list(DEFAULT_EDITS),
+                        help="描き足す四角の一辺のピクセル数（既定: 16 256 2048）")
+    parser.add_argument("--modes", nargs="+", choices=GENERATION_MODES, default=list(GENERATION_MODES),
+                        help="生成モード（既定: すべて）")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for mode in args.modes:
+            run(size, [edit for edit in args.edits if edit < size], mode)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""SDF生成カーネルの旧実装と新実装の処理時間比較
+
+使用例:
+    python benchmarks/bench_kernel.py --sizes 2048 4096 8192
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdf_processor import compute_sdf_texture  # noqa: E402
+
+
+def legacy_sdf_texture(source: np.ndarray) -> np.ndarray:
+    """比較用の旧実装（float64平均 → float32正規化 → uint8変換）"""
+    height, width = source.shape[:2]
+    alpha = source[:, :, 3]
+    mask = np.mean(source[:, :, :3], axis=2)
+    mask_normalized = mask.astype(np.float32) / 255.0
+    mask_flipped = np.fliplr(mask_normalized)
+    sdf_texture = np.zeros((height, width, 4), dtype=np.uint8)
+    sdf_texture[:, :, 0] = (mask_flipped * 255).astype(np.uint8)
+    sdf_texture[:, :, 1] = (mask_normalized * 255).astype(np.uint8)
+    sdf_texture[:, :, 2] = 0
+    sdf_texture[:, :, 3] = alpha
+    return sdf_texture
+
+
+def best_time(func, repeat: int) -> float:
+    """repeat回実行した中で最短の時間（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SDF生成カーネルのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 4096, 8192])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>6} {'legacy [s]':>11} {'fused [s]':>10} {'speedup':>8}")
+    for size in args.sizes:
+        source = rng.integers(0, 256, (size, size, 4), dtype=np.uint8)
+        out = np.empty((size, size, 4), dtype=np.uint8)
+        scratch = np.empty((size, size), dtype=np.uint16)
+
+        # 新実装が旧実装とビット単位で一致することを確認
+        if not np.array_equal(legacy_sdf_texture(source),
+                              compute_sdf_texture(source, out=out, scratch=scratch)):
+            raise SystemExit(f"{size}: 旧実装と結果が一致しません")
+
+        legacy = best_time(lambda: legacy_sdf_texture(source), args.repeat)
+        fused = best_time(lambda: compute_sdf_texture(source, out=out, scratch=scratch), args.repeat)
+        print(f"{size:>6} {legacy:>11.3f} {fused:>10.3f} {legacy / fused:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
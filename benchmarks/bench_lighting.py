@@ -0,0 +1,102 @@
+"""陰影プレビュー（光の角度のスライダー）の計測
+
+SDF結果から光の角度ごとの陰影を作る時間を、フル解像度の結果で浮動小数点の比較を行う場合と、
+表示サイズの結果で値ごとの対応表を引く場合（LightingPreview）で比較する。
+スライダーを端から端まで動かした場合の1回あたりの時間と、角度一覧を1回の配列演算でまとめて作る場合と
+1枚ずつ作る場合の時間も表示する。結果が比較用の実装と一致することも確認する。
+
+使用例:
+    python benchmarks/bench_lighting.py --size 4096
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdf_preview import (CONTACT_SHEET_ANGLES, LIGHT_ANGLE_LIMIT, LIT_COLOR, PREVIEW_MAX_SIZE,  # noqa: E402
+                         SHADOW_COLOR, LightingPreview, fit_image, shadow_threshold)
+from sdf_processor import SDFProcessor  # noqa: E402
+
+# 対話的とみなす1回あたりの時間（60fps）
+INTERACTIVE_MS = 1000 / 60
+
+
+def make_gradient(size: int) -> np.ndarray:
+    """顔の影のグラデーションに相当する画像（左から右へ明るくなり、外側は透明）"""
+    y, x = np.mgrid[:size, :size] / (size - 1)
+    gradient = np.zeros((size, size, 4), dtype=np.uint8)
+    gradient[:, :, :3] = (np.clip(x + 0.2 * np.sin(y * np.pi), 0, 1) * 255).astype(np.uint8)[:, :, None]
+    gradient[:, :, 3] = np.where((x - 0.5) ** 2 + (y - 0.5) ** 2 < 0.24, 255, 0)
+    return gradient
+
+
+def shade_reference(result: np.ndarray, angle: float, blur: float) -> np.ndarray:
+    """比較用: 画素ごとに浮動小数点でしきい値と比べる素朴な実装"""
+    angle = (angle + LIGHT_ANGLE_LIMIT) % (2 * LIGHT_ANGLE_LIMIT) - LIGHT_ANGLE_LIMIT
+    values = result[:, :, 0 if angle > 0 else 1].astype(np.float32) / 255
+    threshold = np.float32(shadow_threshold([angle])[0] * (1 + blur) - blur)
+    lit = np.clip((values - threshold) / np.float32(blur), 0, 1)[:, :, None]
+    lit_color, shadow_color = np.array(LIT_COLOR, np.float32), np.array(SHADOW_COLOR, np.float32)
+    shaded = np.empty(result.shape, dtype=np.uint8)
+    shaded[:, :, :3] = np.rint(shadow_color + (lit_color - shadow_color) * lit)
+    shaded[:, :, 3] = result[:, :, 3]
+    return shaded
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="陰影プレビュー（光の角度のスライダー）の計測")
+    parser.add_argument("--size", type=int, default=4096, help="画像の一辺のピクセル数（既定: 4096）")
+    parser.add_argument("--repeat", type=int, default=3, help="繰り返し回数（最小値を表示, 既定: 3）")
+    args = parser.parse_args()
+
+    processor = SDFProcessor()
+    processor.gradient_image = make_gradient(args.size)
+    processor.process_sdf()
+    result = processor.result_image
+    combined = processor.get_preview_channels(PREVIEW_MAX_SIZE)[2]
+    proxy = np.asarray(fit_image(combined, PREVIEW_MAX_SIZE))
+    lighting = LightingPreview(proxy)
+
+    # 対応表を引いた結果が素朴な実装と一致するか（浮動小数点の丸めで1段階ずれる画素は許容する）
+    for angle in (-135, -60, 0, 45, 90, 180):
+        difference = np.abs(lighting.render_batch([angle])[0].astype(np.int16) -
+                            shade_reference(proxy, angle, lighting.blur))
+        if difference.max() > 1:
+            print(f"{angle}度の陰影が比較用の実装と一致しません", file=sys.stderr)
+            return 1
+
+    angles = np.arange(-LIGHT_ANGLE_LIMIT, LIGHT_ANGLE_LIMIT + 1)
+    full_ms = best_time(lambda: shade_reference(result, 60, lighting.blur), args.repeat) * 1000
+    proxy_ms = best_time(lambda: [lighting.render(angle) for angle in angles], args.repeat) * 1000 / len(angles)
+    print(f"{args.size}×{args.size} → 表示サイズ {lighting.size[0]}×{lighting.size[1]}:")
+    print(f"  フル解像度で1角度 {full_ms:.1f} ms / 表示サイズで1角度 {proxy_ms:.2f} ms"
+          f"（{full_ms / proxy_ms:.0f} 倍速, {1000 / proxy_ms:.0f} fps 相当）")
+
+    sheet_angles = -LIGHT_ANGLE_LIMIT + np.arange(CONTACT_SHEET_ANGLES) * (2 * LIGHT_ANGLE_LIMIT
+                                                                          / CONTACT_SHEET_ANGLES)
+    batch_ms = best_time(lambda: lighting.render_batch(sheet_angles), args.repeat) * 1000
+    single_ms = best_time(lambda: [lighting.render_batch([angle]) for angle in sheet_angles], args.repeat) * 1000
+    print(f"  角度一覧（{CONTACT_SHEET_ANGLES} 角度）: まとめて {batch_ms:.2f} ms / 1枚ずつ {single_ms:.2f} ms")
+
+    if proxy_ms > INTERACTIVE_MS:
+        print(f"1角度あたり {INTERACTIVE_MS:.1f} ms（60fps）を超えています", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""行の帯による並列処理のスケーリング計測
+
+1枚の画像のSDF生成（gradient / distance）とPNGエンコードを、スレッド数を変えて計測し、
+1スレッドに対する速度向上率と並列化効率を表示する。
+PNGは帯ごとのエンコーダ（1スレッドでも帯に分けて順に圧縮する）で計測し、
+比較用に従来のOpenCVによるエンコード時間も記録する。
+並列の結果が1スレッドの結果と一致すること（PNGはデコードした画素が一致すること）も確認する。
+
+使用例:
+    python benchmarks/bench_parallel.py --sizes 4096 --threads 1 2 4 8
+    python benchmarks/bench_parallel.py --output parallel.json
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import environment, generate_source  # noqa: E402
+from sdf_io import load_image  # noqa: E402
+from sdf_output import PNGOptions, encode_png, encode_png_parallel  # noqa: E402
+from sdf_processor import GENERATION_MODE_DISTANCE, GeneratorSettings, generate_sdf  # noqa: E402
+
+RESULT_VERSION = 1
+
+DEFAULT_SIZES = (2048, 4096)
+TASKS = ("gradient", "distance", "png_fast", "png_default")
+
+
+def default_threads() -> List[int]:
+    """1 から CPUコア数までの2の累乗（コア数自体も含む）"""
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def png_level(task: str) -> int:
+    return 1 if task == "png_fast" else 6
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_size(source: np.ndarray, threads: List[int], repeat: int) -> Dict[str, dict]:
+    """1つの画像サイズで各処理をスレッド数ごとに計測"""
+    out = np.empty(source.shape[:2] + (4,), dtype=np.uint8)
+    scratch = np.empty(source.shape[:2], dtype=np.uint16)
+    sdf = generate_sdf(source)
+
+    def make_task(task: str, count: int) -> Callable[[], object]:
+        if task == "gradient":
+            return lambda: generate_sdf(source, GeneratorSettings(), out, scratch, threads=count)
+        if task == "distance":
+            return lambda: generate_sdf(source, GeneratorSettings(GENERATION_MODE_DISTANCE), out, scratch,
+                                        threads=count)
+        return lambda: encode_png_parallel(sdf, png_level(task), count)
+
+    results = {}
+    for task in TASKS:
+        reference = make_task(task, 1)()
+        timings = {}
+        for count in threads:
+            result = make_task(task, count)()
+            if task.startswith("png"):
+                matches = np.array_equal(np.array(Image.open(io.BytesIO(result))), sdf)
+                encoded_bytes = len(result)
+            else:
+                matches = np.array_equal(result, reference)
+                encoded_bytes = None
+            if not matches:
+                raise RuntimeError(f"{task}: {count} スレッドの結果が1スレッドと一致しません")
+            seconds = best_time(make_task(task, count), repeat)
+            timings[str(count)] = {"seconds": seconds, "bytes": encoded_bytes}
+
+        base = timings[str(threads[0])]["seconds"]
+        for count in threads:
+            timing = timings[str(count)]
+            timing["speedup"] = base / timing["seconds"]
+            timing["efficiency"] = timing["speedup"] * threads[0] / count
+        if task.startswith("png"):
+            timings["opencv"] = {"seconds": best_time(lambda: encode_png(sdf, PNGOptions(png_level(task))),
+                                                      repeat)}
+        results[task] = timings
+    return results
+
+
+def format_task(task: str, timings: Dict[str, dict]) -> str:
+    parts = [f"{count}T {t['seconds'] * 1000:.1f} ms (×{t['speedup']:.2f}, 効率 {t['efficiency'] * 100:.0f}%)"
+             for count, t in timings.items() if count != "opencv"]
+    if "opencv" in timings:
+        parts.append(f"OpenCV {timings['opencv']['seconds'] * 1000:.1f} ms")
+    return f"  {task}: " + " / ".join(parts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="行の帯による並列処理のスケーリング計測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="画像の一辺のピクセル数（既定: 2048 4096）")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help="計測するスレッド数（既定: 1 から CPUコア数までの2の累乗）")
+    parser.add_argument("--repeat", type=int, default=3, help="各計測の実行回数（最短の時間を記録）")
+    parser.add_argument("--output", help="結果をJSONで保存")
+    args = parser.parse_args()
+
+    threads = sorted(set(args.threads or default_threads()))
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="sdf_parallel_") as work_dir:
+        for size in args.sizes:
+            path = os.path.join(work_dir, f"alpha-{size}.png")
+            generate_source("alpha", size, path)
+            source = load_image(path).pixels
+            results[str(size)] = run_size(source, threads, max(args.repeat, 1))
+            print(f"{size}×{size}:")
+            for task, timings in results[str(size)].items():
+                print(format_task(task, timings), flush=True)
+
+    if (os.cpu_count() or 1) < max(threads):
+        print(f"注意: CPUコア数（{os.cpu_count()}）より多いスレッド数では速度は向上しません")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"version": RESULT_VERSION, "environment": environment(), "threads": threads,
+                       "sizes": results}, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
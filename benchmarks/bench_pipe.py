@@ -0,0 +1,119 @@
+"""パイプモード（生の画素データの受け渡し）とPNGを経由する受け渡しの比較
+
+フレーム列を `sdf_cli.py pipe` の標準入力へ流し込み、標準出力から結果を受け取った場合の
+スループットを計測する。比較として、同じフレームを1枚ずつ PNG に書き出し → 読み込み → SDF生成 →
+PNG で保存 → 次のツールが読み込む、というディスク経由の受け渡しの時間も計測する。
+パイプの結果が generate_sdf と一致することも確認する。
+
+使用例:
+    python benchmarks/bench_pipe.py --size 1024 --frames 120
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdf_io import decode_image  # noqa: E402
+from sdf_output import save_png  # noqa: E402
+from sdf_processor import GeneratorSettings, generate_sdf  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_frames(size: int, count: int) -> np.ndarray:
+    """円が少しずつ大きくなるグレーのマスク列（count×size×size×1）"""
+    y, x = np.mgrid[:size, :size]
+    radius = np.hypot(x - size / 2, y - size / 2)
+    frames = np.empty((count, size, size, 1), dtype=np.uint8)
+    for index in range(count):
+        frames[index, :, :, 0] = np.where(radius < size * (0.1 + 0.3 * index / max(count - 1, 1)), 255, 0)
+    return frames
+
+
+def run_pipe(frames: np.ndarray, mode: str, threads: int):
+    """パイプモードで処理し、(秒, 出力, 統計の表示) を返す"""
+    count, height, width = frames.shape[:3]
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "sdf_cli.py"), "pipe",
+                                "-s", f"{width}x{height}", "--pix-fmt", "gray", "--mode", mode,
+                                "--threads", str(threads)],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = np.empty((count, height, width, 4), dtype=np.uint8)
+
+    def feed():
+        for frame in frames:
+            process.stdin.write(frame.tobytes())
+        process.stdin.close()
+
+    # 起動時間を含めないよう、最初のフレームが返ってきてから計測を始める
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    view = memoryview(output).cast("B")
+    frame_bytes = output[0].nbytes
+    received = process.stdout.readinto(view[:frame_bytes])
+    while received < frame_bytes:
+        received += process.stdout.readinto(view[received:frame_bytes])
+    start = time.perf_counter()
+    while received < len(view):
+        count_read = process.stdout.readinto(view[received:])
+        if not count_read:
+            break
+        received += count_read
+    seconds = time.perf_counter() - start
+    feeder.join()
+    stats = process.stderr.read().decode("utf-8", "replace").strip()
+    if process.wait() != 0 or received != len(view):
+        raise RuntimeError(f"パイプ処理に失敗しました: {stats}")
+    return seconds * count / max(count - 1, 1), output, stats
+
+
+def run_png(frames: np.ndarray, mode: str, work_dir: str, limit: int) -> float:
+    """1フレームずつPNGを経由して受け渡した場合の1フレームあたりの時間"""
+    settings = GeneratorSettings(mode)
+    input_path = os.path.join(work_dir, "frame.png")
+    output_path = os.path.join(work_dir, "frame_SDF.png")
+    frames = frames[:limit]
+    start = time.perf_counter()
+    for frame in frames:
+        save_png(np.repeat(frame, 3, axis=2), input_path)           # 前のツールが書き出す
+        source = decode_image(np.fromfile(input_path, dtype=np.uint8), ".png").pixels
+        save_png(generate_sdf(source, settings), output_path)
+        decode_image(np.fromfile(output_path, dtype=np.uint8), ".png")  # 次のツールが読み込む
+    return (time.perf_counter() - start) / len(frames)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="パイプモードとPNGを経由する受け渡しの比較")
+    parser.add_argument("--size", type=int, default=1024, help="フレームの一辺のピクセル数（既定: 1024）")
+    parser.add_argument("--frames", type=int, default=60, help="フレーム数（既定: 60）")
+    parser.add_argument("--png-frames", type=int, default=10, help="PNG経由で計測するフレーム数（既定: 10）")
+    parser.add_argument("--mode", choices=("gradient", "distance"), default="gradient",
+                        help="生成モード（既定: gradient）")
+    parser.add_argument("--threads", type=int, default=1, help="パイプモードのスレッド数（既定: 1）")
+    args = parser.parse_args()
+
+    frames = make_frames(args.size, max(args.frames, 2))
+    seconds, output, stats = run_pipe(frames, args.mode, args.threads)
+    expected = generate_sdf(frames, GeneratorSettings(args.mode))
+    if not np.array_equal(output, expected):
+        raise RuntimeError("パイプの結果が generate_sdf と一致しません")
+    pipe_frame = seconds / len(frames)
+    frame_mb = (frames[0].nbytes + output[0].nbytes) / (1024 * 1024)
+    print(f"{args.size}×{args.size} {args.mode}: パイプ {pipe_frame * 1000:.2f} ms/フレーム"
+          f"（{1 / pipe_frame:.1f} fps, 入出力 {frame_mb / pipe_frame:.0f} MB/s）")
+    print("  " + stats.replace("\n", "\n  "))
+
+    with tempfile.TemporaryDirectory(prefix="sdf_pipe_") as work_dir:
+        png_frame = run_png(frames, args.mode, work_dir, max(args.png_frames, 1))
+    print(f"  PNG経由 {png_frame * 1000:.2f} ms/フレーム（パイプは {png_frame / pipe_frame:.1f} 倍速）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""SDF生成パイプライン全体のベンチマークと性能リグレッションの検出
+
+合成したグラデーション画像（不透明・アルファ多め・16bit）を使い、
+読み込み・SDF生成・チャンネル別プレビュー・保存の段階ごとに
+処理時間・メモリ確保量のピーク・ピークRSSを計測する。
+Tk を使わないため、ディスプレイのないビルドエージェントでも実行できる。
+
+使用例:
+    # ベースラインを作成
+    python benchmarks/bench_pipeline.py --output benchmarks/baseline.json
+    # ベースラインと比較し、20% 以上遅くなった段階があれば終了コード 1
+    python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json --threshold 0.2
+    # 大きな画像（16K は約 4 GB のメモリが必要）
+    python benchmarks/bench_pipeline.py --sizes 8192 16384 --kinds opaque --repeat 1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULT_VERSION = 1
+
+SOURCE_KINDS = ("opaque", "alpha", "16bit")
+DEFAULT_SIZES = (512, 1024, 2048, 4096)
+STAGES = ("load", "create_sdf", "preview", "save")
+
+# ソース画像を生成する帯の行数（16K でも作業用のメモリを抑える）
+_GENERATE_BAND_ROWS = 1024
+
+
+# ソース画像の生成
+
+def _gradient_band(rows: np.ndarray, size: int) -> np.ndarray:
+    """顔の陰影に似た、左右で明るさの変わるなめらかなグラデーション（0.0〜1.0）"""
+    x = np.linspace(0.0, 1.0, size, dtype=np.float32)[np.newaxis, :]
+    y = (rows.astype(np.float32) / max(size - 1, 1))[:, np.newaxis]
+    value = 0.8 * x + 0.2 * np.sin(np.float32(np.pi) * y) * (1.0 - x)
+    return np.clip(value, 0.0, 1.0)
+
+
+def _alpha_band(rows: np.ndarray, size: int) -> np.ndarray:
+    """楕円の外側が透明で、縁がなめらかなアルファ（約6割が透明）"""
+    x = np.linspace(-1.0, 1.0, size, dtype=np.float32)[np.newaxis, :]
+    y = (rows.astype(np.float32) / max(size - 1, 1) * 2.0 - 1.0)[:, np.newaxis]
+    radius = np.sqrt((x / 0.55) ** 2 + (y / 0.75) ** 2)
+    return np.clip((1.0 - radius) * 20.0, 0.0, 1.0)
+
+
+def generate_source(kind: str, size: int, path: str):
+    """合成グラデーションを PNG として保存（圧縮は弱めて生成時間を抑える）"""
+    depth = np.uint16 if kind == "16bit" else np.uint8
+    scale = float(np.iinfo(depth).max)
+    image = np.empty((size, size, 4), dtype=depth)
+    rng = np.random.default_rng(size)
+    for start in range(0, size, _GENERATE_BAND_ROWS):
+        rows = np.arange(start, min(start + _GENERATE_BAND_ROWS, size))
+        # 実際の描画に近づけるため、ごく弱いノイズでバンディングを崩す
+        noise = rng.random((len(rows), size), dtype=np.float32) * 2.0
+        gray = np.clip(_gradient_band(rows, size) * scale + noise, 0, scale).astype(depth)
+        image[start:start + len(rows), :, :3] = gray[:, :, np.newaxis]
+        if kind == "alpha":
+            image[start:start + len(rows), :, 3] = (_alpha_band(rows, size) * scale).astype(depth)
+        else:
+            image[start:start + len(rows), :, 3] = depth(scale)
+
+    ok, encoded = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    if not ok:
+        raise RuntimeError(f"ソース画像の生成に失敗しました: {kind} {size}")
+    encoded.tofile(path)
+
+
+# 計測（ケースごとに新しいプロセスで実行し、ピークRSSを分離する）
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _measure_allocations(func: Callable[[], object]) -> float:
+    """1回実行したときのメモリ確保量のピーク（MB。Pillow内部の確保は含まれない）"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(source_path: str, output_path: str, repeat: int) -> dict:
+    """1枚の画像で各段階を計測（子プロセスで実行される）"""
+    from sdf_processor import SDFProcessor
+
+    processor = SDFProcessor()
+    processor.reuse_buffers = True
+
+    def create_sdf():
+        processor.result_image = processor.create_sdf_from_gradient()
+
+    actions = {
+        # キャッシュを使わず、毎回ファイルからデコードする
+        "load": lambda: processor.load_gradient_image(source_path, use_cache=False),
+        "create_sdf": create_sdf,
+        "preview": processor.get_preview_channels,
+        "save": lambda: processor.save_result(output_path),
+    }
+
+    stages = {}
+    for name in STAGES:
+        action = actions[name]
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            action()
+            times.append(time.perf_counter() - start)
+        stages[name] = {
+            "seconds": min(times),
+            "first_seconds": times[0],
+            "peak_alloc_mb": _measure_allocations(action),
+            "peak_rss_mb": _peak_rss_mb(),   # この段階までのピーク
+        }
+        if name == "load" and processor.gradient_image is None:
+            raise RuntimeError(f"ソース画像を読み込めません: {source_path}")
+
+    return {"stages": stages, "peak_rss_mb": _peak_rss_mb(),
+            "output_bytes": os.path.getsize(output_path)}
+
+
+def run_cases(kinds: List[str], sizes: List[int], repeat: int, work_dir: str) -> Dict[str, dict]:
+    context = multiprocessing.get_context("spawn")
+    cases = {}
+    for size in sizes:
+        for kind in kinds:
+            name = f"{kind}-{size}"
+            source_path = os.path.join(work_dir, f"{name}.png")
+            if not os.path.exists(source_path):
+                print(f"{name}: ソース画像を生成中...", flush=True)
+                generate_source(kind, size, source_path)
+
+            # ピークRSSが前のケースの影響を受けないよう、ケースごとにプロセスを分ける
+            with context.Pool(1) as pool:
+                cases[name] = pool.apply(run_case, (source_path,
+                                                    os.path.join(work_dir, f"{name}_SDF.png"), repeat))
+            print(format_case(name, cases[name]), flush=True)
+    return cases
+
+
+# 結果の保存と比較
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def format_case(name: str, case: dict) -> str:
+    parts = [f"{stage} {m['seconds'] * 1000:.1f} ms / {m['peak_alloc_mb']:.0f} MB"
+             for stage, m in case["stages"].items()]
+    rss = case.get("peak_rss_mb")
+    rss_text = f", ピークRSS {rss:.0f} MB" if rss is not None else ""
+    return f"{name}: " + ", ".join(parts) + rss_text
+
+
+def compare(results: dict, baseline: dict, threshold: float,
+            min_delta_ms: float, min_delta_mb: float) -> List[str]:
+    """ベースラインより threshold（割合）を超えて悪化した項目を返す
+
+    小さい画像の時間は揺らぎが大きいため、差が min_delta_ms / min_delta_mb 未満なら無視する
+    """
+    regressions = []
+
+    def check(label: str, current, base, min_delta: float, unit: str):
+        if current is None or base is None:
+            return
+        if current > base * (1.0 + threshold) and current - base > min_delta:
+            regressions.append(f"{label}: {base:.1f} → {current:.1f} {unit}（{(current / base - 1) * 100:+.0f}%）")
+
+    for name, case in results["cases"].items():
+        base_case = baseline.get("cases", {}).get(name)
+        if base_case is None:
+            continue
+        for stage, metrics in case["stages"].items():
+            base = base_case["stages"].get(stage)
+            if base is None:
+                continue
+            check(f"{name} {stage} 時間", metrics["seconds"] * 1000, base["seconds"] * 1000, min_delta_ms, "ms")
+            check(f"{name} {stage} メモリ確保", metrics["peak_alloc_mb"], base["peak_alloc_mb"], min_delta_mb, "MB")
+        check(f"{name} ピークRSS", case.get("peak_rss_mb"), base_case.get("peak_rss_mb"), min_delta_mb, "MB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SDF生成パイプラインのベンチマークとリグレッション検出")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="画像の一辺のピクセル数（既定: 512 1024 2048 4096）")
+    parser.add_argument("--kinds", nargs="+", choices=SOURCE_KINDS, default=list(SOURCE_KINDS),
+                        help="ソース画像の種類（opaque: 不透明 / alpha: 透明部分が多い / 16bit: 16bit PNG）")
+    parser.add_argument("--repeat", type=int, default=3, help="各段階の実行回数（最短の時間を記録）")
+    parser.add_argument("--output", help="結果をJSONで保存（ベースラインとして使える）")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="悪化とみなす割合（既定: 0.2 = 20%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="これより小さい時間の差は無視する（既定: 5 ms）")
+    parser.add_argument("--min-delta-mb", type=float, default=8.0,
+                        help="これより小さいメモリの差は無視する（既定: 8 MB）")
+    parser.add_argument("--work-dir",
+                        help="ソース画像と出力の保存先（指定すると生成済みのソース画像を再利用し、終了後も残す）")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="sdf_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        cases = run_cases(args.kinds, args.sizes, max(args.repeat, 1), work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {"version": RESULT_VERSION, "environment": environment(),
+               "repeat": args.repeat, "cases": cases}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("environment", {}).get("platform") != results["environment"]["platform"]:
+            print("注意: ベースラインと実行環境が異なります")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms, args.min_delta_mb)
+        if regressions:
+            print(f"性能が悪化しました（{len(regressions)} 件）:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("ベースラインからの悪化はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
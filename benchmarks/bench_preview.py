@@ -0,0 +1,112 @@
+"""チャンネル別プレビューの作成と表示切り替えの計測
+
+大きな結果（既定は8K）からチャンネル別プレビューを作る時間を、フル解像度のまま作る場合と
+表示サイズに間引いたビューから作る場合で比較する。
+続いて、チャンネル表示の切り替えとウィンドウのサイズ変更を繰り返し、
+表示用画像（PhotoImage）のキャッシュを使い回した場合の1回あたりの時間とヒット数を表示する。
+ディスプレイのない環境では PhotoImage の代わりにバイト列への変換で計測する。
+
+使用例:
+    python benchmarks/bench_preview.py --sizes 8192
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sdf_preview import PREVIEW_MAX_SIZE, PhotoImageCache  # noqa: E402
+from sdf_processor import SDFProcessor  # noqa: E402
+
+DEFAULT_SIZES = (4096, 8192)
+CHANNELS = ("r_channel", "g_channel", "combined")
+# ウィンドウのサイズ変更を想定した表示サイズ（main.py と同じく20px単位）
+DISPLAY_SIZES = ((200, 200), (180, 140), (160, 120))
+
+
+def make_result(size: int) -> np.ndarray:
+    """SDF生成結果に相当するRGBA（R・G にグラデーション、A は不透明）"""
+    result = np.zeros((size, size, 4), dtype=np.uint8)
+    ramp = (np.arange(size) * 256 // size).astype(np.uint8)
+    result[:, :, 0] = ramp[::-1]
+    result[:, :, 1] = ramp
+    result[:, :, 3] = 255
+    return result
+
+
+def photo_factory() -> Callable:
+    """ディスプレイがあれば ImageTk.PhotoImage、なければバイト列への変換"""
+    try:
+        import tkinter
+        root = tkinter.Tk()
+        root.withdraw()
+    except Exception:
+        return lambda image: image.tobytes()
+    from PIL import ImageTk
+    # root を保持しないと PhotoImage を作成できない
+    factory = lambda image: ImageTk.PhotoImage(image, master=root)  # noqa: E731
+    factory.root = root
+    return factory
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(size: int, repeat: int, factory: Callable):
+    processor = SDFProcessor()
+    processor.result_image = make_result(size)
+
+    full_seconds = best_time(lambda: processor.get_preview_channels(), repeat)
+    view_seconds = best_time(lambda: processor.get_preview_channels(PREVIEW_MAX_SIZE), repeat)
+    print(f"{size}×{size}: プレビュー作成 フル解像度 {full_seconds * 1000:.1f} ms / "
+          f"間引いたビュー {view_seconds * 1000:.2f} ms（{full_seconds / view_seconds:.0f} 倍速）")
+
+    images = dict(zip(CHANNELS, processor.get_preview_channels(PREVIEW_MAX_SIZE)))
+    cache = PhotoImageCache(factory)
+    # 各表示サイズで1回ずつ表示しておく（初回の変換）
+    start = time.perf_counter()
+    for display_size in DISPLAY_SIZES:
+        for channel, image in images.items():
+            cache.get(1, channel, display_size, image)
+    first_seconds = (time.perf_counter() - start) / len(DISPLAY_SIZES)
+
+    def switch():
+        # チャンネル表示の切り替え（合成結果は常に表示）とサイズ変更
+        for display_size in DISPLAY_SIZES:
+            for channel in ("combined", "r_channel", "g_channel", "combined"):
+                cache.get(1, channel, display_size, images[channel])
+
+    hits_before = cache.hits
+    switch_seconds = best_time(switch, repeat) / (len(DISPLAY_SIZES) * 2)
+    print(f"  表示の切り替え・サイズ変更: 初回 {first_seconds * 1000:.2f} ms / "
+          f"キャッシュ使用時 {switch_seconds * 1e6:.1f} µs "
+          f"（ヒット {cache.hits - hits_before}, 変換 {cache.misses}）", flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="チャンネル別プレビューの作成と表示切り替えの計測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="結果画像の一辺のピクセル数（既定: 4096 8192）")
+    parser.add_argument("--repeat", type=int, default=5, help="各計測の実行回数（最短の時間を記録）")
+    args = parser.parse_args()
+
+    factory = photo_factory()
+    if not hasattr(factory, "root"):
+        print("注意: ディスプレイがないため、PhotoImage の代わりにバイト列への変換で計測します")
+    for size in args.sizes:
+        run(size, max(args.repeat, 1), factory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""連番の画像のストリーミング処理の計測
+
+円が少しずつ大きくなるマスクの連番PNGを作成し、1枚ずつ 読み込み → SDF生成 → 保存 を順に行う場合と、
+ストリーミングのパイプライン（sdf_sequence）で連番PNG・マルチページTIFFに出力する場合の時間を比較する。
+段階ごとの処理時間・待ち時間（背圧）と、フレーム数を変えたときのピークメモリ（tracemalloc）も表示し、
+メモリ使用量がフレーム数によらず一定であることを確認する。
+
+使用例:
+    python benchmarks/bench_sequence.py --size 1024 --frames 120
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipe import make_frames  # noqa: E402
+from sdf_output import save_png  # noqa: E402
+from sdf_processor import SDFProcessor, get_default_output_path  # noqa: E402
+from sdf_sequence import find_sequence, process_sequence  # noqa: E402
+
+# ピークメモリがこの倍率を超えて増えた場合は一定とみなさない
+MEMORY_GROWTH_LIMIT = 1.5
+
+
+def write_sequence(work_dir: str, size: int, count: int) -> str:
+    """連番PNGを作成し、連番の指定を返す"""
+    frames = make_frames(size, count)
+    for index, frame in enumerate(frames):
+        save_png(np.repeat(frame, 4, axis=2), os.path.join(work_dir, f"mask_{index + 1:04d}.png"))
+    return os.path.join(work_dir, "mask_%04d.png")
+
+
+def run_serial(pattern: str) -> float:
+    """1枚ずつ順に処理した場合の時間（従来のバッチ処理と同じ）"""
+    start = time.perf_counter()
+    for _, path in find_sequence(pattern):
+        processor = SDFProcessor()
+        processor.load_gradient_image(path, use_cache=False)
+        processor.process_sdf()
+        processor.save_result(get_default_output_path(path))
+    return time.perf_counter() - start
+
+
+def peak_memory(pattern: str, work_dir: str, limit: int) -> int:
+    """先頭の limit フレームだけを処理したときのピークメモリ（バイト）"""
+    limited_dir = os.path.join(work_dir, f"first_{limit}")
+    os.makedirs(limited_dir)
+    for _, path in find_sequence(pattern)[:limit]:
+        os.link(path, os.path.join(limited_dir, os.path.basename(path)))
+    tracemalloc.start()
+    try:
+        process_sequence(os.path.join(limited_dir, os.path.basename(pattern)),
+                         os.path.join(limited_dir, "out.tif"))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="連番の画像のストリーミング処理の計測")
+    parser.add_argument("--size", type=int, default=1024, help="フレームの一辺のピクセル数（既定: 1024）")
+    parser.add_argument("--frames", type=int, default=120, help="フレーム数（既定: 120）")
+    args = parser.parse_args()
+    count = max(args.frames, 8)
+
+    with tempfile.TemporaryDirectory(prefix="sdf_sequence_") as work_dir:
+        pattern = write_sequence(work_dir, args.size, count)
+        serial_seconds = run_serial(pattern)
+        print(f"{args.size}×{args.size} × {count} フレーム: 1枚ずつ順に処理 {serial_seconds:.2f} 秒"
+              f"（{count / serial_seconds:.1f} fps）")
+
+        for label, output in (("連番PNG", os.path.join(work_dir, "out", "sdf_%04d.png")),
+                              ("マルチページTIFF", os.path.join(work_dir, "sdf.tif"))):
+            result = process_sequence(pattern, output)
+            print(f"  パイプライン（{label}） {result.seconds:.2f} 秒（{serial_seconds / result.seconds:.2f} 倍速）")
+            print("    " + result.format().replace("\n", "\n    "))
+
+        small = peak_memory(pattern, work_dir, count // 4)
+        large = peak_memory(pattern, work_dir, count)
+        frame_mb = args.size * args.size * 4 / (1024 * 1024)
+        print(f"  ピークメモリ: {count // 4} フレーム {small / (1024 * 1024):.0f} MB / "
+              f"{count} フレーム {large / (1024 * 1024):.0f} MB（1フレーム {frame_mb:.0f} MB）")
+        if large > small * MEMORY_GROWTH_LIMIT:
+            print("メモリ使用量がフレーム数に応じて増えています", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
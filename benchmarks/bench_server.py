@@ -0,0 +1,127 @@
+"""常駐サーバーと1枚ごとのプロセス起動の比較
+
+同じ画像を、1枚ごとに `sdf_cli.py batch` を起動して処理した場合と、常駐サーバー（sdf_server）に
+クライアントから要求した場合で、1枚あたりの時間を計測する。
+サーバーはファイルのパスを渡す要求と画素データを送る要求の両方を計測し、
+複数のクライアントから同時に要求した場合のスループットとサーバーの統計も表示する。
+サーバーはこのプロセス内で起動する（ネットワークには接続しない）。
+
+使用例:
+    python benchmarks/bench_server.py --size 1024 --requests 20 --clients 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pipeline import generate_source  # noqa: E402
+from sdf_client import SDFClient  # noqa: E402
+from sdf_io import image_cache, load_image  # noqa: E402
+from sdf_processor import generate_sdf  # noqa: E402
+from sdf_server import SDFServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_cli(path: str, output_dir: str, count: int) -> float:
+    """1枚ごとにコマンドライン版を起動した場合の1枚あたりの時間"""
+    start = time.perf_counter()
+    for _ in range(count):
+        subprocess.run([sys.executable, os.path.join(ROOT, "sdf_cli.py"), "batch", path, "-j", "1",
+                        "-o", output_dir], check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / count
+
+
+def time_requests(address, count: int, request) -> float:
+    """1つの接続から順に要求した場合の1件あたりの時間"""
+    with SDFClient(*address) as client:
+        start = time.perf_counter()
+        for _ in range(count):
+            request(client)
+        return (time.perf_counter() - start) / count
+
+
+def time_concurrent(address, count: int, clients: int, request) -> float:
+    """clients 個の接続から同時に要求した場合のスループット（件/秒）"""
+    def run():
+        with SDFClient(*address) as client:
+            for _ in range(count):
+                request(client)
+
+    threads = [threading.Thread(target=run) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return count * clients / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="常駐サーバーと1枚ごとのプロセス起動の比較")
+    parser.add_argument("--size", type=int, default=1024, help="画像の一辺のピクセル数（既定: 1024）")
+    parser.add_argument("--requests", type=int, default=20, help="サーバーへの要求数（既定: 20）")
+    parser.add_argument("--cli-runs", type=int, default=3, help="コマンドライン版の起動回数（既定: 3）")
+    parser.add_argument("--clients", type=int, default=4, help="同時に接続するクライアント数（既定: 4）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="サーバーのワーカー数（既定: CPUコア数）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sdf_server_") as work_dir:
+        path = os.path.join(work_dir, f"alpha-{args.size}.png")
+        generate_source("alpha", args.size, path)
+        output_dir = os.path.join(work_dir, "out")
+        os.makedirs(output_dir)
+        source = load_image(path).pixels
+        image_cache.clear()
+
+        cli_seconds = time_cli(path, output_dir, max(args.cli_runs, 1))
+        print(f"{args.size}×{args.size}: コマンドライン版を1枚ごとに起動 {cli_seconds * 1000:.0f} ms/枚")
+
+        server = SDFServer(port=0, workers=args.workers, max_queue=args.clients * 2)
+        server.warm_up()
+        server.start()
+
+        output_path = os.path.join(output_dir, "server_SDF.png")
+        pixels = source.tobytes()
+        height, width = source.shape[:2]
+        try:
+            with SDFClient(*server.address) as client:
+                result = client.process_pixels(pixels, width, height)
+            if not np.array_equal(np.frombuffer(result.pixels, np.uint8).reshape(height, width, 4),
+                                  generate_sdf(source)):
+                raise RuntimeError("サーバーの結果が generate_sdf と一致しません")
+
+            file_seconds = time_requests(server.address, args.requests,
+                                         lambda client: client.process_file(path, output_path))
+            pixel_seconds = time_requests(server.address, args.requests,
+                                          lambda client: client.process_pixels(pixels, width, height))
+            print(f"  サーバー（パスを指定して保存） {file_seconds * 1000:.1f} ms/枚"
+                  f"（{cli_seconds / file_seconds:.1f} 倍速）")
+            print(f"  サーバー（画素データを送受信） {pixel_seconds * 1000:.1f} ms/枚")
+
+            throughput = time_concurrent(server.address, args.requests, args.clients,
+                                         lambda client: client.process_file(path, output_path))
+            print(f"  {args.clients} クライアントから同時に要求 {throughput:.1f} 枚/秒")
+
+            with SDFClient(*server.address) as client:
+                stats = client.stats()
+            latency = stats["latency_ms"]
+            print(f"  サーバーの統計: 処理 {stats['completed']} 件 / 拒否 {stats['rejected']} 件 / "
+                  f"応答時間 p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, p99 {latency['p99']:.1f} ms / "
+                  f"デコードのキャッシュ ヒット {stats['image_cache']['hits']}, "
+                  f"ミス {stats['image_cache']['misses']}")
+        finally:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
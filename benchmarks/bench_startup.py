@@ -0,0 +1,130 @@
+"""起動時間のベンチマーク
+
+新しいプロセスで各モジュールを読み込む時間を計測し、読み込んではいけない重いモジュール
+（Tk・OpenCV・watchdog）が読み込まれていないことを確認する。
+ディスプレイがある環境では、GUIのウィンドウが表示されるまでの時間も計測する。
+
+使用例:
+    python benchmarks/bench_startup.py --output startup_baseline.json
+    python benchmarks/bench_startup.py --baseline startup_baseline.json --threshold 0.3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULT_VERSION = 1
+
+# 計測対象 → (計測するコード, 読み込まれていてはいけないモジュール)
+# コードは終了時に経過時間を変数 elapsed に入れる
+TARGETS = {
+    "sdf_processor": ("import sdf_processor",
+                      ("cv2", "tkinter", "watchdog")),
+    "sdf_cli": ("import sdf_cli",
+                ("cv2", "tkinter", "watchdog")),
+    # ウィンドウが表示された時点で、OpenCVと watchdog はまだ読み込まれていないこと
+    "gui": ("import main\n"
+            "app = main.SDFTextureApp()\n"
+            "app.root.bind('<Map>', lambda e: app.root.quit() if e.widget is app.root else None, add='+')\n"
+            "app.root.mainloop()\n",
+            ("cv2", "watchdog")),
+}
+
+_RUNNER = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                   "loaded": [name for name in {forbidden!r} if name in sys.modules],
+                   "modules": len(sys.modules)}}))
+"""
+
+
+def has_display() -> bool:
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def measure(name: str, repeat: int) -> dict:
+    """新しいプロセスで repeat 回計測し、最短の時間を返す"""
+    code, forbidden = TARGETS[name]
+    script = _RUNNER.format(root=ROOT, code=code, forbidden=forbidden)
+    best: Optional[dict] = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                                   cwd=ROOT, timeout=120)
+        process_seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name}: 計測に失敗しました\n{completed.stderr}")
+        # GUIは起動時のログも出力するため、最後の行だけを読む
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        result["process_seconds"] = process_seconds
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    return best
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    """ベースラインより threshold（割合）を超えて遅くなった対象を返す"""
+    regressions = []
+    for name, result in results["targets"].items():
+        base = baseline.get("targets", {}).get(name)
+        if base is None:
+            continue
+        current, previous = result["seconds"] * 1000, base["seconds"] * 1000
+        if current > previous * (1.0 + threshold) and current - previous > min_delta_ms:
+            regressions.append(f"{name}: {previous:.0f} → {current:.0f} ms（{(current / previous - 1) * 100:+.0f}%）")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--targets", nargs="+", choices=tuple(TARGETS), default=None,
+                        help="計測対象（既定: すべて。ディスプレイがない環境では gui を除く）")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（最短の時間を記録）")
+    parser.add_argument("--output", help="結果をJSONで保存（ベースラインとして使える）")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON")
+    parser.add_argument("--threshold", type=float, default=0.3,
+                        help="悪化とみなす割合（既定: 0.3 = 30%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0,
+                        help="これより小さい時間の差は無視する（既定: 20 ms）")
+    args = parser.parse_args()
+
+    targets = args.targets or [name for name in TARGETS if name != "gui" or has_display()]
+    results: Dict[str, dict] = {}
+    failed = False
+    for name in targets:
+        result = results[name] = measure(name, max(args.repeat, 1))
+        print(f"{name}: {result['seconds'] * 1000:.0f} ms"
+              f"（プロセス全体 {result['process_seconds'] * 1000:.0f} ms, モジュール {result['modules']} 個）")
+        if result["loaded"]:
+            print(f"  読み込まれてはいけないモジュールが読み込まれています: {', '.join(result['loaded'])}")
+            failed = True
+
+    output = {"version": RESULT_VERSION, "python": sys.version.split()[0],
+              "platform": sys.platform, "targets": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(output, baseline, args.threshold, args.min_delta_ms)
+        for line in regressions:
+            print(f"起動が遅くなりました: {line}")
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
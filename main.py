@@ -1,36 +1,62 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import tkinter.font as tkfont
-from PIL import Image, ImageTk
+from PIL import Image
+import numpy as np
 import os
+import queue
+import sys
 import threading
 from pathlib import Path
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import time
 
-from sdf_processor import SDFProcessor
+from sdf_processor import SDFProcessor, get_default_output_path, is_dds_path
+from sdf_manifest import BuildManifest, default_manifest_path, output_settings
+from sdf_output import COMPRESSION_PRESETS, OutputResult, OutputWriter, save_png
+from sdf_mipmap import MipmapOptions
+import sdf_profile
+from sdf_preview import (LIGHT_ANGLE_LIMIT, LightingPreview, PhotoImageCache, PreviewPipeline, fit_image,
+                         light_contact_sheet, paste_photo_image)
+from sdf_watch import MultiFileWatcher
+from sdf_worker import ProcessingWorker
 
 
-class FileWatcher(FileSystemEventHandler):
-    """ファイル変更監視クラス"""
-    
-    def __init__(self, callback, file_path):
-        self.callback = callback
-        # パスを正規化（Windowsの大文字小文字とスラッシュを統一）
-        self.file_path = os.path.normpath(os.path.abspath(file_path))
-        self.last_modified = 0
-    
-    def on_modified(self, event):
-        if not event.is_directory:
-            # イベントパスも正規化して比較
-            event_path = os.path.normpath(os.path.abspath(event.src_path))
-            if event_path == self.file_path:
-                # 短時間での重複イベントを防ぐ
-                current_time = time.time()
-                if current_time - self.last_modified > 1.0:
-                    self.last_modified = current_time
-                    self.callback()
+# Windowsで利用可能な標準フォント（優先順）
+FONT_FAMILIES = [
+    "Yu Gothic UI",      # Windows 10/11の標準日本語フォント
+    "Meiryo UI",         # Windows 7/8の標準日本語フォント
+    "MS UI Gothic",      # 古いWindowsの標準フォント
+    "Segoe UI",          # Windows標準英語フォント
+    "Arial",             # 汎用フォント
+    "sans-serif"         # フォールバック
+]
+
+# ウィンドウを表示してから、フォントの検出と重いモジュールの読み込みを始めるまでの時間（ミリ秒）
+STARTUP_DEFER_MS = 100
+
+# プレビューの列数（元画像・合成結果・陰影）
+PREVIEW_COLUMNS = 3
+# 陰影プレビューの光の角度の初期値（度。正の値が右からの光）
+DEFAULT_LIGHT_ANGLE = 60
+
+# プレビュー枠のうち画像以外（枠の余白・タイトル）が占める大きさ（幅, 高さ）
+PREVIEW_CELL_MARGIN = (30, 70)
+# プレビューの表示サイズはこの単位に丸める（ウィンドウのサイズ変更でキャッシュを使い回せるように）
+PREVIEW_SIZE_STEP = 20
+PREVIEW_MIN_SIZE = 60
+# ウィンドウのサイズ変更が落ち着いてから表示サイズを更新するまでの時間（ミリ秒）
+PREVIEW_RESIZE_DELAY_MS = 100
+
+# フル解像度のSDF生成とPNGエンコードのスレッド数（1枚ずつ処理するため、帯に分けて全コアを使う）
+PARALLEL_THREADS = os.cpu_count() or 1
+
+
+def preload_modules():
+    """画像処理とファイル監視で使うモジュールを先に読み込む（最初の画像読み込みを待たせない）"""
+    try:
+        import cv2  # noqa: F401
+        import watchdog.observers  # noqa: F401
+    except Exception as e:
+        print(f"モジュール読み込みエラー: {e}")
 
 
 class SDFTextureApp:
@@ -46,17 +72,58 @@ class SDFTextureApp:
         self.root.title("SDF Texture Maker for lilToon")
         self.root.geometry("1200x800")
         
-        # Windowsの標準フォント設定（ルートウィンドウ作成後）
+        # フォント設定（ルートウィンドウ作成後。利用可能なフォントの検出はウィンドウ表示後に行う）
         self.setup_fonts()
         
-        # SDF処理クラス
+        # SDF処理クラス（フル解像度。保存時にのみバックグラウンドで処理する）
         self.processor = SDFProcessor()
-        
-        # ファイル監視
-        self.observer = None
+        self.processor.threads = PARALLEL_THREADS
+        # 監視中のファイルが編集された場合は、変更のあったタイルだけを再計算する
+        self.processor.incremental = True
+        # 結果は保存時にコピーされるため、出力バッファを使い回す
+        self.processor.reuse_buffers = True
+        self.full_res_key = None  # 現在のフル解像度結果の元になった入力と設定
+        
+        # プレビュー処理（表示サイズに縮小したプロキシ上で処理する）
+        self.preview = PreviewPipeline()
+        self.preview.incremental = True
+        
+        # バックグラウンド処理（processor と preview はワーカースレッドからのみ操作する）
+        # コールバックはキュー経由でUIスレッドに渡す
+        self.ui_callbacks = queue.Queue()
+        self.worker = ProcessingWorker(dispatch=self.ui_callbacks.put,
+                                       on_busy_changed=self.set_busy)
+        
+        # ワーカーで作成したプレビュー画像（表示サイズ）と、その版（作成するたびに増える）
+        self.rendered_previews = {}
+        self.preview_version = 0
+        # 表示用の PhotoImage（版・チャンネル・表示サイズごと）と、各枠に表示中のもの
+        self.photo_cache = PhotoImageCache()
+        self.displayed_photos = {}
+        self.preview_display_size = self.preview.max_size
+        self.resize_job = None
+        
+        # 陰影プレビュー（表示サイズの結果から光の角度ごとに作成し、PhotoImage は貼り付けて使い回す）
+        self.light_angle = ctk.DoubleVar(value=DEFAULT_LIGHT_ANGLE)
+        self.lighting = None
+        self.lighting_key = None
+        self.lighting_photo = None
+        self.lighting_job = None
+        
+        # 段階ごとの処理時間の計測（環境変数 SDF_PROFILE_LOG を指定するとJSON Linesのログも出力）
+        sdf_profile.enable(os.environ.get(sdf_profile.PROFILE_LOG_ENV))
+        self.profile_version = 0
+        
+        # PNGのエンコードと書き込み（ワーカーは書き込みを待たずに次の処理へ進む）
+        self.output_writer = OutputWriter()
+        
+        # ファイル監視（書き込み完了を検出してから通知される）
+        self.watcher = MultiFileWatcher(self.on_file_ready)
         self.auto_update = ctk.BooleanVar(value=True)  # デフォルトでオン
         self.overwrite_files = ctk.BooleanVar(value=True)
         self.show_channel_preview = ctk.BooleanVar(value=False)  # デフォルトはオフ
+        self.fast_compression = ctk.BooleanVar(value=False)
+        self.export_mipmaps = ctk.BooleanVar(value=False)
         
         # パス変数
         self.gradient_path = ctk.StringVar()
@@ -64,29 +131,33 @@ class SDFTextureApp:
         
         # プレビュー画像
         self.preview_images = {"original": None, "r_channel": None, 
-                             "g_channel": None, "combined": None}
+                             "g_channel": None, "combined": None, "lighting": None}
         
         # プレビューフレーム（後で参照するため）
         self.preview_frames = {}
         
         self.setup_ui()
+        self.process_ui_callbacks()
+        
+        # 時間のかかる処理は、ウィンドウを表示してから行う
+        self.root.after(STARTUP_DEFER_MS, self.load_optional_subsystems)
         
         # ウィンドウ閉じる時の処理
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
     def setup_fonts(self):
-        """Windowsの標準フォントを設定"""
-        # Windowsで利用可能な標準フォントを優先順位で定義
-        font_families = [
-            "Yu Gothic UI",      # Windows 10/11の標準日本語フォント
-            "Meiryo UI",         # Windows 7/8の標準日本語フォント
-            "MS UI Gothic",      # 古いWindowsの標準フォント
-            "Segoe UI",          # Windows標準英語フォント
-            "Arial",             # 汎用フォント
-            "sans-serif"         # フォールバック
-        ]
-        
-        # 利用可能なフォントファミリーを検出
+        """フォントを作成（フォント一覧の取得は遅いため、まずは最も可能性の高いフォントで作成する）"""
+        initial_font = FONT_FAMILIES[0] if sys.platform == "win32" else "Arial"
+        
+        # 各種フォントサイズのフォントオブジェクトを作成
+        self.font_large = ctk.CTkFont(family=initial_font, size=20, weight="bold")
+        self.font_medium = ctk.CTkFont(family=initial_font, size=16, weight="bold")
+        self.font_normal = ctk.CTkFont(family=initial_font, size=12, weight="bold")
+        self.font_small = ctk.CTkFont(family=initial_font, size=10)
+        self.font_body = ctk.CTkFont(family=initial_font, size=11)
+    
+    def detect_fonts(self):
+        """利用可能な標準フォントを検出し、作成済みのフォントに反映（表示中のウィジェットも更新される）"""
         try:
             available_fonts = tkfont.families()
         except Exception as e:
@@ -96,20 +167,23 @@ class SDFTextureApp:
         
         # 利用可能な最初のフォントを選択
         selected_font = "Arial"  # デフォルト
-        for font_family in font_families:
+        for font_family in FONT_FAMILIES:
             if font_family in available_fonts:
                 selected_font = font_family
                 break
         
-        # 各種フォントサイズのフォントオブジェクトを作成
-        self.font_large = ctk.CTkFont(family=selected_font, size=20, weight="bold")
-        self.font_medium = ctk.CTkFont(family=selected_font, size=16, weight="bold")
-        self.font_normal = ctk.CTkFont(family=selected_font, size=12, weight="bold")
-        self.font_small = ctk.CTkFont(family=selected_font, size=10)
-        self.font_body = ctk.CTkFont(family=selected_font, size=11)
+        if selected_font != self.font_body.cget("family"):
+            for font in (self.font_large, self.font_medium, self.font_normal,
+                         self.font_small, self.font_body):
+                font.configure(family=selected_font)
         
         print(f"使用フォント: {selected_font}")
     
+    def load_optional_subsystems(self):
+        """ウィンドウ表示後の初期化（フォントの検出と、OpenCV・watchdog の読み込み）"""
+        self.detect_fonts()
+        threading.Thread(target=preload_modules, name="SDFPreload", daemon=True).start()
+    
     def setup_ui(self):
         """UIを設定"""
         # メインフレーム
@@ -177,6 +251,18 @@ class SDFTextureApp:
                                            command=self.toggle_channel_preview)
         channel_preview_cb.pack(anchor="w", padx=10, pady=5)
         
+        # 高速保存チェックボックス（圧縮を弱めてファイルサイズより保存速度を優先）
+        fast_compression_cb = ctk.CTkCheckBox(output_section, text="高速保存（ファイルサイズ大）",
+                                             variable=self.fast_compression,
+                                             font=self.font_body)
+        fast_compression_cb.pack(anchor="w", padx=10, pady=5)
+        
+        # ミップマップ出力チェックボックス（距離場向けのフィルタで縮小）
+        mipmaps_cb = ctk.CTkCheckBox(output_section, text="ミップマップを出力",
+                                    variable=self.export_mipmaps,
+                                    font=self.font_body)
+        mipmaps_cb.pack(anchor="w", padx=10, pady=5)
+        
         # 出力パス
         output_frame = ctk.CTkFrame(output_section)
         output_frame.pack(fill="x", padx=10, pady=(5, 10))
@@ -192,6 +278,22 @@ class SDFTextureApp:
         ctk.CTkButton(path_frame, text="参照", width=60, font=self.font_body,
                      command=self.browse_output).pack(side="right", padx=(0, 5), pady=5)
         
+        # 陰影プレビューセクション（lilToonの顔影を光の角度ごとに確認）
+        lighting_section = ctk.CTkFrame(parent)
+        lighting_section.pack(fill="x", padx=10, pady=5)
+        
+        self.light_angle_label = ctk.CTkLabel(lighting_section, text=self.format_light_angle(),
+                                              font=self.font_normal)
+        self.light_angle_label.pack(anchor="w", padx=10, pady=(10, 5))
+        
+        light_slider = ctk.CTkSlider(lighting_section, from_=-LIGHT_ANGLE_LIMIT, to=LIGHT_ANGLE_LIMIT,
+                                     number_of_steps=2 * LIGHT_ANGLE_LIMIT, variable=self.light_angle,
+                                     command=self.on_light_angle_changed)
+        light_slider.pack(fill="x", padx=10, pady=5)
+        
+        ctk.CTkButton(lighting_section, text="角度一覧を保存", font=self.font_body,
+                     command=self.save_light_contact_sheet).pack(fill="x", padx=10, pady=(5, 10))
+        
         # 保存ボタン
         save_btn = ctk.CTkButton(parent, text="保存", height=35, font=self.font_body,
                                command=self.save_result)
@@ -200,7 +302,16 @@ class SDFTextureApp:
         # 名前をつけて保存ボタン
         save_as_btn = ctk.CTkButton(parent, text="名前をつけて保存", height=35, font=self.font_body,
                                   command=self.save_as_result)
-        save_as_btn.pack(fill="x", padx=10, pady=(5, 20))
+        save_as_btn.pack(fill="x", padx=10, pady=(5, 5))
+        
+        # 処理状態の表示
+        self.status_label = ctk.CTkLabel(parent, text="", font=self.font_small)
+        self.status_label.pack(anchor="w", padx=10, pady=(0, 0))
+        
+        # 直近の処理の段階別の時間（デコード・SDF生成・プレビュー・PNGエンコードなど）
+        self.profile_label = ctk.CTkLabel(parent, text="", font=self.font_small,
+                                          justify="left", wraplength=320)
+        self.profile_label.pack(anchor="w", padx=10, pady=(0, 20))
     
     def setup_preview_area(self, parent):
         """プレビューエリアを設定"""
@@ -216,50 +327,43 @@ class SDFTextureApp:
         self.setup_preview_layout()
     
     def setup_preview_layout(self):
-        """プレビューレイアウトを設定"""
-        # 既存のフレームをクリア
-        for widget in self.preview_container.winfo_children():
-            widget.destroy()
-        self.preview_frames.clear()
-        self.preview_images.clear()  # 画像ラベルも初期化
+        """プレビュー枠を作成（4つの枠を一度だけ作り、表示の切り替えは配置だけを変える）"""
+        self.setup_preview_frame(self.preview_container, "元画像", 0, 0, "original")
+        self.setup_preview_frame(self.preview_container, "Rチャンネル（右光源）", 0, 1, "r_channel")
+        self.setup_preview_frame(self.preview_container, "Gチャンネル（左光源）", 1, 0, "g_channel")
+        self.setup_preview_frame(self.preview_container, "合成結果", 1, 1, "combined")
+        self.setup_preview_frame(self.preview_container, "陰影（lilToon）", 0, 2, "lighting")
+        self.apply_preview_layout()
+        self.preview_container.bind("<Configure>", self.on_preview_resized, add="+")
+    
+    def apply_preview_layout(self):
+        """チャンネルプレビューの表示設定に合わせて枠を配置"""
+        for column in range(PREVIEW_COLUMNS):
+            self.preview_container.grid_columnconfigure(column, weight=1)
+        self.preview_container.grid_rowconfigure(0, weight=1)
         
         if self.show_channel_preview.get():
-            # 2x2グリッド（全プレビュー表示）
-            self.preview_container.grid_columnconfigure(0, weight=1)
-            self.preview_container.grid_columnconfigure(1, weight=1)
-            self.preview_container.grid_rowconfigure(0, weight=1)
+            # 2x3グリッド（全プレビュー表示。陰影は右列の2行にまたがる）
             self.preview_container.grid_rowconfigure(1, weight=1)
-            
-            # グリッドから不要な設定をクリア
-            for i in range(2, 4):
-                self.preview_container.grid_columnconfigure(i, weight=0)
-                self.preview_container.grid_rowconfigure(i, weight=0)
-            
-            # 各プレビュー枠
-            self.setup_preview_frame(self.preview_container, "元画像", 0, 0, "original")
-            self.setup_preview_frame(self.preview_container, "Rチャンネル（右光源）", 0, 1, "r_channel")
-            self.setup_preview_frame(self.preview_container, "Gチャンネル（左光源）", 1, 0, "g_channel")
-            self.setup_preview_frame(self.preview_container, "合成結果", 1, 1, "combined")
+            positions = {"original": (0, 0), "r_channel": (0, 1), "g_channel": (1, 0), "combined": (1, 1),
+                         "lighting": (0, 2)}
+            spans = {"lighting": 2}
         else:
-            # 1x2グリッド（元画像と合成結果のみ）
-            self.preview_container.grid_columnconfigure(0, weight=1)
-            self.preview_container.grid_columnconfigure(1, weight=1)
-            self.preview_container.grid_rowconfigure(0, weight=1)
-            
-            # グリッドから不要な設定をクリア
-            for i in range(2, 4):
-                self.preview_container.grid_columnconfigure(i, weight=0)
-            for i in range(1, 4):
-                self.preview_container.grid_rowconfigure(i, weight=0)
-            
-            # 元画像と合成結果のみ
-            self.setup_preview_frame(self.preview_container, "元画像", 0, 0, "original")
-            self.setup_preview_frame(self.preview_container, "合成結果", 0, 1, "combined")
+            # 1x3グリッド（元画像・合成結果・陰影）
+            self.preview_container.grid_rowconfigure(1, weight=0)
+            positions = {"original": (0, 0), "combined": (0, 1), "lighting": (0, 2)}
+            spans = {}
+        
+        for key, frame in self.preview_frames.items():
+            if key in positions:
+                row, col = positions[key]
+                frame.grid(row=row, column=col, rowspan=spans.get(key, 1), padx=5, pady=5, sticky="nsew")
+            else:
+                frame.grid_remove()
     
     def setup_preview_frame(self, parent, title, row, col, key):
         """個別のプレビューフレームを設定"""
         frame = ctk.CTkFrame(parent)
-        frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
         
         # タイトル
         ctk.CTkLabel(frame, text=title, font=self.font_normal).pack(pady=(10, 5))
@@ -273,20 +377,46 @@ class SDFTextureApp:
     
     def toggle_channel_preview(self):
         """チャンネルプレビュー表示の切り替え"""
-        self.setup_preview_layout()
+        self.apply_preview_layout()
         
-        # 既存の画像があれば再表示
-        if hasattr(self, 'processor') and self.processor.gradient_image is not None:
-            # 元画像のプレビューを更新
-            gradient_file = self.gradient_path.get()
-            if gradient_file and os.path.exists(gradient_file):
-                original_img = Image.open(gradient_file).convert('RGBA')
-                self.update_preview_image("original", original_img)
-        
-        # SDF結果があれば再表示
-        if hasattr(self, 'processor') and self.processor.result_image is not None:
+        # 既存の画像があれば再表示（キャッシュ済みの PhotoImage を使うため再計算しない）
+        self.update_preview_display_size()
+        self.update_all_previews()
+    
+    def on_preview_resized(self, event):
+        """プレビュー領域のサイズ変更（連続したサイズ変更は落ち着いてから1回だけ処理する）"""
+        if event.widget is not self.preview_container:
+            return
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(PREVIEW_RESIZE_DELAY_MS, self.on_preview_resize_settled)
+    
+    def on_preview_resize_settled(self):
+        self.resize_job = None
+        if self.update_preview_display_size():
             self.update_all_previews()
     
+    def update_preview_display_size(self):
+        """プレビュー枠の大きさから表示サイズを求める（変わった場合は True）"""
+        width = self.preview_container.winfo_width()
+        height = self.preview_container.winfo_height()
+        if width <= 1 or height <= 1:
+            # まだ表示されていない
+            return False
+        
+        rows = 2 if self.show_channel_preview.get() else 1
+        size = []
+        for available, margin, limit in ((width // PREVIEW_COLUMNS, PREVIEW_CELL_MARGIN[0], self.preview.max_size[0]),
+                                         (height // rows, PREVIEW_CELL_MARGIN[1], self.preview.max_size[1])):
+            # プロキシより大きくは表示しない
+            value = (available - margin) // PREVIEW_SIZE_STEP * PREVIEW_SIZE_STEP
+            size.append(min(max(value, PREVIEW_MIN_SIZE), limit))
+        size = tuple(size)
+        
+        changed = size != self.preview_display_size
+        self.preview_display_size = size
+        return changed
+    
     def browse_gradient(self):
         """グラデーション画像を選択"""
         file_path = filedialog.askopenfilename(
@@ -303,7 +433,7 @@ class SDFTextureApp:
         file_path = filedialog.asksaveasfilename(
             title="出力先を選択",
             defaultextension=".png",
-            filetypes=[("PNG画像", "*.png")]
+            filetypes=[("PNG画像", "*.png"), ("DDS（BC5圧縮）", "*.dds")]
         )
         if file_path:
             self.output_path.set(file_path)
@@ -312,55 +442,149 @@ class SDFTextureApp:
         """グラデーションパスに基づいて出力パスを更新"""
         gradient_file = self.gradient_path.get()
         if gradient_file:
-            path = Path(gradient_file)
-            output_file = path.parent / f"{path.stem}_SDF.png"
-            self.output_path.set(str(output_file))
+            # DDSで出力している場合は形式を引き継ぐ
+            extension = ".dds" if is_dds_path(self.output_path.get()) else ".png"
+            self.output_path.set(get_default_output_path(gradient_file, extension))
     
     def load_and_preview_gradient(self):
-        """グラデーション画像を読み込んでプレビュー表示"""
+        """グラデーション画像を読み込んでプレビュー表示（処理はバックグラウンドで行う）"""
         gradient_file = self.gradient_path.get()
         if not gradient_file or not os.path.exists(gradient_file):
             return
         
-        if self.processor.load_gradient_image(gradient_file):
-            # 元画像のプレビューを更新
-            original_img = Image.open(gradient_file).convert('RGBA')
-            self.update_preview_image("original", original_img)
-            
-            # 自動的にSDF処理を実行（初回は保存しない）
-            self.auto_generate_sdf(auto_save=False)
+        settings = self.processor.settings
+        
+        def on_done(images):
+            self.show_previews(images)
+            print("SDF テクスチャが自動生成されました")
             
             # ファイル監視が有効な場合、監視を開始
             if self.auto_update.get():
                 self.start_file_watching()
-        else:
+        
+        def on_error(e):
+            print(f"SDF自動生成エラー: {e}")
             messagebox.showerror("エラー", "グラデーション画像の読み込みに失敗しました")
+        
+        # 自動的にSDF処理を実行（初回は保存しない）
+        self.worker.submit(gradient_file,
+                           lambda job: self.build_previews(job, gradient_file, settings),
+                           on_done, on_error)
     
-    def auto_generate_sdf(self, auto_save=False):
-        """グラデーション画像指定時に自動でSDF生成"""
+    def build_previews(self, job, gradient_file, settings):
+        """縮小プロキシを読み込み、プレビュー画像を作成（ワーカースレッドで実行）"""
+        if not self.preview.load(gradient_file):
+            raise IOError("グラデーション画像の読み込みに失敗しました")
+        job.check_cancelled()
+        
+        if not self.preview.process(settings):
+            raise RuntimeError("SDF処理に失敗しました")
+        
+        # プロキシ（表示サイズ以下）から作るため、UIスレッドではPhotoImageの作成だけを行う
+        r_img, g_img, combined_img = self.preview.get_preview_channels()
+        return {"original": self.preview.get_original_image(), "r_channel": r_img,
+                "g_channel": g_img, "combined": combined_img}
+    
+    def has_result(self):
+        """保存できるSDF結果があるか（プレビューが生成済みか）"""
+        return self.rendered_previews.get("combined") is not None
+    
+    def ensure_full_resolution(self, job, gradient_file, settings):
+        """フル解像度のSDFを必要な場合だけ生成（入力と設定が前回と同じなら結果を使い回す。ワーカースレッドで実行）"""
+        stat = os.stat(gradient_file)
+        key = (gradient_file, stat.st_size, stat.st_mtime_ns, settings)
+        if key == self.full_res_key and self.processor.result_image is not None:
+            return
+        
+        self.full_res_key = None
+        self.processor.settings = settings
+        if not self.processor.load_gradient_image(gradient_file):
+            raise IOError("グラデーション画像の読み込みに失敗しました")
+        job.check_cancelled()
+        
+        if not self.processor.process_sdf():
+            raise RuntimeError("SDF処理に失敗しました")
+        self.full_res_key = key
+    
+    def get_output_options(self):
+        """PNG出力とミップマップの設定（UIスレッドで読む）"""
+        preset = COMPRESSION_PRESETS["fast" if self.fast_compression.get() else "default"]
+        return (preset._replace(threads=PARALLEL_THREADS),
+                MipmapOptions(enabled=self.export_mipmaps.get()))
+    
+    def save_full_resolution(self, job, gradient_file, output_file, settings, options):
+        """フル解像度のSDFを生成して書き込みを登録し、OutputResult の Future を返す（ワーカースレッドで実行）"""
+        self.ensure_full_resolution(job, gradient_file, settings)
+        job.check_cancelled()
+        
+        self.processor.output_options, self.processor.mipmap_options = options
+        return self.processor.save_result_async(output_file, self.output_writer)
+    
+    @staticmethod
+    def written_result(future, output_path) -> OutputResult:
+        """書き込みの結果（保存中に例外が発生した場合は失敗の OutputResult）"""
         try:
-            # SDF処理実行
-            if self.processor.process_sdf():
-                self.update_all_previews()
-                print("SDF テクスチャが自動生成されました")
-                
-                # 自動保存を実行（auto_saveがTrueの場合のみ）
-                if auto_save:
-                    output_file = self.output_path.get()
-                    if output_file:
-                        if self.processor.save_result(output_file):
-                            print(f"自動保存完了: {output_file}")
-                        else:
-                            print("自動保存に失敗しました")
-            else:
-                print("SDF自動生成に失敗しました")
-                
+            return future.result()
         except Exception as e:
-            print(f"SDF自動生成エラー: {str(e)}")
+            return OutputResult(output_path, False, 0.0, 0.0, 0, str(e))
+    
+    def when_written(self, future, output_path, on_written=None, on_failed=None):
+        """書き込み完了後に、結果（OutputResult）を渡してUIスレッドでコールバックを呼ぶ"""
+        def done(f):
+            result = self.written_result(f, output_path)
+            print(f"出力: {result.path}（エンコード {result.encode_seconds:.2f} 秒, "
+                  f"書き込み {result.write_seconds:.2f} 秒, {result.bytes_written / 1024:.0f} KB）")
+            callback = on_written if result.success else on_failed
+            if callback is not None:
+                self.ui_callbacks.put(lambda: callback(result))
+        future.add_done_callback(done)
+    
+    def submit_save(self, output_file, on_saved=None):
+        """フル解像度の生成と保存をバックグラウンドで実行し、書き込み完了後に on_saved を呼ぶ"""
+        gradient_file = self.gradient_path.get()
+        settings = self.processor.settings
+        options = self.get_output_options()
+        
+        def on_error(e):
+            print(f"保存エラー: {e}")
+            messagebox.showerror("エラー", "保存に失敗しました")
+        
+        self.worker.submit(("save", output_file),
+                           lambda job: self.save_full_resolution(job, gradient_file, output_file,
+                                                                 settings, options),
+                           lambda future: self.when_written(future, output_file, on_saved,
+                                                            lambda result: on_error(result.error)),
+                           on_error)
+    
+    def set_busy(self, busy):
+        """処理中表示の切り替え（UIスレッドで実行）"""
+        self.status_label.configure(text="処理中..." if busy else "")
+        self.root.configure(cursor="watch" if busy else "")
+    
+    def process_ui_callbacks(self):
+        """ワーカーから渡されたコールバックをUIスレッドで実行"""
+        try:
+            while True:
+                callback = self.ui_callbacks.get_nowait()
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"UI更新エラー: {e}")
+        except queue.Empty:
+            pass
+        self.update_profile_status()
+        self.root.after(30, self.process_ui_callbacks)
+    
+    def update_profile_status(self):
+        """新しい計測結果があれば段階別の時間の表示を更新（UIスレッドで実行）"""
+        version = sdf_profile.profiler.version
+        if version != self.profile_version:
+            self.profile_version = version
+            self.profile_label.configure(text=sdf_profile.profiler.format_status())
     
     def save_as_result(self):
         """名前をつけて保存"""
-        if self.processor.result_image is None:
+        if not self.has_result():
             messagebox.showerror("エラー", "保存する画像がありません。まずSDF処理を実行してください。")
             return
         
@@ -368,7 +592,7 @@ class SDFTextureApp:
         output_file = filedialog.asksaveasfilename(
             title="名前をつけて保存",
             defaultextension=".png",
-            filetypes=[("PNG画像", "*.png")],
+            filetypes=[("PNG画像", "*.png"), ("DDS（BC5圧縮）", "*.dds")],
             initialdir=os.path.dirname(self.output_path.get()) if self.output_path.get() else None,
             initialfile=os.path.basename(self.output_path.get()) if self.output_path.get() else "SDF_texture.png"
         )
@@ -376,21 +600,32 @@ class SDFTextureApp:
         if not output_file:
             return  # キャンセルされた場合
         
-        # 保存実行
-        if self.processor.save_result(output_file):
+        # 保存実行（フル解像度の処理はバックグラウンドで行う）
+        def on_saved(_):
             messagebox.showinfo("完了", f"保存が完了しました: {output_file}")
             # 出力パスを更新（次回のデフォルトとして使用）
             self.output_path.set(output_file)
-        else:
-            messagebox.showerror("エラー", "保存に失敗しました")
+        self.submit_save(output_file, on_saved)
+    
+    def show_previews(self, images):
+        """ワーカーで作成したプレビュー画像を表示（UIスレッドで実行）"""
+        self.rendered_previews = images
+        self.preview_version += 1
+        self.update_all_previews()
     
     def update_all_previews(self):
         """全プレビューを更新"""
-        if self.processor.result_image is None:
+        original_img = self.rendered_previews.get("original")
+        if original_img:
+            self.update_preview_image("original", original_img)
+        
+        if not self.has_result():
             return
         
-        # チャンネル別プレビューを取得
-        r_img, g_img, combined_img = self.processor.get_preview_channels()
+        # チャンネル別プレビューを取得（ワーカーで表示サイズに縮小済み）
+        r_img = self.rendered_previews.get("r_channel")
+        g_img = self.rendered_previews.get("g_channel")
+        combined_img = self.rendered_previews.get("combined")
         
         # プレビューを更新（表示設定に応じて）
         if self.show_channel_preview.get():
@@ -402,6 +637,8 @@ class SDFTextureApp:
         # 合成結果は常に表示
         if combined_img:
             self.update_preview_image("combined", combined_img)
+        
+        self.update_lighting_preview()
     
     def update_preview_image(self, key, pil_image):
         """プレビュー画像を更新"""
@@ -412,20 +649,77 @@ class SDFTextureApp:
         if key not in self.preview_images or self.preview_images[key] is None:
             return
         
-        # リサイズ（アスペクト比を保持）
-        display_size = (200, 200)
-        pil_image.thumbnail(display_size, Image.Resampling.LANCZOS)
-        
-        # CustomTkinter用に変換
-        photo = ImageTk.PhotoImage(pil_image)
+        # 同じ版・表示サイズの PhotoImage はキャッシュから使う（表示中なら何もしない）
+        photo = self.photo_cache.get(self.preview_version, key, self.preview_display_size, pil_image)
+        if self.displayed_photos.get(key) is photo:
+            return
         
         # ラベルを更新
         self.preview_images[key].configure(image=photo, text="")
         self.preview_images[key].image = photo  # 参照を保持
+        self.displayed_photos[key] = photo
+    
+    def format_light_angle(self):
+        angle = round(self.light_angle.get())
+        side = "正面" if angle == 0 else ("右" if angle > 0 else "左")
+        return f"光の角度: {angle:+d}°（{side}）"
+    
+    def on_light_angle_changed(self, value):
+        """スライダーの操作中は、溜まったイベントをまとめて最新の角度だけを描画する"""
+        self.light_angle_label.configure(text=self.format_light_angle())
+        if self.lighting_job is None:
+            self.lighting_job = self.root.after_idle(self.update_lighting_preview)
+    
+    def get_lighting_preview(self):
+        """表示サイズの陰影プレビュー（結果の版か表示サイズが変わった場合だけ作り直す）"""
+        combined_img = self.rendered_previews.get("combined")
+        if combined_img is None:
+            return None
+        key = (self.preview_version, self.preview_display_size)
+        if key != self.lighting_key:
+            self.lighting = LightingPreview(np.asarray(fit_image(combined_img, self.preview_display_size)))
+            self.lighting_key = key
+        return self.lighting
+    
+    def update_lighting_preview(self):
+        """現在の光の角度で陰影プレビューを更新（UIスレッドで実行）"""
+        self.lighting_job = None
+        lighting = self.get_lighting_preview()
+        if lighting is None or self.preview_images.get("lighting") is None:
+            return
+        
+        photo = paste_photo_image(self.lighting_photo, lighting.render(self.light_angle.get()))
+        if photo is not self.lighting_photo:
+            self.preview_images["lighting"].configure(image=photo, text="")
+            self.preview_images["lighting"].image = photo  # 参照を保持
+            self.lighting_photo = photo
+    
+    def save_light_contact_sheet(self):
+        """一周の光の角度の陰影を並べた画像を保存（プレビューの解像度）"""
+        if not self.has_result():
+            messagebox.showerror("エラー", "保存する画像がありません。まずSDF処理を実行してください。")
+            return
+        
+        gradient_file = self.gradient_path.get()
+        output_file = filedialog.asksaveasfilename(
+            title="角度一覧を保存",
+            defaultextension=".png",
+            filetypes=[("PNG画像", "*.png")],
+            initialdir=os.path.dirname(gradient_file) if gradient_file else None,
+            initialfile=f"{Path(gradient_file).stem}_lighting.png" if gradient_file else "lighting.png"
+        )
+        if not output_file:
+            return
+        
+        sheet = light_contact_sheet(LightingPreview(np.asarray(self.rendered_previews["combined"])))
+        if save_png(np.asarray(sheet), output_file).success:
+            messagebox.showinfo("完了", f"保存が完了しました: {output_file}")
+        else:
+            messagebox.showerror("エラー", "角度一覧の保存に失敗しました")
     
     def save_result(self):
         """結果を保存"""
-        if self.processor.result_image is None:
+        if not self.has_result():
             messagebox.showerror("エラー", "保存する画像がありません。まずSDF処理を実行してください。")
             return
         
@@ -439,11 +733,10 @@ class SDFTextureApp:
             if not messagebox.askyesno("確認", f"ファイル '{output_file}' が既に存在します。上書きしますか？"):
                 return
         
-        # 保存実行
-        if self.processor.save_result(output_file):
+        # 保存実行（フル解像度の処理はバックグラウンドで行う）
+        def on_saved(_):
             messagebox.showinfo("完了", f"保存が完了しました: {output_file}")
-        else:
-            messagebox.showerror("エラー", "保存に失敗しました")
+        self.submit_save(output_file, on_saved)
     
     def toggle_auto_update(self):
         """自動更新の切り替え"""
@@ -460,14 +753,11 @@ class SDFTextureApp:
             messagebox.showwarning("警告", "グラデーション画像が指定されていません")
             return
         
-        self.stop_file_watching()  # 既存の監視を停止
-        
         try:
-            self.observer = Observer()
-            event_handler = FileWatcher(self.auto_process, gradient_file)
-            watch_dir = os.path.dirname(gradient_file)
-            self.observer.schedule(event_handler, watch_dir, recursive=False)
-            self.observer.start()
+            # 監視対象を現在の画像に切り替える（Observer は起動したまま使い回す）
+            self.watcher.unwatch_all()
+            self.watcher.watch_file(gradient_file)
+            self.watcher.start()
             print(f"ファイル監視開始: {gradient_file}")
         except Exception as e:
             messagebox.showerror("エラー", f"ファイル監視の開始に失敗しました: {str(e)}")
@@ -475,52 +765,87 @@ class SDFTextureApp:
     
     def stop_file_watching(self):
         """ファイル監視を停止"""
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
-            self.observer = None
+        if self.watcher.running:
+            self.watcher.stop()
             print("ファイル監視停止")
+            stats = self.watcher.stats.format()
+            if stats:
+                print(stats)
+    
+    def on_file_ready(self, path, saved_at):
+        """監視中のファイルの書き込みが完了した（監視スレッドから呼ばれる）"""
+        # Tkの変数を読むため、ジョブの登録はUIスレッドで行う
+        self.ui_callbacks.put(lambda: self.submit_auto_process(saved_at))
     
-    def auto_process(self):
-        """自動処理実行（ファイル変更時の自動更新）"""
-        def process():
+    def submit_auto_process(self, saved_at):
+        """自動処理ジョブを登録（連続した変更は1件にまとめ、処理中の古いジョブは中止される）"""
+        gradient_file = self.gradient_path.get()
+        output_file = self.output_path.get()
+        settings = self.processor.settings
+        options = self.get_output_options()
+        png_options, mipmap_options = options
+        outputs = output_settings(png_options, self.processor.dds_options if is_dds_path(output_file) else None,
+                                  mipmap_options)
+        
+        def process(job):
             try:
-                time.sleep(0.5)  # ファイル書き込み完了を待つ
-                
-                # グラデーション画像を再読み込み
-                gradient_file = self.gradient_path.get()
-                if not self.processor.load_gradient_image(gradient_file):
-                    print("自動処理: グラデーション画像の読み込みに失敗しました")
+                return regenerate(job)
+            except IOError:
+                # 書き込み途中の画像を読んだ場合は、書き込み完了の判定からやり直す
+                if self.watcher.retry(gradient_file, saved_at):
+                    print("自動処理: 画像を読み込めないため再試行します")
+                    return
+                raise
+        
+        def regenerate(job):
+            # 内容が変わっていない上書き保存などでは再生成しない
+            manifest = None
+            input_state = None
+            if output_file:
+                manifest = BuildManifest(default_manifest_path(output_file))
+                up_to_date, input_state = manifest.check(gradient_file, output_file, settings, outputs)
+                if up_to_date:
+                    print("自動処理: 入力に変更がないためスキップしました")
                     return
-                
-                # 元画像のプレビューを更新
-                original_img = Image.open(gradient_file).convert('RGBA')
-                self.update_preview_image("original", original_img)
-                
-                # SDF処理実行
-                if self.processor.process_sdf():
-                    self.update_all_previews()
-                    print("自動処理: SDF テクスチャが再生成されました")
-                    
-                    # 自動保存（ファイル変更時は自動保存する）
-                    output_file = self.output_path.get()
-                    if output_file:
-                        if self.processor.save_result(output_file):
-                            print(f"自動保存完了: {output_file}")
-                        else:
-                            print("自動保存に失敗しました")
-                else:
-                    print("自動処理: SDF処理に失敗しました")
-                    
-            except Exception as e:
-                print(f"自動処理エラー: {e}")
-        
-        # UIスレッドで実行
-        self.root.after(100, process)
+            
+            # プレビューを先に更新（プレビュー解像度）
+            images = self.build_previews(job, gradient_file, settings)
+            self.ui_callbacks.put(lambda: self.show_previews(images))
+            fraction = self.preview.changed_fraction()
+            if fraction is not None:
+                print(f"自動処理: 変更のあった {len(self.preview.last_changes)} 領域"
+                      f"（画像の {fraction:.1%}）だけを再計算しました")
+            else:
+                print("自動処理: SDF テクスチャが再生成されました")
+            
+            # 自動保存（ファイル変更時は自動保存する。書き込みは待たずにジョブを終える）
+            if output_file:
+                future = self.save_full_resolution(job, gradient_file, output_file, settings, options)
+                future.add_done_callback(lambda f: on_written(self.written_result(f, output_file),
+                                                              manifest, input_state))
+        
+        def on_written(result, manifest, input_state):
+            # 書き込みスレッドで実行される
+            if not result.success:
+                print(f"自動処理エラー: {result.error}")
+                return
+            manifest.record(gradient_file, output_file, settings, input_state, outputs)
+            manifest.save()
+            latency = self.watcher.record_output(saved_at)
+            print(f"自動保存完了: {output_file}（保存から {latency:.2f} 秒）")
+        
+        def on_error(e):
+            print(f"自動処理エラー: {e}")
+        
+        self.worker.submit(gradient_file, process, None, on_error)
     
     def on_closing(self):
         """アプリ終了時の処理"""
         self.stop_file_watching()
+        # 保存中のジョブと書き込み待ちの出力があれば終了を待つ
+        self.worker.shutdown(timeout=5.0)
+        self.output_writer.close(timeout=10.0)
+        sdf_profile.disable()
         self.root.destroy()
     
     def run(self):
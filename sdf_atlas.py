@@ -0,0 +1,182 @@
+"""アトラス（複数の顔やキャラクターを1枚に並べたテクスチャ）の領域ごとの左右反転
+
+Rチャンネルの左右反転を画像全体ではなく、各領域の中心で行う。
+領域は矩形のリスト（JSON）か、ラベル画像（領域ごとに色を塗り分けた画像。黒と透明は領域外）で指定する。
+領域外の画素は反転しない。
+
+反転の手順（領域ごとのスライスと、ラベル指定の場合は領域に属する画素のマスク）は配置ごとに
+一度だけ作成してキャッシュするため、同じ配置の2回目以降は単純なコピーとほぼ同じ時間で済む。
+（画素ごとの参照先インデックスによる収集は、スライスのコピーより約5倍遅い）
+
+矩形のJSONの形式（width・height は座標の基準となる画像サイズ）:
+    {"width": 2048, "height": 2048, "regions": [[x, y, 幅, 高さ], ...]}
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sdf_io import load_image
+
+
+# 配置のキャッシュに保持する数（プレビューとフル解像度で別のサイズになる）
+_CACHE_ENTRIES = 8
+
+
+class MirrorRegion(NamedTuple):
+    """左右反転する1つの領域（境界矩形）"""
+    top: int
+    bottom: int
+    left: int
+    right: int
+    select: Optional[np.ndarray]  # ラベル指定の場合、境界矩形内で領域に属する画素（矩形全体なら None）
+
+
+class AtlasLayout:
+    """アトラス内の領域の配置と、領域ごとの左右反転の手順"""
+
+    def __init__(self, shape: Tuple[int, int], regions: List[MirrorRegion], covers_all: bool):
+        self.shape = shape
+        self.regions = regions
+        self.covers_all = covers_all  # 領域が画像全体を覆う（領域外のコピーが不要）
+
+    @classmethod
+    def from_rects(cls, rects: Sequence[Sequence[int]], shape: Tuple[int, int]) -> "AtlasLayout":
+        """矩形 (x, y, 幅, 高さ) のリストから作成（矩形は画像内に収まり、重ならないこと）"""
+        height, width = shape
+        coverage = np.zeros(shape, dtype=np.uint16)
+        regions = []
+        for rect in rects:
+            x, y, w, h = (int(v) for v in rect)
+            if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > width or y + h > height:
+                raise ValueError(f"領域が画像の範囲外です: {tuple(rect)}（画像 {width}×{height}）")
+            coverage[y:y + h, x:x + w] += 1
+            regions.append(MirrorRegion(y, y + h, x, x + w, None))
+        if regions and coverage.max() > 1:
+            raise ValueError("領域が重なっています")
+        return cls(shape, regions, bool(regions) and bool(coverage.min() == 1))
+
+    @classmethod
+    def from_labels(cls, labels: np.ndarray) -> "AtlasLayout":
+        """ラベル配列（H×W の整数, 0 は領域外）から作成（各ラベルは境界矩形の中心で反転する）"""
+        if labels.ndim != 2 or labels.dtype.kind not in "iu":
+            raise ValueError("ラベルは H×W の整数配列である必要があります")
+        if labels.size and labels.min() < 0:
+            raise ValueError("ラベルは0以上である必要があります")
+
+        height, width = labels.shape
+        count = int(labels.max()) + 1 if labels.size else 1
+        # 各ラベルが現れる行と列を一度の走査で求め、境界矩形を得る
+        rows = np.zeros((count, height), dtype=bool)
+        cols = np.zeros((count, width), dtype=bool)
+        rows[labels, np.arange(height)[:, np.newaxis]] = True
+        cols[labels, np.arange(width)[np.newaxis, :]] = True
+
+        regions = []
+        for label in range(1, count):
+            present_rows = np.flatnonzero(rows[label])
+            if not present_rows.size:
+                continue
+            present_cols = np.flatnonzero(cols[label])
+            top, bottom = int(present_rows[0]), int(present_rows[-1]) + 1
+            left, right = int(present_cols[0]), int(present_cols[-1]) + 1
+            select = labels[top:bottom, left:right] == label
+            regions.append(MirrorRegion(top, bottom, left, right, None if select.all() else select))
+        return cls(labels.shape, regions, bool(rows[0].sum() == 0))
+
+    def rows(self, top: int, bottom: int) -> "AtlasLayout":
+        """top〜bottom の行だけを取り出した配置（行の帯ごとに処理する場合に使う）"""
+        regions = []
+        for region in self.regions:
+            start, stop = max(region.top, top), min(region.bottom, bottom)
+            if start < stop:
+                select = None if region.select is None else region.select[start - region.top:stop - region.top]
+                regions.append(MirrorRegion(start - top, stop - top, region.left, region.right, select))
+        return AtlasLayout((bottom - top, self.shape[1]), regions, self.covers_all)
+
+    def mirror(self, mask: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """mask（…×H×W）を領域ごとに左右反転して out に書き込む（バッチでは全画像に同じ配置を使う）"""
+        if mask.shape[-2:] != self.shape:
+            raise ValueError(f"配置のサイズ {self.shape} と画像のサイズ {mask.shape[-2:]} が一致しません")
+        if not self.covers_all:
+            out[...] = mask
+        for region in self.regions:
+            source = mask[..., region.top:region.bottom, region.left:region.right][..., ::-1]
+            target = out[..., region.top:region.bottom, region.left:region.right]
+            if region.select is None:
+                target[...] = source
+            else:
+                np.copyto(target, source, where=region.select, casting="unsafe")
+        return out
+
+
+def labels_from_image(rgba: np.ndarray) -> np.ndarray:
+    """塗り分けた画像（H×W×4）をラベル配列に変換（色ごとに1つのラベル。黒と透明は 0）"""
+    colors = ((rgba[:, :, 0].astype(np.int32) << 16) | (rgba[:, :, 1].astype(np.int32) << 8)
+              | rgba[:, :, 2].astype(np.int32))
+    colors[rgba[:, :, 3] == 0] = 0
+    values, labels = np.unique(colors, return_inverse=True)
+    labels = labels.reshape(colors.shape).astype(np.int32)
+    if values[0] != 0:
+        # 領域外の画素がない
+        labels += 1
+    return labels
+
+
+def _resize_nearest(labels: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    """ラベル配列を最近傍で拡大縮小（ラベルが混ざらないようにする）"""
+    if labels.shape == shape:
+        return labels
+    rows = (np.arange(shape[0]) * labels.shape[0]) // shape[0]
+    cols = (np.arange(shape[1]) * labels.shape[1]) // shape[1]
+    return labels[rows[:, np.newaxis], cols[np.newaxis, :]]
+
+
+def _scale_rects(data: dict, shape: Tuple[int, int]) -> List[Tuple[int, int, int, int]]:
+    """JSONの矩形を shape の画像の座標に換算（隣接する矩形の境界は換算後も一致する）"""
+    scale_x = shape[1] / data["width"]
+    scale_y = shape[0] / data["height"]
+    rects = []
+    for x, y, w, h in data["regions"]:
+        left, right = round(x * scale_x), round((x + w) * scale_x)
+        top, bottom = round(y * scale_y), round((y + h) * scale_y)
+        if right > left and bottom > top:
+            rects.append((left, top, right - left, bottom - top))
+    return rects
+
+
+def _build_layout(path: str, shape: Tuple[int, int]) -> AtlasLayout:
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return AtlasLayout.from_rects(_scale_rects(data, shape), shape)
+    labels = labels_from_image(load_image(path).pixels)
+    return AtlasLayout.from_labels(_resize_nearest(labels, shape))
+
+
+_cache: "OrderedDict[tuple, AtlasLayout]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load_layout(path: str, shape: Tuple[int, int]) -> AtlasLayout:
+    """配置ファイル（.json の矩形リスト、またはラベル画像）を shape の画像用に読み込む
+
+    結果は (パス, 更新時刻, サイズ, shape) ごとにキャッシュし、同じ配置では作り直さない
+    """
+    stat = os.stat(path)
+    key = (os.path.normcase(os.path.abspath(path)), stat.st_mtime_ns, stat.st_size, tuple(shape))
+    with _cache_lock:
+        layout = _cache.get(key)
+        if layout is not None:
+            _cache.move_to_end(key)
+            return layout
+
+    layout = _build_layout(path, tuple(shape))
+    with _cache_lock:
+        _cache[key] = layout
+        while len(_cache) > _CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return layout
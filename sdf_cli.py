@@ -0,0 +1,656 @@
+"""SDF Texture Maker のコマンドライン版（GUIなしで動作）
+
+使用例:
+    python sdf_cli.py batch textures/ "faces/**/*.png" -j 8
+    python sdf_cli.py watch textures/ -r
+    python sdf_cli.py serve -j 4
+    generator | python sdf_cli.py pipe -s 512x512 --pix-fmt gray | consumer
+    python sdf_cli.py sequence "faces/face_%04d.png" -o faces_SDF.tif
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from sdf_processor import (GENERATION_MODE_DISTANCE, GENERATION_MODE_GRADIENT, GENERATION_MODES,
+                           GeneratorSettings, SDFProcessor, get_default_output_path,
+                           is_generated_output)
+from sdf_distance import DEFAULT_SPREAD, DEFAULT_THRESHOLD
+from sdf_manifest import BuildManifest, output_settings
+from sdf_output import COMPRESSION_PRESETS, DEFAULT_COMPRESSION, PNGOptions
+from sdf_dds import DDS_FORMATS, DDS_QUALITY_HIGH, DDS_QUALITY_NORMAL, CompressionReport, DDSOptions
+from sdf_mipmap import MIP_FILTERS, MipmapOptions
+from sdf_client import DEFAULT_HOST, DEFAULT_PORT
+from sdf_server import DEFAULT_MAX_QUEUE, SDFServer
+from sdf_pipe import PIXEL_FORMATS, parse_frame_size, process_pipe
+from sdf_sequence import DEFAULT_PREFETCH, process_sequence
+from sdf_stream import process_streaming
+from sdf_watch import MultiFileWatcher
+import sdf_profile
+
+
+# GUIの「参照」ダイアログと同じ対応形式
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff", ".tga")
+
+
+class BatchResult(NamedTuple):
+    """1ファイル分の処理結果"""
+    input_path: str
+    output_path: str
+    success: bool
+    input_bytes: int
+    output_bytes: int
+    error: Optional[str]
+    encode_seconds: float = 0.0
+    compression: Optional[CompressionReport] = None  # DDS出力時の圧縮誤差
+
+
+def _is_source_image(path: Path) -> bool:
+    """入力として扱う画像か判定（生成済みの *_SDF・*_SDF_mip<n> は除外）"""
+    return path.suffix.lower() in IMAGE_EXTENSIONS and not is_generated_output(str(path))
+
+
+def collect_inputs(patterns: List[str], recursive: bool = False) -> List[str]:
+    """ファイル・グロブ・ディレクトリ指定を入力ファイルの一覧に展開"""
+    inputs = []
+    seen = set()
+
+    def add(path: Path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            inputs.append(str(path))
+
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = path.rglob("*") if recursive else path.iterdir()
+            for candidate in sorted(candidates):
+                if candidate.is_file() and _is_source_image(candidate):
+                    add(candidate)
+        elif path.is_file():
+            # 明示的に指定されたファイルはそのまま処理する
+            add(path)
+        else:
+            for match in sorted(glob.glob(pattern, recursive=True)):
+                match_path = Path(match)
+                if match_path.is_file() and _is_source_image(match_path):
+                    add(match_path)
+
+    return inputs
+
+
+def resolve_output_path(input_path: str, output_dir: Optional[str] = None,
+                        extension: str = ".png") -> str:
+    """出力パスを決定（GUIと同じ <stem>_SDF.png 命名）"""
+    output_path = get_default_output_path(input_path, extension)
+    if output_dir:
+        output_path = os.path.join(output_dir, os.path.basename(output_path))
+    return output_path
+
+
+def process_file(input_path: str, output_path: str,
+                 settings: GeneratorSettings = GeneratorSettings(),
+                 memory_budget_mb: Optional[float] = None,
+                 options: PNGOptions = PNGOptions(),
+                 dds_options: DDSOptions = DDSOptions(),
+                 mipmap_options: MipmapOptions = MipmapOptions(),
+                 threads: int = 1) -> BatchResult:
+    """1ファイルを 読み込み → SDF生成 → 保存 する（ワーカープロセスで実行）
+
+    各ファイルは一度しか読まないため、デコード結果はキャッシュしない。
+    memory_budget_mb を指定した場合は帯単位のストリーミング処理を行う。
+    threads が2以上の場合、SDF生成を行の帯に分けて並列に行う（PNGの並列エンコードは options.threads）
+    """
+    processor = SDFProcessor()
+    processor.settings = settings
+    processor.threads = threads
+    processor.output_options = options
+    processor.dds_options = dds_options
+    processor.mipmap_options = mipmap_options
+    input_bytes = 0
+    try:
+        input_bytes = os.path.getsize(input_path)
+        if memory_budget_mb is not None:
+            if not process_streaming(input_path, output_path, memory_budget_mb, options=options):
+                error = "ストリーミング処理に失敗しました"
+            else:
+                return BatchResult(input_path, output_path, True, input_bytes,
+                                   os.path.getsize(output_path), None)
+        elif not processor.load_gradient_image(input_path, use_cache=False):
+            error = "画像の読み込みに失敗しました"
+        elif not processor.process_sdf():
+            error = "SDF処理に失敗しました"
+        elif not processor.save_result(output_path):
+            error = "保存に失敗しました"
+        else:
+            output = processor.last_output
+            return BatchResult(input_path, output_path, True, input_bytes,
+                               output.bytes_written, None, output.encode_seconds,
+                               processor.last_compression_report)
+    except Exception as e:
+        error = str(e)
+
+    return BatchResult(input_path, output_path, False, input_bytes, 0, error)
+
+
+def run_batch(inputs: List[str], jobs: int, output_dir: Optional[str] = None,
+              settings: GeneratorSettings = GeneratorSettings(),
+              memory_budget_mb: Optional[float] = None,
+              options: PNGOptions = PNGOptions(),
+              dds_options: Optional[DDSOptions] = None,
+              mipmap_options: MipmapOptions = MipmapOptions(),
+              threads: int = 1) -> List[BatchResult]:
+    """入力ファイル群をプロセスプールで並列処理（dds_options を指定するとDDSで出力）
+
+    threads は1ファイルあたりのSDF生成のスレッド数
+    """
+    extension = ".dds" if dds_options is not None else ".png"
+    tasks = [(path, resolve_output_path(path, output_dir, extension), settings, memory_budget_mb,
+              options, dds_options or DDSOptions(), mipmap_options, threads)
+             for path in inputs]
+    results = []
+
+    def report(result: BatchResult):
+        results.append(result)
+        status = "OK" if result.success else "NG"
+        print(f"[{len(results)}/{len(tasks)}] {status} {result.input_path}")
+
+    if jobs <= 1 or len(tasks) <= 1:
+        # 単一ジョブはプロセスを起動せずにその場で処理
+        for task in tasks:
+            report(process_file(*task))
+        return results
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(process_file, *task) for task in tasks]
+        for future in as_completed(futures):
+            report(future.result())
+
+    return results
+
+
+def print_summary(results: List[BatchResult], elapsed: float):
+    """スループットと失敗一覧を表示"""
+    succeeded = [r for r in results if r.success]
+    failed = [r for r in results if not r.success]
+    input_mb = sum(r.input_bytes for r in succeeded) / (1024 * 1024)
+    output_mb = sum(r.output_bytes for r in succeeded) / (1024 * 1024)
+    elapsed = max(elapsed, 1e-9)
+
+    print(f"\n処理完了: 成功 {len(succeeded)} / 失敗 {len(failed)} / 合計 {len(results)}")
+    print(f"処理時間: {elapsed:.2f} 秒")
+    print(f"スループット: {len(succeeded) / elapsed:.2f} images/s, "
+          f"入力 {input_mb / elapsed:.2f} MB/s, 出力 {output_mb / elapsed:.2f} MB/s")
+    encode_seconds = sum(r.encode_seconds for r in succeeded)
+    if encode_seconds:
+        print(f"エンコード: 合計 {encode_seconds:.2f} 秒（全プロセス）, 出力 {output_mb:.2f} MB")
+    reports = [r for r in succeeded if r.compression is not None]
+    if reports:
+        worst = max(reports, key=lambda r: r.compression.rmse)
+        print(f"DDS圧縮誤差: 最大 RMSE {worst.compression.rmse:.2f}（PSNR {worst.compression.psnr:.1f} dB, "
+              f"{worst.input_path}）, 最大誤差 {max(r.compression.max_error for r in reports)}")
+
+    if failed:
+        print("\n失敗したファイル:")
+        for result in failed:
+            print(f"  {result.input_path}: {result.error}")
+
+
+def cmd_batch(args) -> int:
+    """batch サブコマンド"""
+    settings = GeneratorSettings(args.mode, args.threshold, args.spread, layout_path(args))
+    if settings.mode == GENERATION_MODE_DISTANCE and args.memory_budget is not None:
+        # 距離変換は画像全体を参照するため帯単位では処理できない
+        print("distance モードはストリーミング処理（--memory-budget）に対応していません", file=sys.stderr)
+        return 2
+    if (args.format == "dds" or args.mipmaps or args.layout) and args.memory_budget is not None:
+        print("DDS出力・ミップマップ・アトラスの配置はストリーミング処理（--memory-budget）に対応していません",
+              file=sys.stderr)
+        return 2
+
+    inputs = collect_inputs(args.inputs, recursive=args.recursive)
+    if not inputs:
+        print("処理対象の画像が見つかりません", file=sys.stderr)
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+
+    # マニフェスト指定時は、入力・設定・出力に変更のないファイルをスキップ
+    manifest = BuildManifest(args.manifest) if args.manifest else None
+    outputs = output_settings(output_options(args), dds_options(args), mipmap_options(args))
+    input_states = {}
+    if manifest is not None:
+        pending = []
+        for path in inputs:
+            output_path = resolve_output_path(path, args.output_dir, output_extension(args))
+            up_to_date, state = manifest.check(path, output_path, settings, outputs)
+            if not up_to_date:
+                pending.append(path)
+                input_states[path] = state
+        inputs = pending
+
+    results = run_batch(inputs, args.jobs, args.output_dir, settings, args.memory_budget,
+                        output_options(args), dds_options(args), mipmap_options(args), args.threads)
+
+    if manifest is not None:
+        for result in results:
+            if result.success:
+                manifest.record(result.input_path, result.output_path, settings,
+                                input_states.get(result.input_path), outputs)
+        manifest.save()
+
+    print_summary(results, time.perf_counter() - start)
+    if manifest is not None:
+        print(f"マニフェスト: 最新 {manifest.hits} 件 / 再生成 {manifest.rebuilds} 件")
+
+    return 0 if all(r.success for r in results) else 1
+
+
+def cmd_merge(args) -> int:
+    """merge サブコマンド"""
+    processor = SDFProcessor()
+    processor.settings = GeneratorSettings(threshold=args.threshold)
+    processor.output_options = output_options(args)
+    processor.dds_options = dds_options(args) or DDSOptions()
+    processor.mipmap_options = mipmap_options(args)
+    processor.mask_synthesizer.max_workers = args.jobs
+    processor.threads = args.threads
+
+    start = time.perf_counter()
+    if not processor.load_mask_sequence(args.masks) or not processor.process_sdf():
+        print("マスクの合成に失敗しました", file=sys.stderr)
+        return 1
+    output_path = args.output or resolve_output_path(args.masks[0], extension=output_extension(args))
+    if not processor.save_result(output_path):
+        print(f"保存に失敗しました: {output_path}", file=sys.stderr)
+        return 1
+
+    print(f"{len(args.masks)} 枚のマスクから合成しました: {output_path} "
+          f"({time.perf_counter() - start:.2f} 秒)")
+    return 0
+
+
+class WatchBuilder:
+    """監視中のファイルの書き込み完了ごとにSDFを再生成する
+
+    同じファイルの処理中に次の保存があった場合は、処理の完了後に最新の状態で1回だけ再生成する
+    """
+
+    def __init__(self, executor, watcher: MultiFileWatcher, settings: GeneratorSettings,
+                 output_dir: Optional[str] = None, manifest: Optional[BuildManifest] = None,
+                 options: PNGOptions = PNGOptions(), dds_options: Optional[DDSOptions] = None,
+                 mipmap_options: MipmapOptions = MipmapOptions(), threads: int = 1):
+        self.executor = executor
+        self.watcher = watcher
+        self.settings = settings
+        self.options = options
+        self.dds_options = dds_options
+        self.mipmap_options = mipmap_options
+        self.threads = threads
+        self.output_dir = output_dir
+        self.manifest = manifest
+        self.outputs = output_settings(options, dds_options, mipmap_options)
+        self._running = {}    # 処理中のファイル → 次に処理する保存の時刻（なければ None）
+        self._lock = threading.Lock()
+
+    def on_ready(self, path: str, saved_at: float):
+        """書き込み完了の通知（監視スレッドから呼ばれる）"""
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            if key in self._running:
+                self._running[key] = saved_at
+                return
+            self._running[key] = None
+        self._submit(path, saved_at)
+
+    def _submit(self, path: str, saved_at: float):
+        output_path = resolve_output_path(path, self.output_dir,
+                                          ".dds" if self.dds_options is not None else ".png")
+        input_state = None
+        if self.manifest is not None:
+            with self._lock:
+                up_to_date, input_state = self.manifest.check(path, output_path, self.settings, self.outputs)
+            if up_to_date:
+                print(f"変更なし {path}")
+                self._finish(path)
+                return
+        future = self.executor.submit(process_file, path, output_path, self.settings,
+                                      None, self.options, self.dds_options or DDSOptions(),
+                                      self.mipmap_options, self.threads)
+        future.add_done_callback(lambda f: self._on_done(f, path, saved_at, input_state))
+
+    def _on_done(self, future, path: str, saved_at: float, input_state):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = BatchResult(path, "", False, 0, 0, str(e))
+
+        if result.success:
+            latency = self.watcher.record_output(saved_at)
+            print(f"OK {path}（保存から {latency:.2f} 秒）")
+            if self.manifest is not None:
+                with self._lock:
+                    self.manifest.record(path, result.output_path, self.settings, input_state, self.outputs)
+                    self.manifest.save()
+        elif self.watcher.retry(path, saved_at):
+            # 書き込み途中の画像を読んだ可能性があるため、書き込み完了の判定からやり直す
+            print(f"再試行 {path}: {result.error}")
+        else:
+            print(f"NG {path}: {result.error}")
+        self._finish(path)
+
+    def _finish(self, path: str):
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            saved_at = self._running.pop(key, None)
+            if saved_at is not None:
+                self._running[key] = None
+        if saved_at is not None:
+            self._submit(path, saved_at)
+
+
+def cmd_watch(args) -> int:
+    """watch サブコマンド"""
+    settings = GeneratorSettings(args.mode, args.threshold, args.spread, layout_path(args))
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    manifest = BuildManifest(args.manifest) if args.manifest else None
+
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        watcher = MultiFileWatcher(on_ready=None, accept=lambda path: _is_source_image(Path(path)))
+        builder = WatchBuilder(executor, watcher, settings, args.output_dir, manifest,
+                               output_options(args), dds_options(args), mipmap_options(args),
+                               args.threads)
+        watcher.on_ready = builder.on_ready
+
+        for pattern in args.inputs:
+            if os.path.isdir(pattern):
+                watcher.watch_directory(pattern, recursive=args.recursive)
+            else:
+                for path in collect_inputs([pattern]):
+                    watcher.watch_file(path)
+        if watcher.watched_count == 0:
+            print("監視対象が見つかりません", file=sys.stderr)
+            return 1
+
+        watcher.start()
+        print(f"{watcher.watched_count} 件の監視を開始しました（Ctrl+C で終了）")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.stop()
+
+    stats = watcher.stats.format()
+    if stats:
+        print(f"\n{stats}")
+    return 0
+
+
+def cmd_serve(args) -> int:
+    """serve サブコマンド"""
+    try:
+        server = SDFServer(args.host, args.port, args.jobs, args.max_queue, args.threads)
+    except OSError as e:
+        print(f"待ち受けを開始できません（{args.host}:{args.port}）: {e}", file=sys.stderr)
+        return 1
+    server.warm_up()
+    host, port = server.address
+    print(f"{host}:{port} で待ち受けています（ワーカー {server.workers}、Ctrl+C で終了）", flush=True)
+    try:
+        # クライアントから shutdown の要求を受けた場合も終了する
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    stats = server.stats()
+    latency = stats["latency_ms"]
+    print(f"\n処理 {stats['completed']} 件 / 失敗 {stats['failed']} 件 / 混雑で拒否 {stats['rejected']} 件")
+    if latency["count"]:
+        print(f"応答時間: p50 {latency['p50']:.1f} ms / p90 {latency['p90']:.1f} ms / p99 {latency['p99']:.1f} ms")
+    return 0
+
+
+def cmd_pipe(args) -> int:
+    """pipe サブコマンド（標準出力はフレームの出力に使うため、メッセージは標準エラーに出す）"""
+    settings = GeneratorSettings(args.mode, args.threshold, args.spread, layout_path(args))
+    try:
+        width, height = parse_frame_size(args.size)
+        stats = process_pipe(sys.stdin.buffer, sys.stdout.buffer, width, height, args.pix_fmt, settings,
+                             args.threads)
+    except BrokenPipeError:
+        print("出力先が閉じられたため終了しました", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"パイプ処理エラー: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(stats.format(), file=sys.stderr)
+    return 0
+
+
+def cmd_sequence(args) -> int:
+    """sequence サブコマンド"""
+    settings = GeneratorSettings(args.mode, args.threshold, args.spread, layout_path(args))
+    try:
+        result = process_sequence(args.input, args.output, args.output_dir, settings,
+                                  COMPRESSION_PRESETS[args.compression]._replace(threads=args.threads),
+                                  args.prefetch, args.threads)
+    except Exception as e:
+        print(f"シーケンス処理エラー: {e}", file=sys.stderr)
+        return 1
+
+    print(result.format())
+    if len(result.outputs) == 1:
+        print(f"出力: {result.outputs[0]}")
+    elif result.outputs:
+        print(f"出力: {result.outputs[0]} … {result.outputs[-1]}（{len(result.outputs)} ファイル）")
+    return 0
+
+
+def output_options(args) -> PNGOptions:
+    """コマンドライン引数からPNG出力の設定を作成"""
+    return COMPRESSION_PRESETS[args.compression]._replace(compact_channels=args.compact_channels,
+                                                          threads=args.threads)
+
+
+def dds_options(args) -> Optional[DDSOptions]:
+    """コマンドライン引数からDDS出力の設定を作成（PNG出力の場合は None）"""
+    if args.format != "dds":
+        return None
+    return DDSOptions(args.dds_format, args.dds_quality, flip_y=args.dds_flip_y)
+
+
+def layout_path(args) -> str:
+    """アトラスの配置ファイルの絶対パス（ワーカープロセスの作業フォルダに依存しないように）"""
+    return os.path.abspath(args.layout) if args.layout else ""
+
+
+def mipmap_options(args) -> MipmapOptions:
+    """コマンドライン引数からミップマップの設定を作成"""
+    return MipmapOptions(args.mipmaps, args.mip_filter)
+
+
+def output_extension(args) -> str:
+    return f".{args.format}"
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    """出力形式と設定に関する引数を追加"""
+    parser.add_argument("--format", choices=("png", "dds"), default="png",
+                        help="出力形式（dds: BC5 / BC4 で圧縮済みのDDS。Unityでの再圧縮が不要になる）")
+    parser.add_argument("--dds-format", choices=DDS_FORMATS, default=DDS_FORMATS[0],
+                        help="DDSの圧縮形式（bc5: R・G の2チャンネル / bc4: G のみ）")
+    parser.add_argument("--dds-quality", type=int, choices=range(DDS_QUALITY_HIGH + 1),
+                        default=DDS_QUALITY_NORMAL,
+                        help="DDSの圧縮品質（0: 最速 / 1: 標準 / 2: 高品質）")
+    parser.add_argument("--dds-flip-y", action="store_true",
+                        help="DDSを上下反転して書き出す（読み込み時に上下反転しないエンジン向け）")
+    parser.add_argument("--mipmaps", action="store_true",
+                        help="ミップチェーンも出力する（DDSは同じファイル、PNGは <stem>_mip<n>.png）")
+    parser.add_argument("--mip-filter", choices=MIP_FILTERS, default=MIP_FILTERS[0],
+                        help="ミップの縮小フィルタ（distance: 距離場向け / box: 単純平均）")
+    parser.add_argument("--compression", choices=tuple(COMPRESSION_PRESETS), default=DEFAULT_COMPRESSION,
+                        help="PNGの圧縮プリセット（fast: 高速・サイズ大 / default: 従来と同じ / "
+                             "small: 最小サイズ・非常に低速）")
+    parser.add_argument("--compact-channels", action="store_true",
+                        help="全面不透明な画像はアルファを省いてRGBで保存する")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="1画像あたりのスレッド数。SDF生成とPNGエンコードを行の帯に分けて並列に行う"
+                             "（既定: 1。-j との積がCPUコア数程度になるように指定する）")
+    parser.add_argument("--profile-log", metavar="PATH",
+                        help="段階ごとの処理時間・サイズ・ピークメモリをJSON Lines形式で追記する")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """引数パーサーを作成"""
+    parser = argparse.ArgumentParser(
+        prog="sdf_cli",
+        description="SDF Texture Maker for lilToon（コマンドライン版）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="複数の画像を一括でSDF化")
+    batch.add_argument("inputs", nargs="+",
+                       help="入力ファイル・グロブ・ディレクトリ")
+    batch.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                       help="並列プロセス数（既定: CPUコア数）")
+    batch.add_argument("-o", "--output-dir",
+                       help="出力先ディレクトリ（既定: 入力と同じ場所）")
+    batch.add_argument("-r", "--recursive", action="store_true",
+                       help="ディレクトリをサブフォルダまで探索")
+    batch.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE_GRADIENT,
+                       help="gradient: 明度をそのまま格納 / distance: 二値化して符号付き距離場を生成")
+    batch.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                       help=f"distanceモードの二値化しきい値 0-255（既定: {DEFAULT_THRESHOLD}）")
+    batch.add_argument("--spread", type=float, default=DEFAULT_SPREAD,
+                       help=f"distanceモードの距離場の広がり（ピクセル、既定: {DEFAULT_SPREAD:g}）")
+    batch.add_argument("--layout", metavar="PATH",
+                       help="アトラスの配置（矩形のJSON、または領域を塗り分けた画像）。領域ごとに左右反転する")
+    batch.add_argument("--memory-budget", type=float, metavar="MB",
+                       help="指定すると帯単位のストリーミング処理を行い、"
+                            "1プロセスあたりの作業メモリをこの値（MB）以内に抑える")
+    batch.add_argument("--manifest", metavar="PATH",
+                       help="インクリメンタルビルド用のマニフェスト。入力・設定・出力に変更がないファイルはスキップする")
+    add_output_arguments(batch)
+    batch.set_defaults(func=cmd_batch)
+
+    watch = subparsers.add_parser("watch", help="ファイル・フォルダを監視し、保存されるたびにSDFを再生成")
+    watch.add_argument("inputs", nargs="+",
+                       help="監視するファイル・グロブ・ディレクトリ")
+    watch.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                       help="並列プロセス数（既定: CPUコア数）")
+    watch.add_argument("-o", "--output-dir",
+                       help="出力先ディレクトリ（既定: 入力と同じ場所）")
+    watch.add_argument("-r", "--recursive", action="store_true",
+                       help="ディレクトリをサブフォルダまで監視")
+    watch.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE_GRADIENT,
+                       help="gradient: 明度をそのまま格納 / distance: 二値化して符号付き距離場を生成")
+    watch.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                       help=f"distanceモードの二値化しきい値 0-255（既定: {DEFAULT_THRESHOLD}）")
+    watch.add_argument("--spread", type=float, default=DEFAULT_SPREAD,
+                       help=f"distanceモードの距離場の広がり（ピクセル、既定: {DEFAULT_SPREAD:g}）")
+    watch.add_argument("--layout", metavar="PATH",
+                       help="アトラスの配置（矩形のJSON、または領域を塗り分けた画像）。領域ごとに左右反転する")
+    watch.add_argument("--manifest", metavar="PATH",
+                       help="インクリメンタルビルド用のマニフェスト。内容が変わらない上書き保存では再生成しない")
+    add_output_arguments(watch)
+    watch.set_defaults(func=cmd_watch)
+
+    merge = subparsers.add_parser("merge", help="光源角度順のマスク列から顔影用SDFを合成")
+    merge.add_argument("masks", nargs="+", help="光源角度順に並べたマスク画像")
+    merge.add_argument("-o", "--output", help="出力パス（既定: 先頭マスクの <stem>_SDF.png）")
+    merge.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                       help="距離変換の並列スレッド数（既定: CPUコア数）")
+    merge.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                       help=f"マスクの二値化しきい値 0-255（既定: {DEFAULT_THRESHOLD}）")
+    add_output_arguments(merge)
+    merge.set_defaults(func=cmd_merge)
+
+    serve = subparsers.add_parser("serve", help="常駐して、sdf_client からの要求を処理するサーバーを起動")
+    serve.add_argument("--host", default=DEFAULT_HOST,
+                       help=f"待ち受けるアドレス（既定: {DEFAULT_HOST}。外部から接続できるアドレスは指定しない）")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT,
+                       help=f"待ち受けるポート（既定: {DEFAULT_PORT}。0 で空いているポート）")
+    serve.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                       help="同時に処理する要求の数（既定: CPUコア数）")
+    serve.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                       help=f"処理待ちにできる要求の数。超えた要求はすぐに失敗を返す（既定: {DEFAULT_MAX_QUEUE}）")
+    serve.add_argument("--threads", type=int, default=1,
+                       help="1要求あたりのスレッド数。SDF生成とPNGエンコードを行の帯に分けて並列に行う（既定: 1）")
+    serve.add_argument("--profile-log", metavar="PATH",
+                       help="段階ごとの処理時間・サイズ・ピークメモリをJSON Lines形式で追記する")
+    serve.set_defaults(func=cmd_serve)
+
+    pipe = subparsers.add_parser("pipe", help="標準入力の生の画素データ（フレーム列）を処理して標準出力へ書き出す")
+    pipe.add_argument("-s", "--size", required=True, help="フレームのサイズ（幅x高さ、例: 512x512）")
+    pipe.add_argument("--pix-fmt", choices=tuple(PIXEL_FORMATS), default="rgba",
+                      help="入力の画素形式（既定: rgba）。出力は常に rgba")
+    pipe.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE_GRADIENT,
+                      help="gradient: 明度をそのまま格納 / distance: 二値化して符号付き距離場を生成")
+    pipe.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                      help=f"distanceモードの二値化しきい値 0-255（既定: {DEFAULT_THRESHOLD}）")
+    pipe.add_argument("--spread", type=float, default=DEFAULT_SPREAD,
+                      help=f"distanceモードの距離場の広がり（ピクセル、既定: {DEFAULT_SPREAD:g}）")
+    pipe.add_argument("--layout", metavar="PATH",
+                      help="アトラスの配置（矩形のJSON、または領域を塗り分けた画像）。領域ごとに左右反転する")
+    pipe.add_argument("--threads", type=int, default=1,
+                      help="1フレームあたりのスレッド数。SDF生成を行の帯に分けて並列に行う（既定: 1）")
+    pipe.add_argument("-q", "--quiet", action="store_true", help="終了時の統計を表示しない")
+    pipe.add_argument("--profile-log", metavar="PATH",
+                      help="段階ごとの処理時間・サイズ・ピークメモリをJSON Lines形式で追記する")
+    pipe.set_defaults(func=cmd_pipe)
+
+    sequence = subparsers.add_parser("sequence",
+                                     help="連番の画像・マルチページTIFF・APNGの全フレームをストリーミングで処理")
+    sequence.add_argument("input", help="連番の指定（face_%%04d.png・face_####.png）、連番の1ファイル、"
+                                        "または複数フレームの画像")
+    sequence.add_argument("-o", "--output",
+                          help="出力先。連番の指定を含めば連番のPNG、含まなければ1つのファイル（.tif / .png はAPNG）"
+                               "（既定: 入力に合わせる）")
+    sequence.add_argument("--output-dir", help="既定の名前で出力する場合の出力先ディレクトリ")
+    sequence.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE_GRADIENT,
+                          help="gradient: 明度をそのまま格納 / distance: 二値化して符号付き距離場を生成")
+    sequence.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                          help=f"distanceモードの二値化しきい値 0-255（既定: {DEFAULT_THRESHOLD}）")
+    sequence.add_argument("--spread", type=float, default=DEFAULT_SPREAD,
+                          help=f"distanceモードの距離場の広がり（ピクセル、既定: {DEFAULT_SPREAD:g}）")
+    sequence.add_argument("--layout", metavar="PATH",
+                          help="アトラスの配置（矩形のJSON、または領域を塗り分けた画像）。領域ごとに左右反転する")
+    sequence.add_argument("--compression", choices=tuple(COMPRESSION_PRESETS), default=DEFAULT_COMPRESSION,
+                          help="圧縮プリセット（fast / default / small）")
+    sequence.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                          help=f"段階の間に置けるフレーム数の上限（既定: {DEFAULT_PREFETCH}）。"
+                               "大きくすると処理時間のばらつきを吸収できるがメモリを使う")
+    sequence.add_argument("--threads", type=int, default=1,
+                          help="1フレームあたりのスレッド数。SDF生成とPNGエンコードを行の帯に分けて並列に行う（既定: 1）")
+    sequence.add_argument("--profile-log", metavar="PATH",
+                          help="段階ごとの処理時間・サイズ・ピークメモリをJSON Lines形式で追記する")
+    sequence.set_defaults(func=cmd_sequence)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile_log:
+        # 並列処理の子プロセスにも環境変数で引き継ぐ
+        os.environ[sdf_profile.PROFILE_LOG_ENV] = args.profile_log
+        sdf_profile.enable(args.profile_log)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
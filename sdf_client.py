@@ -0,0 +1,154 @@
+"""SDF変換サーバー（sdf_server.py）のクライアント
+
+標準ライブラリだけで動作するため、NumPy などが入っていない環境（エディタ拡張から呼ぶスクリプトなど）でも使える。
+
+通信は「1行のJSON（ヘッダー）」と「ヘッダーの length バイトのデータ（画素・画像ファイルの内容）」を
+1つのメッセージとし、1つの接続で要求と応答を交互に送る。応答のヘッダーには ok（成否）と、
+失敗した場合は error（メッセージ）が入る。
+
+使用例:
+    with SDFClient() as client:
+        client.process_file("face.png")                 # face_SDF.png に保存
+        image = client.process_pixels(rgba, 512, 512)   # 結果のRGBAを受け取る
+        print(client.stats()["latency_ms"])
+"""
+import json
+import os
+import socket
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47650
+
+# ヘッダー（JSONの1行）の最大サイズ
+MAX_HEADER_BYTES = 64 * 1024
+# 1つのメッセージで送れるデータの最大サイズ（16K×16KのRGBA）
+MAX_PAYLOAD_BYTES = 16384 * 16384 * 4
+
+
+class ServerError(Exception):
+    """サーバーが要求の失敗を返した場合の例外"""
+
+
+class RawImage(NamedTuple):
+    """画素データ（行優先・チャンネルは RGBA の順, uint8）"""
+    pixels: bytes
+    width: int
+    height: int
+    channels: int = 4
+
+
+def write_message(stream, header: Dict[str, Any], payload: bytes = b""):
+    """メッセージを送信（length はデータの長さで上書きする）"""
+    header = dict(header, length=len(payload))
+    stream.write(json.dumps(header, ensure_ascii=False).encode("utf-8") + b"\n")
+    if payload:
+        stream.write(payload)
+    stream.flush()
+
+
+def read_message(stream, max_payload: int = MAX_PAYLOAD_BYTES) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """メッセージを受信（接続が閉じられていれば None）"""
+    line = stream.readline(MAX_HEADER_BYTES + 1)
+    if not line:
+        return None
+    if not line.endswith(b"\n"):
+        raise ValueError("ヘッダーが長すぎるか、途中で接続が切れました")
+    header = json.loads(line)
+    if not isinstance(header, dict):
+        raise ValueError("ヘッダーはJSONのオブジェクトである必要があります")
+
+    length = header.get("length", 0)
+    if not isinstance(length, int) or not 0 <= length <= max_payload:
+        raise ValueError(f"データの長さが不正です: {length}")
+    payload = stream.read(length) if length else b""
+    if len(payload) != length:
+        raise ConnectionError("データの途中で接続が切れました")
+    return header, payload
+
+
+class SDFClient:
+    """SDF変換サーバーへの接続（1つの接続は同時に1つのスレッドから使う）
+
+    options には生成設定（mode, threshold, spread, layout）と出力設定（format, compression, compact_channels,
+    mipmaps, mip_filter, dds_format, dds_quality, dds_flip_y）をコマンドライン版と同じ名前で指定する
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: Optional[float] = None):
+        self._socket = socket.create_connection((host, port), timeout)
+        self._reader = self._socket.makefile("rb")
+        self._writer = self._socket.makefile("wb")
+
+    def close(self):
+        for closable in (self._writer, self._reader, self._socket):
+            try:
+                closable.close()
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def request(self, header: Dict[str, Any], payload: bytes = b"") -> Tuple[Dict[str, Any], bytes]:
+        """要求を送って応答を受け取る（失敗の応答は ServerError を送出）"""
+        write_message(self._writer, header, payload)
+        message = read_message(self._reader)
+        if message is None:
+            raise ConnectionError("サーバーが接続を閉じました")
+        response, data = message
+        response.pop("length", None)
+        if not response.get("ok"):
+            raise ServerError(response.get("error", "不明なエラー"))
+        return response, data
+
+    def ping(self) -> Dict[str, Any]:
+        return self.request({"op": "ping"})[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """待ち行列の長さ・処理時間のパーセンタイル・キャッシュの統計"""
+        return self.request({"op": "stats"})[0]
+
+    def shutdown(self):
+        """サーバーを停止（処理中の要求は完了してから停止する）"""
+        self.request({"op": "shutdown"})
+
+    def process_file(self, input_path: str, output_path: Optional[str] = None, **options) -> Dict[str, Any]:
+        """サーバーから見えるパスの画像を処理して保存（output_path の既定は <stem>_SDF.png）"""
+        header = {"op": "process", "input": os.path.abspath(input_path), "options": _options(options)}
+        if output_path:
+            header["output"] = os.path.abspath(output_path)
+        return self.request(header)[0]
+
+    def process_pixels(self, pixels: bytes, width: int, height: int, channels: int = 4,
+                       output_path: Optional[str] = None, **options) -> Union[RawImage, Dict[str, Any]]:
+        """画素データ（H×W×channels, uint8）を処理
+
+        output_path を指定した場合はサーバーが保存して結果の情報を返し、省略した場合は結果のRGBAを返す
+        """
+        header = {"op": "process", "width": width, "height": height, "channels": channels,
+                  "options": _options(options)}
+        return self._process_buffer(header, pixels, output_path)
+
+    def process_image_data(self, data: bytes, extension: str = ".png", output_path: Optional[str] = None,
+                           **options) -> Union[RawImage, Dict[str, Any]]:
+        """画像ファイルの内容（PNG・JPGなど）を処理（戻り値は process_pixels と同じ）"""
+        header = {"op": "process", "extension": extension, "options": _options(options)}
+        return self._process_buffer(header, data, output_path)
+
+    def _process_buffer(self, header: Dict[str, Any], payload: bytes, output_path: Optional[str]):
+        if output_path:
+            header["output"] = os.path.abspath(output_path)
+            return self.request(header, payload)[0]
+        response, data = self.request(header, payload)
+        return RawImage(data, response["width"], response["height"], response["channels"])
+
+
+def _options(options: Dict[str, Any]) -> Dict[str, Any]:
+    """配置ファイルのパスはサーバーの作業フォルダに依存しないよう絶対パスにする"""
+    if options.get("layout"):
+        options = dict(options, layout=os.path.abspath(options["layout"]))
+    return options
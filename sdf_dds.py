@@ -0,0 +1,304 @@
+"""BC5 / BC4 ブロック圧縮とDDS出力
+
+SDFテクスチャで意味を持つのは R（左右反転したマスク）と G（元のマスク）の2チャンネルだけなので、
+2チャンネルをそれぞれ独立に圧縮する BC5 でそのまま格納できる。BC4 は1チャンネル版。
+4×4画素のブロックをすべてまとめてNumPyで一括処理する。
+"""
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from sdf_output import OutputResult, write_atomic
+from sdf_profile import stage
+
+
+DDS_FORMAT_BC5 = "bc5"  # R・G の2チャンネル（16バイト/ブロック）
+DDS_FORMAT_BC4 = "bc4"  # 1チャンネル（8バイト/ブロック）
+DDS_FORMATS = (DDS_FORMAT_BC5, DDS_FORMAT_BC4)
+
+# 圧縮品質（0: 最速 / 1: 標準 / 2: 高品質）
+DDS_QUALITY_FAST = 0
+DDS_QUALITY_NORMAL = 1
+DDS_QUALITY_HIGH = 2
+
+# 一度に処理するブロック数（パレットとの距離計算の作業メモリを抑える）
+_CHUNK_BLOCKS = 32768
+
+# 高品質モードでの端点の最小二乗補正の回数
+_REFINE_ITERATIONS = 2
+
+_CHANNEL_INDEX = {"r": 0, "g": 1}
+
+# 8値モードのインデックス → 端点0からの位置（0-7）
+_POSITION_8 = np.array([0, 7, 1, 2, 3, 4, 5, 6], dtype=np.int32)
+# 8値モードの端点0からの位置 → インデックス
+_INDEX_FROM_POSITION_8 = np.array([0, 2, 3, 4, 5, 6, 7, 1], dtype=np.uint8)
+
+_SHIFTS = np.arange(16, dtype=np.uint64) * np.uint64(3)
+
+
+class DDSOptions(NamedTuple):
+    """DDS出力の設定"""
+    format: str = DDS_FORMAT_BC5
+    quality: int = DDS_QUALITY_NORMAL
+    bc4_channel: str = "g"   # BC4で格納するチャンネル（g: 元のマスク / r: 左右反転）
+    flip_y: bool = False     # 上下反転して書き出す（DDSを上下反転せずに読み込むエンジン向け）
+
+
+class CompressionReport(NamedTuple):
+    """圧縮結果とデコードし直したときの誤差（0-255 のスケール）"""
+    format: str
+    quality: int
+    encode_seconds: float
+    rmse: float
+    max_error: int
+    psnr: float
+
+
+# ブロック分割
+
+def _to_blocks(channel: np.ndarray) -> np.ndarray:
+    """H×W を4×4ブロック（N×16）に並べ替える（4の倍数でない場合は端の画素で埋める）"""
+    height, width = channel.shape
+    pad_y, pad_x = -height % 4, -width % 4
+    if pad_y or pad_x:
+        channel = np.pad(channel, ((0, pad_y), (0, pad_x)), mode="edge")
+    rows, cols = channel.shape[0] // 4, channel.shape[1] // 4
+    return channel.reshape(rows, 4, cols, 4).transpose(0, 2, 1, 3).reshape(-1, 16)
+
+
+def _from_blocks(blocks: np.ndarray, height: int, width: int) -> np.ndarray:
+    """N×16 のブロックを H×W に戻す"""
+    rows, cols = (height + 3) // 4, (width + 3) // 4
+    image = blocks.reshape(rows, cols, 4, 4).transpose(0, 2, 1, 3).reshape(rows * 4, cols * 4)
+    return image[:height, :width]
+
+
+# BC4
+
+def _palette(end0: np.ndarray, end1: np.ndarray) -> np.ndarray:
+    """端点からデコード時の8値パレット（N×8, int32）を作る"""
+    a = end0.astype(np.int32)
+    b = end1.astype(np.int32)
+    palette = np.empty((a.size, 8), dtype=np.int32)
+    palette[:, 0] = a
+    palette[:, 1] = b
+
+    eight = a > b
+    k = np.arange(1, 7, dtype=np.int32)
+    palette[:, 2:] = np.where(eight[:, None],
+                              ((7 - k) * a[:, None] + k * b[:, None] + 3) // 7,
+                              0)
+    k = np.arange(1, 5, dtype=np.int32)
+    six = ~eight
+    palette[six, 2:6] = ((5 - k) * a[six, None] + k * b[six, None] + 2) // 5
+    palette[six, 6] = 0
+    palette[six, 7] = 255
+    return palette
+
+
+def _assign(values: np.ndarray, palette: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """各画素に最も近いパレットのインデックスと、ブロックごとの二乗誤差"""
+    diff = values[:, :, None] - palette[:, None, :]
+    diff *= diff
+    indices = diff.argmin(axis=2).astype(np.uint8)
+    error = np.take_along_axis(diff, indices[:, :, None].astype(np.intp), axis=2)[:, :, 0].sum(axis=1)
+    return indices, error
+
+
+def _fast_indices(values: np.ndarray, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """最小値・最大値を端点とする8値モードのインデックスを算術的に求める"""
+    span = (high - low).astype(np.float32)
+    span[span == 0] = 1
+    position = np.rint((high[:, None] - values) * (7 / span[:, None])).astype(np.intp)
+    return _INDEX_FROM_POSITION_8[np.clip(position, 0, 7)]
+
+
+def _refine(values: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """8値モードのインデックスを固定して端点を最小二乗で求め直す"""
+    t = _POSITION_8[indices].astype(np.float64) / 7
+    s = 1 - t
+    v = values.astype(np.float64)
+    ss, st, tt = (s * s).sum(1), (s * t).sum(1), (t * t).sum(1)
+    sv, tv = (s * v).sum(1), (t * v).sum(1)
+    det = ss * tt - st * st
+    valid = np.abs(det) > 1e-9
+    det[~valid] = 1
+    end0 = np.clip(np.rint((sv * tt - tv * st) / det), 0, 255)
+    end1 = np.clip(np.rint((tv * ss - sv * st) / det), 0, 255)
+    # 8値モードは 端点0 > 端点1 のときだけなので、逆転したら入れ替える（同値は無効）
+    swap = end0 < end1
+    end0[swap], end1[swap] = end1[swap], end0[swap]
+    valid &= end0 > end1
+    return end0.astype(np.int32), end1.astype(np.int32), valid
+
+
+def _encode_bc4_chunk(values: np.ndarray, quality: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """N×16 の画素値（int32）から (端点0, 端点1, インデックス) を求める"""
+    high = values.max(axis=1)
+    low = values.min(axis=1)
+
+    if quality <= DDS_QUALITY_FAST:
+        # 最小値と最大値を端点にする（一様なブロックは 端点0 == 端点1 の6値モードで全画素が端点0）
+        return high, low, _fast_indices(values, high, low)
+
+    end0, end1 = high.copy(), low.copy()
+    indices, error = _assign(values, _palette(end0, end1))
+
+    if quality >= DDS_QUALITY_HIGH:
+        for _ in range(_REFINE_ITERATIONS):
+            r0, r1, valid = _refine(values, indices)
+            r_indices, r_error = _assign(values, _palette(r0, r1))
+            better = valid & (r_error < error)
+            end0[better], end1[better] = r0[better], r1[better]
+            indices[better], error[better] = r_indices[better], r_error[better]
+
+    # 0 や 255 を含むブロック（SDFの飽和した領域との境目）は、0 と 255 を明示できる6値モードも試す
+    extreme = (values == 0) | (values == 255)
+    has_extreme = extreme.any(axis=1) & ~extreme.all(axis=1)
+    if has_extreme.any():
+        inner = values[has_extreme]
+        inner_extreme = extreme[has_extreme]
+        s0 = np.where(inner_extreme, 255, inner).min(axis=1)
+        s1 = np.where(inner_extreme, 0, inner).max(axis=1)
+        s_indices, s_error = _assign(inner, _palette(s0, s1))
+        better = s_error < error[has_extreme]
+        target = np.flatnonzero(has_extreme)[better]
+        end0[target], end1[target] = s0[better], s1[better]
+        indices[target], error[target] = s_indices[better], s_error[better]
+
+    return end0, end1, indices
+
+
+def encode_bc4(channel: np.ndarray, quality: int = DDS_QUALITY_NORMAL) -> np.ndarray:
+    """1チャンネル（H×W, uint8）をBC4ブロック（N×8, uint8）に圧縮"""
+    values = _to_blocks(channel)
+    count = values.shape[0]
+    encoded = np.empty((count, 8), dtype=np.uint8)
+
+    for start in range(0, count, _CHUNK_BLOCKS):
+        chunk = values[start:start + _CHUNK_BLOCKS].astype(np.int32)
+        end0, end1, indices = _encode_bc4_chunk(chunk, quality)
+        # 16個の3bitインデックスを48bit（リトルエンディアン）に詰める
+        packed = (indices.astype(np.uint64) << _SHIFTS).sum(axis=1, dtype=np.uint64)
+        block = encoded[start:start + chunk.shape[0]]
+        block[:, 0] = end0
+        block[:, 1] = end1
+        block[:, 2:] = packed.astype("<u8").view(np.uint8).reshape(-1, 8)[:, :6]
+    return encoded
+
+
+def decode_bc4(blocks: np.ndarray, height: int, width: int) -> np.ndarray:
+    """BC4ブロック（N×8, uint8）を H×W の uint8 にデコード"""
+    padded = np.zeros((blocks.shape[0], 8), dtype=np.uint8)
+    padded[:, :6] = blocks[:, 2:]
+    packed = padded.view("<u8")[:, 0]
+    indices = ((packed[:, None] >> _SHIFTS) & np.uint64(7)).astype(np.intp)
+    values = np.take_along_axis(_palette(blocks[:, 0], blocks[:, 1]), indices, axis=1)
+    return _from_blocks(values.astype(np.uint8), height, width)
+
+
+# BC5
+
+def encode_bc5(red: np.ndarray, green: np.ndarray, quality: int = DDS_QUALITY_NORMAL) -> np.ndarray:
+    """R・G（H×W, uint8）をBC5ブロック（N×16, uint8）に圧縮"""
+    return np.concatenate([encode_bc4(red, quality), encode_bc4(green, quality)], axis=1)
+
+
+def decode_bc5(blocks: np.ndarray, height: int, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """BC5ブロック（N×16, uint8）を R・G にデコード"""
+    return decode_bc4(blocks[:, :8], height, width), decode_bc4(blocks[:, 8:], height, width)
+
+
+# DDS
+
+_DDS_MAGIC = b"DDS "
+_DDSD_CAPS, _DDSD_HEIGHT, _DDSD_WIDTH = 0x1, 0x2, 0x4
+_DDSD_PIXELFORMAT, _DDSD_MIPMAPCOUNT, _DDSD_LINEARSIZE = 0x1000, 0x20000, 0x80000
+_DDPF_FOURCC = 0x4
+_DDSCAPS_COMPLEX, _DDSCAPS_TEXTURE, _DDSCAPS_MIPMAP = 0x8, 0x1000, 0x400000
+
+# 互換性の高い旧形式のFourCC（DirectXTexなどでは BC4_UNORM / BC5_UNORM として読まれる）
+_FOURCC = {DDS_FORMAT_BC4: b"ATI1", DDS_FORMAT_BC5: b"ATI2"}
+
+
+def dds_header(width: int, height: int, format: str, levels: List[bytes]) -> bytes:
+    """DDSヘッダー（マジックを含む 128 バイト）"""
+    flags = _DDSD_CAPS | _DDSD_HEIGHT | _DDSD_WIDTH | _DDSD_PIXELFORMAT | _DDSD_LINEARSIZE
+    caps = _DDSCAPS_TEXTURE
+    if len(levels) > 1:
+        flags |= _DDSD_MIPMAPCOUNT
+        caps |= _DDSCAPS_COMPLEX | _DDSCAPS_MIPMAP
+
+    pixel_format = struct.pack("<II4s5I", 32, _DDPF_FOURCC, _FOURCC[format], 0, 0, 0, 0, 0)
+    header = struct.pack("<7I44x", 124, flags, height, width, len(levels[0]), 0, len(levels))
+    header += pixel_format + struct.pack("<5I", caps, 0, 0, 0, 0)
+    return _DDS_MAGIC + header
+
+
+def _report(format: str, quality: int, seconds: float,
+            pairs: List[Tuple[np.ndarray, np.ndarray]]) -> CompressionReport:
+    """元のチャンネルとデコード結果の組から誤差を集計"""
+    squared = 0.0
+    count = 0
+    max_error = 0
+    for original, decoded in pairs:
+        diff = original.astype(np.int16) - decoded.astype(np.int16)
+        squared += float(np.square(diff, dtype=np.int32).sum())
+        count += diff.size
+        max_error = max(max_error, int(np.abs(diff).max()))
+    mse = squared / max(count, 1)
+    psnr = float("inf") if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+    return CompressionReport(format, quality, seconds, float(np.sqrt(mse)), max_error, float(psnr))
+
+
+def encode_dds_level(rgba: np.ndarray, options: DDSOptions = DDSOptions()) -> Tuple[bytes, CompressionReport]:
+    """RGBA配列（H×W×4）の1レベル分を圧縮し、(ブロックデータ, 誤差レポート) を返す"""
+    if options.format not in DDS_FORMATS:
+        raise ValueError(f"未対応のDDS形式です: {options.format}")
+    if options.flip_y:
+        rgba = rgba[::-1]
+    height, width = rgba.shape[:2]
+
+    start = time.perf_counter()
+    if options.format == DDS_FORMAT_BC5:
+        red, green = np.ascontiguousarray(rgba[:, :, 0]), np.ascontiguousarray(rgba[:, :, 1])
+        blocks = encode_bc5(red, green, options.quality)
+        seconds = time.perf_counter() - start
+        pairs = list(zip((red, green), decode_bc5(blocks, height, width)))
+    else:
+        channel = np.ascontiguousarray(rgba[:, :, _CHANNEL_INDEX[options.bc4_channel]])
+        blocks = encode_bc4(channel, options.quality)
+        seconds = time.perf_counter() - start
+        pairs = [(channel, decode_bc4(blocks, height, width))]
+
+    return blocks.tobytes(), _report(options.format, options.quality, seconds, pairs)
+
+
+def save_dds(rgba: np.ndarray, output_path: str, options: DDSOptions = DDSOptions(),
+             mip_levels: Optional[List[np.ndarray]] = None) -> Tuple[OutputResult, Optional[CompressionReport]]:
+    """RGBA配列をDDS（BC5 / BC4）として保存（アルファとBは格納しない）
+
+    mip_levels には2段目以降のミップを渡す。誤差レポートは元の解像度（1段目）のもの
+    """
+    encode_seconds = write_seconds = 0.0
+    try:
+        start = time.perf_counter()
+        with stage("dds_encode") as measured:
+            data, report = encode_dds_level(rgba, options)
+            levels = [data] + [encode_dds_level(level, options)[0] for level in mip_levels or []]
+            height, width = rgba.shape[:2]
+            data = dds_header(width, height, options.format, levels) + b"".join(levels)
+            measured.bytes = len(data)
+        encode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with stage("write", len(data)):
+            write_atomic(data, output_path)
+        write_seconds = time.perf_counter() - start
+        return OutputResult(output_path, True, encode_seconds, write_seconds, len(data)), report
+    except Exception as e:
+        print(f"DDS保存エラー: {e}")
+        return OutputResult(output_path, False, encode_seconds, write_seconds, 0, str(e)), None
@@ -0,0 +1,104 @@
+"""二値マスクから符号付き距離場（SDF）を生成する処理
+
+距離変換にはOpenCVの厳密なユークリッド距離変換（DIST_MASK_PRECISE, 線形時間）を使用する。
+"""
+import math
+from typing import Optional
+
+import numpy as np
+
+
+# 既定の二値化しきい値（0-255）
+DEFAULT_THRESHOLD = 128
+
+# 既定の距離場の広がり（ピクセル）
+DEFAULT_SPREAD = 32.0
+
+# 距離変換を行うタイルの一辺（ピクセル）
+_TILE_SIZE = 256
+
+
+def threshold_mask(mask: np.ndarray, threshold: int = DEFAULT_THRESHOLD) -> np.ndarray:
+    """グレースケールのマスクを二値化（しきい値以上を内側=1とする）"""
+    return (mask >= threshold).astype(np.uint8)
+
+
+def euclidean_distance(binary: np.ndarray) -> np.ndarray:
+    """各画素（値1）から最も近い値0の画素までのユークリッド距離（float32）"""
+    # OpenCVは読み込みに時間がかかるため、初めて使うときに読み込む
+    import cv2
+    return cv2.distanceTransform(binary, cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+
+
+def signed_distance(binary: np.ndarray) -> np.ndarray:
+    """符号付き距離（内側が正、外側が負）
+
+    境界が画素と画素の間に来るよう、両側とも0.5ピクセルずらす
+    """
+    inside = euclidean_distance(binary)
+    outside = euclidean_distance(1 - binary)
+    return np.where(binary > 0, inside - 0.5, 0.5 - outside).astype(np.float32)
+
+
+def encode_signed_distance(distance: np.ndarray, spread: float,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+    """符号付き距離を 0-255 に正規化（境界=127.5、±spreadで飽和）"""
+    scaled = distance * np.float32(127.5 / spread)
+    scaled += np.float32(127.5)
+    np.clip(scaled, 0, 255, out=scaled)
+    np.rint(scaled, out=scaled)
+    if out is None:
+        return scaled.astype(np.uint8)
+    out[...] = scaled
+    return out
+
+
+def distance_margin(spread: float) -> int:
+    """距離が飽和するまでの余白（ピクセル。0.5ピクセルのずらしを含む）
+
+    この余白を付けて切り出した範囲を距離変換すれば、画像全体を距離変換した結果と一致する
+    """
+    return int(math.ceil(spread + 1))
+
+
+def compute_distance_field(binary: np.ndarray, spread: float = DEFAULT_SPREAD,
+                           out: Optional[np.ndarray] = None) -> np.ndarray:
+    """二値マスク（H×W, 0/1）から正規化済みの距離場（H×W, uint8）を生成
+
+    境界から spread 以上離れた画素は飽和するため、spread 分の余白を付けたタイル単位で距離変換し、
+    内側・外側だけで構成されるタイルは計算せずに飽和値で埋める。
+    余白内に最寄りの反対側画素が必ず含まれるので、画像全体を距離変換した結果と一致する。
+    """
+    if spread <= 0:
+        raise ValueError("spread は正の値である必要があります")
+
+    height, width = binary.shape
+    if out is None:
+        out = np.empty((height, width), dtype=np.uint8)
+
+    margin = distance_margin(spread)
+    tile = max(_TILE_SIZE, 2 * margin)
+
+    for top in range(0, height, tile):
+        bottom = min(top + tile, height)
+        pad_top = max(top - margin, 0)
+        pad_bottom = min(bottom + margin, height)
+
+        for left in range(0, width, tile):
+            right = min(left + tile, width)
+            pad_left = max(left - margin, 0)
+            pad_right = min(right + margin, width)
+
+            padded = binary[pad_top:pad_bottom, pad_left:pad_right]
+            lowest = padded.min()
+            if lowest == padded.max():
+                # 境界を含まないタイルは飽和値で埋める
+                out[top:bottom, left:right] = 255 if lowest else 0
+                continue
+
+            distance = signed_distance(np.ascontiguousarray(padded))
+            encode_signed_distance(distance[top - pad_top:bottom - pad_top,
+                                            left - pad_left:right - pad_left],
+                                   spread, out=out[top:bottom, left:right])
+
+    return out
@@ -0,0 +1,111 @@
+"""編集された領域の検出（インクリメンタルな再生成用）
+
+前回デコードした画像と新しくデコードした画像をタイル単位で比較し、変更のあったタイルを
+行ごとにまとめた矩形として返す。ブラシで数ストローク描き足して保存した場合などに、
+SDFとプレビューは変更のあった矩形だけを再計算すればよい。
+
+比較自体は画像全体を読むが、メモリ帯域の速さで終わる（8Kで数十ミリ秒）。
+同じ2枚の比較結果は直近の1組だけ保持し、フル解像度とプレビューの両方で使い回す。
+"""
+import threading
+import weakref
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from sdf_parallel import run_bands
+from sdf_profile import stage
+
+
+# 比較するタイルの一辺（ピクセル）
+TILE_SIZE = 128
+
+# 変更のあったタイルがこの割合を超える場合は、全体を再計算した方が速い
+FULL_REBUILD_RATIO = 0.5
+
+
+class DirtyRect(NamedTuple):
+    """変更のあった矩形（画素座標, bottom と right は含まない）"""
+    top: int
+    bottom: int
+    left: int
+    right: int
+
+
+_last_diff = None
+_last_diff_lock = threading.Lock()
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray, tile: int = TILE_SIZE,
+                  threads: int = 1) -> np.ndarray:
+    """2枚の画像（H×W×C）で画素が1つでも異なるタイル（行数×列数 の bool 配列）"""
+    height, width = current.shape[:2]
+    rows, cols = -(-height // tile), -(-width // tile)
+    dirty = np.zeros((rows, cols), dtype=bool)
+    # 行をバイト列として比較し、列方向はタイル単位で集計する
+    before = np.ascontiguousarray(previous).reshape(height, -1)
+    after = np.ascontiguousarray(current).reshape(height, -1)
+    row_bytes = after.shape[1]
+    tile_bytes = tile * (row_bytes // width)
+    # 割り切れる範囲で大きな整数型として比較する（比較する要素数が減り速くなる）
+    itemsize = next(size for size in (8, 4, 2, 1) if row_bytes % size == 0 and tile_bytes % size == 0)
+    before, after = before.view(f"u{itemsize}"), after.view(f"u{itemsize}")
+    row_items, tile_items = row_bytes // itemsize, tile_bytes // itemsize
+    padded = np.zeros(cols * tile_items, dtype=bool)
+
+    def compare_rows(first: int, last: int):
+        columns = padded.copy()
+        for row in range(first, last):
+            top, bottom = row * tile, min((row + 1) * tile, height)
+            np.any(before[top:bottom] != after[top:bottom], axis=0, out=columns[:row_items])
+            dirty[row] = columns.reshape(cols, tile_items).any(axis=1)
+
+    run_bands(compare_rows, [(row, row + 1) for row in range(rows)], threads)
+    return dirty
+
+
+def dirty_rects(dirty: np.ndarray, shape, tile: int = TILE_SIZE) -> List[DirtyRect]:
+    """変更のあったタイルを、タイルの行ごとに横に連続する範囲でまとめた矩形に変換"""
+    height, width = shape[:2]
+    rects = []
+    for row in range(dirty.shape[0]):
+        flags = np.concatenate(([False], dirty[row], [False]))
+        edges = np.flatnonzero(flags[1:] != flags[:-1])
+        for start, stop in zip(edges[::2], edges[1::2]):
+            rects.append(DirtyRect(row * tile, min((row + 1) * tile, height),
+                                   int(start) * tile, min(int(stop) * tile, width)))
+    return rects
+
+
+def find_changes(previous: Optional[np.ndarray], current: np.ndarray, tile: int = TILE_SIZE,
+                 threads: int = 1) -> Optional[List[DirtyRect]]:
+    """previous から current への変更を矩形のリストで返す
+
+    比較できない場合（前回がない・サイズが違う）や、変更が大きく全体を再計算した方が速い場合は None
+    """
+    global _last_diff
+    if previous is None or previous.shape != current.shape or previous.dtype != current.dtype:
+        return None
+    if previous is current:
+        return []
+
+    with _last_diff_lock:
+        if _last_diff is not None and _last_diff[0]() is previous and _last_diff[1]() is current \
+                and _last_diff[2] == tile:
+            return _last_diff[3]
+
+    with stage("diff") as measured:
+        dirty = changed_tiles(previous, current, tile, threads)
+        measured.bytes = current.nbytes
+    rects = None if dirty.mean() > FULL_REBUILD_RATIO else dirty_rects(dirty, current.shape, tile)
+
+    with _last_diff_lock:
+        # 配列の同一性で判定する（弱参照なので、古い画像のメモリは保持しない）
+        _last_diff = (weakref.ref(previous), weakref.ref(current), tile, rects)
+    return rects
+
+
+def changed_fraction(rects: List[DirtyRect], shape) -> float:
+    """変更のあった矩形が画像（shape = H×W…）に占める割合"""
+    area = sum((r.bottom - r.top) * (r.right - r.left) for r in rects)
+    return area / max(shape[0] * shape[1], 1)
@@ -0,0 +1,199 @@
+"""画像の読み込み処理（デコード結果のキャッシュ付き）
+
+同じファイルを何度もデコードしないよう、(パス, 更新時刻, サイズ) をキーにRGBA配列をキャッシュする。
+日本語パスでも読めるよう、ファイルは np.fromfile で読み込んでからデコードする。
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from sdf_profile import stage
+
+
+# キャッシュに保持するデコード結果の合計サイズ上限（MB）
+DEFAULT_CACHE_BUDGET_MB = 512
+
+# OpenCVの方がPillowより高速で、変換結果も一致する形式
+_OPENCV_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# そのうちOpenCVを使うPillowのモード（透過色 tRNS のあるもの・CMYKのJPEG・16bitはPillowと結果が異なる）
+_OPENCV_MODES = ("1", "L", "LA", "P", "RGB", "RGBA")
+_JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+# JPEGの縮小デコードに使うフラグ名（縮小率 → cv2 の定数名）
+_REDUCED_FLAGS = {
+    2: "IMREAD_REDUCED_COLOR_2",
+    4: "IMREAD_REDUCED_COLOR_4",
+    8: "IMREAD_REDUCED_COLOR_8",
+}
+
+
+class DecodedImage(NamedTuple):
+    """デコード結果"""
+    pixels: np.ndarray              # RGBA配列（H×W×4, uint8, 読み取り専用）
+    source_size: Tuple[int, int]    # 元画像のサイズ（幅, 高さ）
+
+
+def _to_rgba(decoded: np.ndarray) -> Optional[np.ndarray]:
+    """OpenCVのデコード結果をRGBAに変換（Pillowの convert('RGBA') と同じ結果にならない形式は None）"""
+    import cv2
+    if decoded is None or decoded.dtype != np.uint8:
+        return None
+    if decoded.ndim == 2:
+        return cv2.cvtColor(decoded, cv2.COLOR_GRAY2RGBA)
+    if decoded.shape[2] == 3:
+        return cv2.cvtColor(decoded, cv2.COLOR_BGR2RGBA)
+    if decoded.shape[2] == 4:
+        return cv2.cvtColor(decoded, cv2.COLOR_BGRA2RGBA)
+    return None
+
+
+def _reduce_factor(source_size: Tuple[int, int], max_size: Optional[Tuple[int, int]]) -> int:
+    """max_size 以上を保てる最大の縮小率（1, 2, 4, 8）"""
+    if max_size is None:
+        return 1
+    factor = 1
+    while (factor < 8 and source_size[0] // (factor * 2) >= max_size[0]
+           and source_size[1] // (factor * 2) >= max_size[1]):
+        factor *= 2
+    return factor
+
+
+def decode_image(data: np.ndarray, extension: str,
+                 max_size: Optional[Tuple[int, int]] = None) -> DecodedImage:
+    """ファイル内容をRGBA配列にデコード
+
+    max_size を指定すると、JPEGはそのサイズを下回らない範囲で縮小デコードする（プレビュー用）
+    """
+    with stage("decode") as measured:
+        decoded = _decode(data, extension.lower(), max_size)
+        measured.bytes = decoded.pixels.nbytes
+    return decoded
+
+
+def _decode(data: np.ndarray, extension: str, max_size: Optional[Tuple[int, int]]) -> DecodedImage:
+
+    with Image.open(io.BytesIO(data)) as image:
+        # ヘッダーだけを読んで元のサイズを取得
+        source_size = image.size
+
+        if (extension in _OPENCV_EXTENSIONS and image.mode in _OPENCV_MODES
+                and "transparency" not in image.info):
+            # OpenCVは読み込みに時間がかかるため、初めて使うときに読み込む
+            import cv2
+            factor = _reduce_factor(source_size, max_size) if extension in _JPEG_EXTENSIONS else 1
+            if factor > 1:
+                flags = getattr(cv2, _REDUCED_FLAGS[factor]) | cv2.IMREAD_IGNORE_ORIENTATION
+            else:
+                flags = cv2.IMREAD_UNCHANGED | cv2.IMREAD_IGNORE_ORIENTATION
+            pixels = _to_rgba(cv2.imdecode(data, flags))
+            if pixels is not None:
+                return DecodedImage(pixels, source_size)
+
+        # OpenCVで扱えない形式（TGA、16bit PNG、透過色付きPNG、アルファ付きTIFFなど）はPillowで読み込む
+        if max_size is not None:
+            image.draft('RGBA', max_size)
+        return DecodedImage(np.array(image.convert('RGBA')), source_size)
+
+
+class ImageCache:
+    """デコード結果のキャッシュ（スレッドセーフ、合計サイズで古いものから破棄）
+
+    デコードはロックの外で行うため、別のファイルの読み込みは並行して進む。
+    同じファイルを同時に要求された場合は、先に始めたデコードの結果を待って共有する。
+    """
+
+    def __init__(self, budget_mb: float = DEFAULT_CACHE_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # デコード中のキー → 結果の Future
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, image_path: str, max_size: Optional[Tuple[int, int]] = None) -> DecodedImage:
+        """画像を読み込む（キャッシュにあればデコードしない）
+
+        フル解像度のデコード結果がキャッシュにある場合は、縮小要求にもそれを返す
+        """
+        stat = os.stat(image_path)
+        file_key = (os.path.normcase(os.path.abspath(image_path)), stat.st_mtime_ns, stat.st_size)
+
+        keys = ((file_key, None), (file_key, max_size))
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+            pending = next((self._loading[key] for key in keys if key in self._loading), None)
+            if pending is None:
+                self.misses += 1
+                future = self._loading[keys[1]] = Future()
+            else:
+                self.hits += 1
+
+        if pending is not None:
+            # 同じファイルのデコードが進行中なので、その結果を使う
+            return pending.result()
+
+        try:
+            data = np.fromfile(image_path, dtype=np.uint8)
+            decoded = decode_image(data, os.path.splitext(image_path)[1], max_size)
+            decoded.pixels.flags.writeable = False
+        except BaseException as e:
+            with self._lock:
+                del self._loading[keys[1]]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[keys[1]]
+            # 縮小デコードされなかった場合はフル解像度として登録する
+            if decoded.pixels.shape[1] == decoded.source_size[0]:
+                max_size = None
+            self._store((file_key, max_size), decoded)
+        future.set_result(decoded)
+        return decoded
+
+    def _store(self, key, decoded: DecodedImage):
+        size = decoded.pixels.nbytes
+        if size > self.budget_bytes:
+            return
+        # 同じファイルの古い版は不要なので破棄する
+        path = key[0][0]
+        for old_key in [k for k in self._entries if k[0][0] == path and k[0] != key[0]]:
+            self._total_bytes -= self._entries.pop(old_key).pixels.nbytes
+        while self._entries and self._total_bytes + size > self.budget_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.pixels.nbytes
+        self._entries[key] = decoded
+        self._total_bytes += size
+
+    def stats(self) -> dict:
+        """ヒット数・ミス数・保持している件数とサイズ"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "bytes": self._total_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+# アプリ全体で共有するキャッシュ
+image_cache = ImageCache()
+
+
+def load_image(image_path: str, max_size: Optional[Tuple[int, int]] = None) -> DecodedImage:
+    """共有キャッシュを通して画像を読み込む（日本語パス対応）"""
+    return image_cache.load(image_path, max_size)
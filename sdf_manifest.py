@@ -0,0 +1,200 @@
+"""インクリメンタルビルド用のマニフェスト
+
+入力ファイルの内容ハッシュと生成設定・出力設定、出力ファイルとそのハッシュを記録し、
+変更のない入力の再生成をスキップする。
+"""
+import hashlib
+import json
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from sdf_dds import DDSOptions
+from sdf_mipmap import MipmapOptions, mip_level_path
+from sdf_output import PNGOptions
+from sdf_processor import GeneratorSettings
+
+
+# 生成処理の結果や記録の形式が変わる変更を行ったら上げる（既存の記録をすべて無効化する）
+MANIFEST_VERSION = 2
+
+# GUIが出力先フォルダに置くマニフェストのファイル名（Unityはドットで始まるファイルを取り込まない）
+MANIFEST_FILENAME = ".sdf_manifest.json"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path: str) -> str:
+    """ファイル内容のハッシュ"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_manifest_path(output_path: str) -> str:
+    """出力先フォルダのマニフェストパス"""
+    return os.path.join(os.path.dirname(os.path.abspath(output_path)), MANIFEST_FILENAME)
+
+
+def output_settings(options: PNGOptions = PNGOptions(), dds_options: Optional[DDSOptions] = None,
+                    mipmap_options: MipmapOptions = MipmapOptions()) -> dict:
+    """出力ファイルの内容に影響する出力設定（スレッド数など結果の変わらない設定は含めない）
+
+    dds_options には DDS で出力する場合の設定を渡す（PNG の場合は None）
+    """
+    if dds_options is not None:
+        values = {"format": "dds", "dds": dict(dds_options._asdict())}
+    else:
+        values = {"format": "png", "compress_level": options.compress_level,
+                  "compact_channels": options.compact_channels}
+    # ミップマップを出力しない場合はフィルタによらず同じ
+    values["mip_filter"] = mipmap_options.filter if mipmap_options.enabled else None
+    return values
+
+
+def _mip_level_count(output_path: str, outputs: dict) -> int:
+    """PNGのミップチェーンで、output_path 以外に書き出されているレベルの数（DDSは同じファイルに含まれる）"""
+    if outputs.get("format") != "png" or outputs.get("mip_filter") is None:
+        return 0
+    count = 0
+    while os.path.exists(mip_level_path(output_path, count + 1)):
+        count += 1
+    return count
+
+
+class InputState(NamedTuple):
+    """判定時点での入力ファイルの状態"""
+    hash: str
+    size: int
+    mtime_ns: int
+
+
+def _normalize(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class BuildManifest:
+    """入力と出力の対応を記録する永続マニフェスト"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.rebuilds = 0
+        self.load()
+
+    def load(self):
+        """マニフェストを読み込む（存在しない・壊れている・版が異なる場合は空で開始）"""
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("entries", {})
+        except Exception as e:
+            print(f"マニフェスト読み込みエラー: {e}")
+
+    def save(self) -> bool:
+        """マニフェストを保存（一時ファイルに書いてから置き換える）"""
+        temp_path = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "entries": self.entries},
+                          f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+            return True
+        except Exception as e:
+            print(f"マニフェスト保存エラー: {e}")
+            return False
+
+    @staticmethod
+    def _settings_dict(settings: GeneratorSettings) -> dict:
+        values = dict(settings._asdict())
+        # アトラスの配置はファイルの内容で比較する（未指定なら配置を使わない場合の記録と同じ形）
+        layout = values.pop("layout", "")
+        if layout:
+            values["layout"] = file_hash(layout)
+        return values
+
+    def _content_hash(self, path: str, size: int, mtime_ns: int,
+                      recorded: Optional[dict], prefix: str) -> str:
+        """サイズと更新時刻が記録と同じならハッシュ計算を省略する"""
+        if (recorded is not None and recorded.get(f"{prefix}_size") == size
+                and recorded.get(f"{prefix}_mtime_ns") == mtime_ns):
+            return recorded[f"{prefix}_hash"]
+        return file_hash(path)
+
+    def check(self, input_path: str, output_path: str, settings: GeneratorSettings,
+              outputs: Optional[dict] = None) -> Tuple[bool, Optional[InputState]]:
+        """出力が最新か判定し、(最新かどうか, 判定時点の入力の状態) を返す
+
+        outputs には output_settings() で作成した出力設定を渡す（省略時は既定の PNG 出力）。
+        入力の内容・設定・出力設定・出力パスが記録と一致し、出力が記録時のまま残っていれば最新とみなす。
+        上書き保存で更新時刻だけが変わった場合も、内容が同じなら最新と判定される。
+        """
+        if not os.path.exists(input_path):
+            return False, None
+
+        recorded = self.entries.get(_normalize(input_path))
+        input_size, input_mtime = _stat_key(input_path)
+        input_hash = self._content_hash(input_path, input_size, input_mtime, recorded, "input")
+        state = InputState(input_hash, input_size, input_mtime)
+
+        outputs = outputs if outputs is not None else output_settings()
+        if (recorded is None or recorded.get("input_hash") != input_hash
+                or recorded.get("settings") != self._settings_dict(settings)
+                or recorded.get("outputs") != outputs
+                or recorded.get("output") != _normalize(output_path)
+                or not os.path.exists(output_path)):
+            return False, state
+        # ミップチェーンのレベルが削除されている場合も再生成する
+        mip_levels = recorded.get("mip_levels", 0)
+        if mip_levels and _mip_level_count(output_path, outputs) < mip_levels:
+            return False, state
+
+        output_size, output_mtime = _stat_key(output_path)
+        output_hash = self._content_hash(output_path, output_size, output_mtime, recorded, "output")
+        if output_hash != recorded.get("output_hash"):
+            return False, state
+
+        # 内容は同じで更新時刻だけ変わった場合、次回はハッシュ計算を省略できるよう記録を更新
+        recorded.update(input_size=input_size, input_mtime_ns=input_mtime,
+                        output_size=output_size, output_mtime_ns=output_mtime)
+        self.hits += 1
+        return True, state
+
+    def record(self, input_path: str, output_path: str, settings: GeneratorSettings,
+               input_state: Optional[InputState] = None, outputs: Optional[dict] = None):
+        """生成結果を記録
+
+        outputs には check() と同じ出力設定を渡す。
+        input_state には生成前に check() で得た状態を渡す（生成中に入力が変更された場合に次回再生成させるため）
+        """
+        if input_state is None:
+            size, mtime_ns = _stat_key(input_path)
+            input_state = InputState(file_hash(input_path), size, mtime_ns)
+        output_size, output_mtime = _stat_key(output_path)
+        outputs = outputs if outputs is not None else output_settings()
+        self.rebuilds += 1
+        self.entries[_normalize(input_path)] = {
+            "input_hash": input_state.hash,
+            "input_size": input_state.size,
+            "input_mtime_ns": input_state.mtime_ns,
+            "settings": self._settings_dict(settings),
+            "outputs": outputs,
+            "mip_levels": _mip_level_count(output_path, outputs),
+            "output": _normalize(output_path),
+            "output_hash": file_hash(output_path),
+            "output_size": output_size,
+            "output_mtime_ns": output_mtime,
+        }
@@ -0,0 +1,151 @@
+"""距離場向けのミップマップ生成
+
+Unityの既定のボックスフィルタは、0/255 に飽和した画素や透明部分の画素も平均に混ぜるため、
+低解像度のミップでしきい値の境界がずれ、遠くで顔影がちらつく原因になる。
+distance フィルタは 2×2 画素の中央2値の平均（= 合計 − 最小 − 最大 の半分）を使う。
+線形な距離場ではボックスフィルタと同じ値になり、飽和した外れ値や透明画素には引きずられない。
+"""
+import os
+from typing import List, NamedTuple
+
+import numpy as np
+
+from sdf_output import OutputResult, PNGOptions, save_png
+from sdf_profile import stage
+
+
+MIP_FILTER_DISTANCE = "distance"  # 距離場向け（中央2値の平均・透明画素を除外）
+MIP_FILTER_BOX = "box"            # 単純な 2×2 平均（Unityの既定と同等）
+MIP_FILTERS = (MIP_FILTER_DISTANCE, MIP_FILTER_BOX)
+
+
+class MipmapOptions(NamedTuple):
+    """ミップマップ出力の設定"""
+    enabled: bool = False
+    filter: str = MIP_FILTER_DISTANCE
+
+
+def mip_count(width: int, height: int) -> int:
+    """1×1 までのミップレベル数（元の画像を含む）"""
+    return max(width, height).bit_length()
+
+
+def _pair_slices(size: int):
+    """縮小後の各画素に対応する2画素（奇数サイズの端の1列・1行は捨てる。サイズ1なら同じ画素を使う）"""
+    if size == 1:
+        return slice(0, 1), slice(0, 1)
+    half = size // 2
+    return slice(0, 2 * half, 2), slice(1, 2 * half, 2)
+
+
+def _quad(plane: np.ndarray) -> List[np.ndarray]:
+    """各 2×2 画素の4つの値（縮小後のサイズのビュー）"""
+    rows = _pair_slices(plane.shape[0])
+    cols = _pair_slices(plane.shape[1])
+    return [plane[r, c] for r in rows for c in cols]
+
+
+def _box(plane: np.ndarray) -> np.ndarray:
+    """2×2 平均（四捨五入）"""
+    # OpenCVは読み込みに時間がかかるため、初めて使うときに読み込む
+    import cv2
+    height, width = plane.shape
+    # 奇数サイズの端は捨て、ちょうど1/2の縮小にする（OpenCVの面積平均は整数演算で高速）
+    cropped = plane[:height - height % 2 if height > 1 else 1, :width - width % 2 if width > 1 else 1]
+    return cv2.resize(cropped, (max(1, width // 2), max(1, height // 2)), interpolation=cv2.INTER_AREA)
+
+
+def _median(plane: np.ndarray) -> np.ndarray:
+    """2×2 の中央2値の平均（四捨五入）"""
+    a, b, c, d = _quad(plane)
+    # ソーティングネットワークで中央の2値を求める
+    low = np.maximum(np.minimum(a, b), np.minimum(c, d))
+    high = np.minimum(np.maximum(a, b), np.maximum(c, d))
+    # 桁あふれしない切り上げ平均 = (low + high + 1) // 2
+    return (low | high) - ((low ^ high) >> 1)
+
+
+def _fix_partial(planes: List[np.ndarray], alpha: np.ndarray, result: List[np.ndarray]):
+    """一部だけ透明な 2×2 は、不透明な画素だけで中央値をとり直す（境界付近の少数の画素のみ）"""
+    opaque = np.stack([q > 0 for q in _quad(alpha)], axis=-1)
+    count = opaque.sum(axis=-1)
+    partial = np.nonzero((count > 0) & (count < 4))
+    if not partial[0].size:
+        return
+
+    valid = opaque[partial]
+    k = count[partial].astype(np.float32)
+    for plane, out in zip(planes, result):
+        values = np.stack([q[partial] for q in _quad(plane)], axis=-1).astype(np.float32)
+        masked_sum = np.where(valid, values, 0).sum(axis=-1)
+        low = np.where(valid, values, np.inf).min(axis=-1)
+        high = np.where(valid, values, -np.inf).max(axis=-1)
+        # 有効な画素数 k の中央値：k=3 は 合計 − 最小 − 最大、k=1,2 は平均
+        median = np.where(k > 2, masked_sum - low - high, masked_sum / k)
+        out[partial] = np.rint(median).astype(np.uint8)
+
+
+def _downsample_planes(planes: List[np.ndarray], filter: str) -> List[np.ndarray]:
+    """R・G・B・A の各チャンネルを1段縮小"""
+    if filter not in MIP_FILTERS:
+        raise ValueError(f"未対応のミップマップフィルタです: {filter}")
+    if filter == MIP_FILTER_BOX:
+        return [_box(plane) for plane in planes]
+
+    # R・G は中央値、B・A は平均
+    result = [_median(planes[0]), _median(planes[1]), _box(planes[2]), _box(planes[3])]
+    if planes[3].min() == 0:
+        _fix_partial(planes[:2], planes[3], result[:2])
+    return result
+
+
+def downsample(level: np.ndarray, filter: str = MIP_FILTER_DISTANCE) -> np.ndarray:
+    """RGBAのミップを1段縮小（H×W×4 → max(1, H/2)×max(1, W/2)×4）"""
+    import cv2
+    return _merge(_downsample_planes(list(cv2.split(level)), filter))
+
+
+def _merge(planes: List[np.ndarray]) -> np.ndarray:
+    import cv2
+    merged = cv2.merge(planes)
+    # 1×1 などでは cv2.merge が3次元にならないことがあるため形を揃える
+    return merged.reshape(planes[0].shape + (4,))
+
+
+def build_mip_chain(rgba: np.ndarray, filter: str = MIP_FILTER_DISTANCE) -> List[np.ndarray]:
+    """元の画像から 1×1 までのミップチェーンを作成（各レベルは直前のレベルから1回で求める）
+
+    RGBA を並べたままだと2×2の取り出しが遅いため、チャンネルごとに分けて処理する
+    """
+    import cv2
+    with stage("mipmap") as measured:
+        levels = [rgba]
+        planes = list(cv2.split(rgba))
+        for _ in range(mip_count(rgba.shape[1], rgba.shape[0]) - 1):
+            planes = _downsample_planes(planes, filter)
+            levels.append(_merge(planes))
+        measured.bytes = sum(level.nbytes for level in levels[1:])
+    return levels
+
+
+def mip_level_path(output_path: str, level: int) -> str:
+    """レベルごとのPNGのパス（レベル0は output_path、それ以降は <stem>_mip<n>.png）"""
+    if level == 0:
+        return output_path
+    stem, extension = os.path.splitext(output_path)
+    return f"{stem}_mip{level}{extension}"
+
+
+def save_png_chain(levels: List[np.ndarray], output_path: str,
+                   options: PNGOptions = PNGOptions()) -> OutputResult:
+    """ミップチェーンをレベルごとのPNGとして保存（結果はすべてのレベルの合計）"""
+    encode_seconds = write_seconds = 0.0
+    bytes_written = 0
+    for index, level in enumerate(levels):
+        result = save_png(level, mip_level_path(output_path, index), options)
+        encode_seconds += result.encode_seconds
+        write_seconds += result.write_seconds
+        bytes_written += result.bytes_written
+        if not result.success:
+            return OutputResult(output_path, False, encode_seconds, write_seconds, bytes_written, result.error)
+    return OutputResult(output_path, True, encode_seconds, write_seconds, bytes_written)
@@ -0,0 +1,125 @@
+"""光源角度ごとの複数マスクから顔影用グラデーションを合成する処理
+
+マスクは光源角度の順に並べ、各ピクセルが「何フレーム目で明るくなるか」を
+隣り合うマスク間の距離変換で補間して求める。
+最初のマスクで明るいピクセルが 255、最後のマスクでも暗いピクセルが 0 になる。
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sdf_distance import euclidean_distance
+
+
+class MaskSequenceSynthesizer:
+    """二値マスク列から補間済みグラデーションを合成するクラス
+
+    フレームごとの距離場と区間ごとの補間結果をマスクの内容で管理し、
+    マスクを1枚編集した場合は、そのマスクの距離場と隣接する2区間だけを再計算する。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        # マスクのハッシュ → {"inside": 内側距離, "outside": 外側距離}
+        self._frame_fields: Dict[str, Dict[str, np.ndarray]] = {}
+        # (前のマスクのハッシュ, 次のマスクのハッシュ) → (新たに明るくなる画素の位置, 区間内の補間値)
+        self._intervals: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        self.last_stats = {"frames_computed": 0, "intervals_computed": 0, "intervals_reused": 0}
+
+    @staticmethod
+    def _digest(binary: np.ndarray) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(binary.shape).encode())
+        digest.update(binary.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _frame_distance(binary: np.ndarray, kind: str) -> np.ndarray:
+        if kind == "inside":
+            # 内側の各画素から最も近い外側画素までの距離
+            return euclidean_distance(binary)
+        # 外側の各画素から最も近い内側画素までの距離
+        return euclidean_distance(1 - binary)
+
+    @staticmethod
+    def _interpolate_interval(earlier: np.ndarray, later: np.ndarray,
+                              outside_earlier: np.ndarray,
+                              inside_later: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """前のマスクでは暗く、次のマスクで明るくなる画素の区間内の位置（0-1）を求める"""
+        indices = np.flatnonzero((later > 0) & (earlier == 0))
+        to_earlier = outside_earlier.ravel()[indices]
+        to_later = inside_later.ravel()[indices]
+        # 前のマスクの境界に近いほど早く（0に近く）明るくなる
+        position = to_earlier / (to_earlier + to_later)
+        return indices, position.astype(np.float32)
+
+    def synthesize(self, masks: List[np.ndarray]) -> np.ndarray:
+        """二値マスク（H×W, 0/1）の列からグラデーション（H×W, uint8）を合成"""
+        if not masks:
+            raise ValueError("マスクが指定されていません")
+
+        shape = masks[0].shape
+        if any(mask.shape != shape for mask in masks):
+            raise ValueError("すべてのマスクは同じサイズである必要があります")
+
+        binaries = [(mask > 0).astype(np.uint8) for mask in masks]
+        count = len(binaries)
+        if count == 1:
+            self.last_stats = {"frames_computed": 0, "intervals_computed": 0, "intervals_reused": 0}
+            return binaries[0] * np.uint8(255)
+
+        keys = [self._digest(binary) for binary in binaries]
+        interval_keys = [(keys[i], keys[i + 1]) for i in range(count - 1)]
+        pending = [i for i, key in enumerate(interval_keys) if key not in self._intervals]
+
+        # 再計算が必要な区間に必要なフレームの距離場を列挙
+        frame_tasks = {}
+        for i in pending:
+            for index, kind in ((i, "outside"), (i + 1, "inside")):
+                fields = self._frame_fields.get(keys[index], {})
+                if kind not in fields:
+                    frame_tasks[(keys[index], kind)] = binaries[index]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 距離変換はOpenCV内でGILを解放するため、スレッドで並列化できる
+            futures = {task: executor.submit(self._frame_distance, binary, task[1])
+                       for task, binary in frame_tasks.items()}
+            for (key, kind), future in futures.items():
+                self._frame_fields.setdefault(key, {})[kind] = future.result()
+
+            futures = {i: executor.submit(self._interpolate_interval,
+                                          binaries[i], binaries[i + 1],
+                                          self._frame_fields[keys[i]]["outside"],
+                                          self._frame_fields[keys[i + 1]]["inside"])
+                       for i in pending}
+            for i, future in futures.items():
+                self._intervals[interval_keys[i]] = future.result()
+
+        # 現在の列で使われないキャッシュは破棄する
+        used_keys = set(keys)
+        self._frame_fields = {key: value for key, value in self._frame_fields.items() if key in used_keys}
+        used_intervals = set(interval_keys)
+        self._intervals = {key: value for key, value in self._intervals.items() if key in used_intervals}
+
+        self.last_stats = {
+            "frames_computed": len(frame_tasks),
+            "intervals_computed": len(pending),
+            "intervals_reused": len(interval_keys) - len(pending),
+        }
+
+        # 各画素が明るくなるフレーム位置（0 〜 count-1）を求める
+        first_lit = binaries[0].ravel() > 0
+        frame_position = np.full(first_lit.size, count - 1, dtype=np.float32)
+        frame_position[first_lit] = 0
+        assigned = first_lit.copy()
+        for i, interval_key in enumerate(interval_keys):
+            indices, position = self._intervals[interval_key]
+            # マスクが単調でない場合は最初に明るくなった区間を優先
+            fresh = ~assigned[indices]
+            frame_position[indices[fresh]] = i + position[fresh]
+            assigned[indices[fresh]] = True
+
+        gradient = (1.0 - frame_position / np.float32(count - 1)) * np.float32(255)
+        return np.rint(gradient).astype(np.uint8).reshape(shape)
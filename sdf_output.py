@@ -0,0 +1,229 @@
+"""PNG出力処理（圧縮プリセット・アトミックな書き込み・バックグラウンド書き込み）
+
+出力は同じフォルダの一時ファイルに書いてから置き換えるため、
+監視中のツールやUnityが書き込み途中のファイルを読むことはない。
+"""
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from typing import Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+
+from sdf_parallel import band_ranges, run_bands
+from sdf_profile import stage
+
+
+class PNGOptions(NamedTuple):
+    """PNG出力の設定"""
+    compress_level: int = 6         # zlibの圧縮レベル 0-9（6 は従来の Pillow の既定値と同じ）
+    compact_channels: bool = False  # 全面不透明ならアルファチャンネルを省いてRGBで書き出す
+    threads: int = 1                # 2以上なら行の帯ごとにフィルタと圧縮を並列に行う
+
+
+# 圧縮プリセット（fast: 約3倍速くファイルは約3割大きい / small: 最小サイズだが非常に遅い）
+COMPRESSION_PRESETS: Dict[str, PNGOptions] = {
+    "fast": PNGOptions(compress_level=1),
+    "default": PNGOptions(compress_level=6),
+    "small": PNGOptions(compress_level=9),
+}
+DEFAULT_COMPRESSION = "default"
+
+# Windowsでは他のプロセスが開いている間は置き換えに失敗することがあるため、少し待って再試行する
+_REPLACE_RETRIES = 10
+_REPLACE_RETRY_INTERVAL = 0.05
+
+
+class OutputResult(NamedTuple):
+    """1ファイル分の出力結果"""
+    path: str
+    success: bool
+    encode_seconds: float
+    write_seconds: float
+    bytes_written: int
+    error: Optional[str] = None
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_FILTER_UP = 2
+_ADLER_BASE = 65521
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def _adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """2つのデータのAdler-32から連結したデータのAdler-32を求める（zlib の adler32_combine と同じ）"""
+    remainder = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (remainder * sum1) % _ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xFFFF) + _ADLER_BASE - 1) % _ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - remainder) % _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def encode_png_parallel(pixels: np.ndarray, compress_level: int, threads: int) -> bytes:
+    """RGBまたはRGBA配列（H×W×3/4, uint8）を行の帯ごとに並列でPNGにエンコード
+
+    各帯をUpフィルタで差分化して独立に圧縮し、Z_SYNC_FLUSH で区切ったdeflateのブロックを連結する
+    （pigz と同じ方式。帯の境目で辞書がリセットされるため、ファイルは1スレッドより少し大きくなる）
+    """
+    height, width, channels = pixels.shape
+    row_bytes = width * channels
+
+    def encode_band(top: int, bottom: int):
+        # 帯の直前の行も読む（RGBのみ書き出す場合は帯ごとに詰め直す）
+        start = max(top - 1, 0)
+        rows = np.ascontiguousarray(pixels[start:bottom]).reshape(bottom - start, row_bytes)
+        filtered = np.empty((bottom - top, row_bytes + 1), dtype=np.uint8)
+        filtered[:, 0] = _PNG_FILTER_UP
+        # Upフィルタ：真上の行との差分（先頭行は0の行を参照する。uint8の桁あふれはmod 256）
+        if top == 0:
+            filtered[0, 1:] = rows[0]
+            np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        else:
+            np.subtract(rows[1:], rows[:-1], out=filtered[:, 1:])
+
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        last = bottom == height
+        data = compressor.compress(filtered) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+        return data, zlib.adler32(filtered), filtered.nbytes
+
+    bands = run_bands(encode_band, band_ranges(height, width, threads), threads)
+
+    adler = 1
+    for _, band_adler, length in bands:
+        adler = _adler32_combine(adler, band_adler, length)
+    # zlibヘッダ（32KBの窓・既定の圧縮レベル）+ deflateのブロック + Adler-32
+    stream = b"".join([b"\x78\x9c"] + [data for data, _, _ in bands] + [struct.pack(">I", adler)])
+    # 8bit / カラータイプ6（RGBA）または2（RGB） / 圧縮0 / フィルタ0 / インターレースなし
+    header = struct.pack(">IIBBBBB", width, height, 8, 6 if channels == 4 else 2, 0, 0, 0)
+    return b"".join([_PNG_SIGNATURE, _png_chunk(b"IHDR", header), _png_chunk(b"IDAT", stream),
+                     _png_chunk(b"IEND", b"")])
+
+
+def encode_png(rgba: np.ndarray, options: PNGOptions = PNGOptions()) -> bytes:
+    """RGBA配列（H×W×4, uint8）をPNGにエンコード（options.threads が2以上なら帯ごとに並列）"""
+    opaque = options.compact_channels and bool(np.all(rgba[:, :, 3] == 255))
+    if options.threads > 1:
+        return encode_png_parallel(rgba[:, :, :3] if opaque else rgba, options.compress_level, options.threads)
+
+    # OpenCVは読み込みに時間がかかるため、初めて使うときに読み込む
+    import cv2
+    if opaque:
+        # PNGにはR・Gだけの形式がないため、省けるのは不透明なアルファのみ（Bは0なのでほぼ圧縮される）
+        bgr = cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+    else:
+        bgr = cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA)
+    ok, encoded = cv2.imencode(".png", bgr, [cv2.IMWRITE_PNG_COMPRESSION, options.compress_level])
+    if not ok:
+        raise RuntimeError("PNGのエンコードに失敗しました")
+    return encoded.tobytes()
+
+
+def temporary_path(output_path: str) -> str:
+    """出力と同じフォルダの一時ファイルパス（画像の拡張子にしないので監視対象にならない）"""
+    directory, name = os.path.split(os.path.abspath(output_path))
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def replace_file(temp_path: str, output_path: str):
+    """一時ファイルで出力を置き換える"""
+    for attempt in range(_REPLACE_RETRIES):
+        try:
+            os.replace(temp_path, output_path)
+            return
+        except PermissionError:
+            if attempt == _REPLACE_RETRIES - 1:
+                raise
+            time.sleep(_REPLACE_RETRY_INTERVAL)
+
+
+def write_atomic(data: bytes, output_path: str):
+    """一時ファイルに書いてから置き換える（日本語パス対応）"""
+    temp_path = temporary_path(output_path)
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        replace_file(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def save_png(rgba: np.ndarray, output_path: str, options: PNGOptions = PNGOptions()) -> OutputResult:
+    """RGBA配列をPNGとして保存し、エンコード時間と書き込みサイズを返す"""
+    encode_seconds = write_seconds = 0.0
+    try:
+        start = time.perf_counter()
+        with stage("png_encode") as measured:
+            data = encode_png(rgba, options)
+            measured.bytes = len(data)
+        encode_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with stage("write", len(data)):
+            write_atomic(data, output_path)
+        write_seconds = time.perf_counter() - start
+        return OutputResult(output_path, True, encode_seconds, write_seconds, len(data))
+    except Exception as e:
+        print(f"保存エラー: {e}")
+        return OutputResult(output_path, False, encode_seconds, write_seconds, 0, str(e))
+
+
+class OutputWriter:
+    """画像のエンコードと書き込みを行うバックグラウンドスレッド
+
+    submit() は画像をコピーしてすぐに戻るため、呼び出し側は次の計算に進める。
+    同じパスへの書き込みは登録順に行われる。
+    """
+
+    def __init__(self, options: PNGOptions = PNGOptions(), max_pending: int = 4):
+        self.options = options
+        # 未処理の画像はメモリに残るため、溜まりすぎたら submit() を待たせる
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="SDFOutputWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, rgba: np.ndarray, output_path: str,
+               options: Optional[PNGOptions] = None,
+               save: Optional[Callable[[np.ndarray, str], OutputResult]] = None) -> "Future[OutputResult]":
+        """書き込みを登録（rgba はコピーするので、呼び出し後に書き換えてよい）
+
+        save を指定するとPNGの代わりに save(rgba, output_path) で保存する（DDSなど）
+        """
+        future = Future()
+        if save is None:
+            png_options = options or self.options
+            save = lambda pixels, path: save_png(pixels, path, png_options)
+        self._queue.put((np.array(rgba, copy=True), output_path, save, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            rgba, output_path, save, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = save(rgba, output_path)
+            except Exception as e:
+                # 1件の失敗で書き込みスレッドを止めない（例外は Future から呼び出し側に渡す）
+                print(f"保存エラー: {e}")
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: Optional[float] = None):
+        """登録済みの書き込みを終えてから停止"""
+        self._queue.put(None)
+        self._thread.join(timeout)
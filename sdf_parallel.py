@@ -0,0 +1,82 @@
+"""行の帯に分けた複数スレッドでの処理
+
+NumPy の配列演算・OpenCV・zlib の圧縮は処理中に GIL を解放するため、
+画像を行の帯に分けてスレッドで処理すると1枚の画像でも複数のコアを使える。
+各帯は共有の出力バッファの重ならない行に書き込むので、結果は1スレッドで処理した場合と一致する。
+"""
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# 1つの帯の画素数の目安（帯ごとの作業領域がCPUキャッシュに収まりやすい大きさ）
+BAND_PIXELS = 1024 * 1024
+
+# スレッドあたりの帯の数の下限（帯ごとの処理時間のばらつきを均す）
+_BANDS_PER_THREAD = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_threads = 0
+_executor_users: Dict[ThreadPoolExecutor, int] = {}  # 使用中の呼び出しの数（作り直した古いプールを含む）
+_executor_lock = threading.Lock()
+
+
+def band_ranges(height: int, width: int, threads: int, min_rows: int = 1) -> List[Tuple[int, int]]:
+    """0〜height の行を帯 (top, bottom) に分割
+
+    各スレッドに複数の帯が行き渡り、1つの帯が BAND_PIXELS 程度になるように分ける。
+    min_rows は帯の最小の行数（帯の上下に余白が必要な処理で、余白の割合を抑えるため）
+    """
+    if height <= 0:
+        return []
+    rows = min(math.ceil(height / (max(threads, 1) * _BANDS_PER_THREAD)),
+               max(BAND_PIXELS // max(width, 1), 1))
+    rows = max(rows, min_rows, 1)
+    return [(top, min(top + rows, height)) for top in range(0, height, rows)]
+
+
+@contextmanager
+def _shared_executor(threads: int) -> Iterator[ThreadPoolExecutor]:
+    """共有のスレッドプールを借りる（より多くのスレッドが要求されたときだけ作り直す）
+
+    作り直した古いプールは、それを使用中の呼び出しが全て終わってから停止する
+    """
+    global _executor, _executor_threads
+    with _executor_lock:
+        if _executor is None or _executor_threads < threads:
+            retired = _executor
+            _executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="SDFBand")
+            _executor_threads = threads
+            if retired is not None and retired not in _executor_users:
+                retired.shutdown(wait=False)
+        executor = _executor
+        _executor_users[executor] = _executor_users.get(executor, 0) + 1
+    try:
+        yield executor
+    finally:
+        with _executor_lock:
+            _executor_users[executor] -= 1
+            if _executor_users[executor] == 0:
+                del _executor_users[executor]
+                if executor is not _executor:
+                    executor.shutdown(wait=False)
+
+
+def run_bands(func: Callable[[int, int], object], ranges: List[Tuple[int, int]], threads: int) -> list:
+    """各帯で func(top, bottom) を実行し、帯の順に結果を返す
+
+    threads が 1 以下、または帯が1つの場合は呼び出し元のスレッドで順に実行する。
+    いずれかの帯で例外が発生した場合は、全ての帯の終了を待ってから送出する
+    """
+    if threads <= 1 or len(ranges) <= 1:
+        return [func(top, bottom) for top, bottom in ranges]
+
+    with _shared_executor(threads) as executor:
+        futures = [executor.submit(func, top, bottom) for top, bottom in ranges]
+        # 途中で送出すると、残りの帯が呼び出し元のバッファに書き込み続けるため全て待つ
+        errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
@@ -0,0 +1,166 @@
+"""生の画素データをパイプで受け渡すフレーム列の処理（ffmpeg の rawvideo と同じ形式）
+
+標準入力から宣言したサイズ・形式のフレーム（行優先, uint8）を順に読み、SDFテクスチャ（RGBA）を
+同じ順に標準出力へ書き出す。PNGのエンコード・デコードもディスクへの書き込みも行わない。
+
+読み込み・SDF生成・書き出しはそれぞれ別のスレッドで行い、入力と出力のバッファを2つずつ
+交互に使う（ダブルバッファ）ので、前後のフレームの読み書きと生成が重なる。
+バッファは使い回すため、フレーム数によらずメモリ使用量は一定になる。
+"""
+import queue
+import threading
+import time
+from typing import BinaryIO, NamedTuple
+
+import numpy as np
+
+from sdf_atlas import load_layout
+from sdf_processor import GeneratorSettings, generate_sdf
+
+
+# 入力の画素形式 → チャンネル数
+PIXEL_FORMATS = {"rgba": 4, "rgb": 3, "gray": 1}
+
+# 入力・出力それぞれのバッファの数（2 でダブルバッファ）
+DEFAULT_BUFFERS = 2
+
+
+class PipeStats(NamedTuple):
+    """処理結果（待ち時間は生成スレッドが読み込み・書き出しを待った時間）"""
+    frames: int
+    seconds: float
+    compute_seconds: float
+    read_wait_seconds: float
+    write_wait_seconds: float
+    bytes_in: int
+    bytes_out: int
+
+    def format(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (f"{self.frames} フレーム / {self.seconds:.2f} 秒（{self.frames / seconds:.1f} fps, "
+                f"入力 {self.bytes_in / seconds / (1024 * 1024):.1f} MB/s, "
+                f"出力 {self.bytes_out / seconds / (1024 * 1024):.1f} MB/s）\n"
+                f"生成 {self.compute_seconds:.2f} 秒 / 読み込み待ち {self.read_wait_seconds:.2f} 秒 / "
+                f"書き出し待ち {self.write_wait_seconds:.2f} 秒")
+
+
+def parse_frame_size(text: str):
+    """'512x512' 形式のサイズを (幅, 高さ) に変換"""
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"サイズは 幅x高さ の形式で指定してください: {text}")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"サイズが不正です: {text}")
+    return width, height
+
+
+def read_frame(stream: BinaryIO, buffer: memoryview) -> int:
+    """buffer が埋まるまで読む（読めたバイト数を返す。ストリームの終端なら buffer より少ない）"""
+    filled = 0
+    while filled < len(buffer):
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+def process_pipe(input_stream: BinaryIO, output_stream: BinaryIO, width: int, height: int,
+                 pixel_format: str = "rgba", settings: GeneratorSettings = GeneratorSettings(),
+                 threads: int = 1, buffers: int = DEFAULT_BUFFERS) -> PipeStats:
+    """入力のフレームがなくなるまで処理する
+
+    フレームの途中で入力が終わった場合や、出力先が閉じられた場合は例外を送出する
+    （それまでのフレームは書き出し済み）
+    """
+    if pixel_format not in PIXEL_FORMATS:
+        raise ValueError(f"画素形式は {' / '.join(PIXEL_FORMATS)} のいずれかです: {pixel_format}")
+    channels = PIXEL_FORMATS[pixel_format]
+    shape = (height, width)
+    layout = load_layout(settings.layout, shape) if settings.layout else None
+
+    inputs = [np.empty(shape + (channels,), dtype=np.uint8) for _ in range(max(buffers, 1))]
+    outputs = [np.empty(shape + (4,), dtype=np.uint8) for _ in range(max(buffers, 1))]
+    scratch = np.empty(shape, dtype=np.uint16)
+    # 空いているバッファと、読み込み済み・生成済みのバッファ（None は終端）
+    free_inputs, filled = queue.Queue(), queue.Queue()
+    free_outputs, ready = queue.Queue(), queue.Queue()
+    for buffer in inputs:
+        free_inputs.put(buffer)
+    for buffer in outputs:
+        free_outputs.put(buffer)
+    errors = []
+    stopping = threading.Event()
+
+    def read_loop():
+        try:
+            while not stopping.is_set():
+                buffer = free_inputs.get()
+                if buffer is None:
+                    break
+                count = read_frame(input_stream, memoryview(buffer).cast("B"))
+                if count == 0:
+                    break
+                if count < buffer.nbytes:
+                    raise ValueError(f"入力がフレームの途中（{count} / {buffer.nbytes} バイト）で終わりました")
+                filled.put(buffer)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            filled.put(None)
+
+    def write_loop():
+        try:
+            while True:
+                buffer = ready.get()
+                if buffer is None:
+                    break
+                output_stream.write(memoryview(buffer).cast("B"))
+                free_outputs.put(buffer)
+        except Exception as e:
+            errors.append(e)
+            stopping.set()
+            # 生成スレッドが空きバッファを待ち続けないようにする
+            free_outputs.put(None)
+
+    reader = threading.Thread(target=read_loop, name="SDFPipeReader", daemon=True)
+    writer = threading.Thread(target=write_loop, name="SDFPipeWriter", daemon=True)
+    reader.start()
+    writer.start()
+
+    frames = 0
+    compute_seconds = read_wait = write_wait = 0.0
+    start = time.perf_counter()
+    try:
+        while not stopping.is_set():
+            waited = time.perf_counter()
+            source = filled.get()
+            read_wait += time.perf_counter() - waited
+            if source is None:
+                break
+
+            waited = time.perf_counter()
+            out = free_outputs.get()
+            write_wait += time.perf_counter() - waited
+            if out is None:
+                break
+
+            computed = time.perf_counter()
+            generate_sdf(source, settings, out, scratch, layout, threads)
+            compute_seconds += time.perf_counter() - computed
+            free_inputs.put(source)
+            ready.put(out)
+            frames += 1
+    finally:
+        stopping.set()
+        # 読み込みスレッドは入力を待っている可能性があるため待たない（デーモンスレッド）
+        free_inputs.put(None)
+        ready.put(None)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+    output_stream.flush()
+    return PipeStats(frames, time.perf_counter() - start, compute_seconds, read_wait, write_wait,
+                     frames * inputs[0].nbytes, frames * outputs[0].nbytes)
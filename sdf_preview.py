@@ -0,0 +1,325 @@
+"""GUIプレビュー用の縮小プロキシ処理
+
+入力画像を表示サイズに縮小したプロキシを一度だけ作成してキャッシュし、
+プレビュー用のSDFはプロキシ上で計算する。フル解像度の計算は保存時にのみ行う。
+
+縮小は Image.thumbnail の reducing_gap と同じ2段階（整数倍の平均 → LANCZOS）で行い、
+整数倍に縮小した中間画像を保持する。入力の一部が編集された場合は、その部分だけを縮小し直す。
+
+光の角度ごとの陰影（lilToonの顔影）も、表示解像度の結果から作成する。
+"""
+import math
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from sdf_incremental import DirtyRect, changed_fraction, find_changes
+from sdf_io import load_image
+from sdf_profile import stage
+from sdf_processor import GeneratorSettings, SDFProcessor
+
+
+# プレビューの表示サイズ（GUIのサムネイルと同じ）
+PREVIEW_MAX_SIZE = (200, 200)
+
+# 表示用画像のキャッシュに保持する数（4チャンネル × 数種類の表示サイズ）
+PHOTO_CACHE_ENTRIES = 16
+
+# 陰影プレビューの光の角度の範囲（度。0 が正面、正の値が右からの光、±180 が真後ろ）
+LIGHT_ANGLE_LIMIT = 180
+# 陰影の境界をぼかす幅（SDFの値 0〜1 に対する幅）
+SHADOW_BLUR = 0.04
+# 陰影プレビューの明部・暗部の色（RGB）
+LIT_COLOR = (255, 236, 224)
+SHADOW_COLOR = (190, 140, 150)
+# 角度一覧の枚数と列数（既定は30度ごと）
+CONTACT_SHEET_ANGLES = 12
+CONTACT_SHEET_COLUMNS = 6
+
+# 整数倍の縮小の後、LANCZOSで少なくともこの倍率は縮小する（Image.thumbnail の既定値と同じ）
+_REDUCING_GAP = 2.0
+
+
+def proxy_size(width: int, height: int, max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """縦横比を保って max_size に収まるサイズ（Image.thumbnail と同じ丸め。収まる場合はそのまま）"""
+    x, y = max_size
+    if x >= width and y >= height:
+        return width, height
+    aspect = width / height
+
+    def round_aspect(number: float, key) -> int:
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def _reduce_premultiplied(pixels: np.ndarray, factor: Tuple[int, int]) -> np.ndarray:
+    """RGBA配列をアルファ乗算済み（RGBa）にして factor 倍の平均で縮小"""
+    image = Image.fromarray(np.ascontiguousarray(pixels), 'RGBA').convert('RGBa')
+    if factor != (1, 1):
+        image = image.reduce(factor)
+    return np.array(image)
+
+
+class PreviewProxy:
+    """入力画像の縮小プロキシ（編集された矩形だけを縮小し直して更新できる）"""
+
+    def __init__(self, source: np.ndarray, max_size: Tuple[int, int] = PREVIEW_MAX_SIZE):
+        height, width = source.shape[:2]
+        self.size = proxy_size(width, height, max_size)
+        self.factor = (int(width / self.size[0] / _REDUCING_GAP) or 1,
+                       int(height / self.size[1] / _REDUCING_GAP) or 1)
+        self.source = source
+        if self.size == (width, height):
+            # 縮小しない場合はそのままコピーする
+            self._reduced = None
+            self.pixels = np.array(source)
+        else:
+            self._reduced = _reduce_premultiplied(source, self.factor)
+            self.pixels = self._resize()
+
+    def _resize(self) -> np.ndarray:
+        height, width = self.source.shape[:2]
+        reduced = Image.frombuffer('RGBa', (self._reduced.shape[1], self._reduced.shape[0]),
+                                   self._reduced, 'raw', 'RGBa', 0, 1)
+        box = (0, 0, width / self.factor[0], height / self.factor[1])
+        return np.array(reduced.resize(self.size, Image.Resampling.LANCZOS, box=box).convert('RGBA'))
+
+    def update(self, source: np.ndarray, rects: List[DirtyRect]):
+        """以前の入力から rects の部分だけが変わった source に合わせて更新"""
+        if self._reduced is None:
+            self.pixels = np.array(self.pixels)
+            for rect in rects:
+                self.pixels[rect.top:rect.bottom, rect.left:rect.right] = \
+                    source[rect.top:rect.bottom, rect.left:rect.right]
+            self.source = source
+            return
+
+        # 平均は factor 倍のブロック単位なので、矩形を含むブロックだけを縮小し直す
+        factor_x, factor_y = self.factor
+        reduced = np.array(self._reduced)
+        for rect in rects:
+            top, bottom = rect.top // factor_y, -(-rect.bottom // factor_y)
+            left, right = rect.left // factor_x, -(-rect.right // factor_x)
+            reduced[top:bottom, left:right] = _reduce_premultiplied(
+                source[top * factor_y:bottom * factor_y, left * factor_x:right * factor_x], self.factor)
+        self._reduced = reduced
+        self.source = source
+        self.pixels = self._resize()
+
+
+def load_preview_proxy(image_path: str,
+                       max_size: Tuple[int, int] = PREVIEW_MAX_SIZE) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """表示サイズに縮小したRGBA配列と、元画像のサイズ（幅, 高さ）を返す（日本語パス対応）"""
+    # デコード結果は共有キャッシュに残るため、保存時のフル解像度処理で再デコードしない
+    # （JPEGは表示サイズに近い解像度で縮小デコードされる）
+    decoded = load_image(image_path, max_size)
+    with stage("proxy") as measured:
+        proxy = PreviewProxy(decoded.pixels, max_size).pixels
+        measured.bytes = proxy.nbytes
+    return proxy, decoded.source_size
+
+
+class PreviewPipeline:
+    """縮小プロキシ上でSDFプレビューを生成するクラス"""
+
+    def __init__(self, max_size: Tuple[int, int] = PREVIEW_MAX_SIZE):
+        self.max_size = max_size
+        self.processor = SDFProcessor()
+        # プレビュー画像は結果からコピーして作るため、出力バッファを使い回す
+        self.processor.reuse_buffers = True
+        self.source_size = None
+        # True の場合、前回の入力から変更のあった部分だけプロキシを縮小し直す
+        self.incremental = False
+        self.last_changes: Optional[List[DirtyRect]] = None  # 直近の部分更新の矩形（作り直した場合は None）
+        self._proxy: Optional[PreviewProxy] = None
+
+    def load(self, image_path: str) -> bool:
+        """入力画像からプロキシを作成"""
+        try:
+            decoded = load_image(image_path, self.max_size)
+            changes = None
+            if self.incremental and self._proxy is not None:
+                changes = find_changes(self._proxy.source, decoded.pixels)
+            with stage("proxy") as measured:
+                if changes is None:
+                    self._proxy = PreviewProxy(decoded.pixels, self.max_size)
+                else:
+                    self._proxy.update(decoded.pixels, changes)
+                measured.bytes = self._proxy.pixels.nbytes
+            self.last_changes = changes
+            self.source_size = decoded.source_size
+            self.processor.gradient_image = self._proxy.pixels
+            self.processor.result_image = None
+            return True
+        except Exception as e:
+            print(f"プレビュー読み込みエラー: {e}")
+            return False
+
+    def changed_fraction(self) -> Optional[float]:
+        """直近の読み込みで縮小し直した部分の割合（プロキシを作り直した場合は None）"""
+        if self.last_changes is None:
+            return None
+        return changed_fraction(self.last_changes, self._proxy.source.shape)
+
+    def process(self, settings: GeneratorSettings) -> bool:
+        """プロキシ上でSDFプレビューを生成
+
+        distanceモードの広がりはピクセル単位なので、縮小率に合わせて換算する
+        """
+        if self.processor.gradient_image is None:
+            return False
+
+        scale = self.processor.gradient_image.shape[1] / self.source_size[0]
+        self.processor.settings = settings._replace(spread=max(settings.spread * scale, 0.5))
+        return self.processor.process_sdf()
+
+    def get_original_image(self) -> Optional[Image.Image]:
+        """プロキシの元画像"""
+        if self.processor.gradient_image is None:
+            return None
+        return Image.fromarray(self.processor.gradient_image, 'RGBA')
+
+    def get_preview_channels(self) -> Tuple[Optional[Image.Image], Optional[Image.Image], Optional[Image.Image]]:
+        """チャンネル別プレビュー画像（表示解像度）"""
+        return self.processor.get_preview_channels(self.max_size)
+
+
+def shadow_threshold(angles) -> np.ndarray:
+    """光の角度（度）から、それ以上のSDFの値が明部になるしきい値（正面で0、真横で0.5、真後ろで1）"""
+    radians = np.radians(np.asarray(angles, dtype=np.float64))
+    return (1 - np.cos(radians)) / 2
+
+
+class LightingPreview:
+    """SDF結果（表示解像度）から、光の角度ごとの陰影を作成（lilToonの顔影と同じ判定）
+
+    光が右からの場合はR、左からの場合はGのチャンネルの値を、角度から求めたしきい値と比べる。
+    角度ごとに SDFの値（0〜255）→ 色 の対応表を作り、画素ごとには表を引くだけなので、
+    スライダーの操作中も表示解像度なら1ミリ秒程度で作成できる。
+    """
+
+    def __init__(self, result: np.ndarray, blur: float = SHADOW_BLUR,
+                 lit_color: Tuple[int, int, int] = LIT_COLOR,
+                 shadow_color: Tuple[int, int, int] = SHADOW_COLOR):
+        # 角度が負（左からの光）は G、正（右からの光）は R
+        self.channels = np.stack([result[:, :, 1], result[:, :, 0]])
+        self.alpha = np.array(result[:, :, 3])
+        self.blur = max(blur, 1e-3)
+        self.lit_color = np.array(lit_color, dtype=np.float32)
+        self.shadow_color = np.array(shadow_color, dtype=np.float32)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.alpha.shape[1], self.alpha.shape[0]
+
+    def color_tables(self, angles: np.ndarray) -> np.ndarray:
+        """角度ごとの SDFの値 → RGB の対応表（N×256×3, uint8）
+
+        しきい値を -blur〜1 に広げ、正面では全体が明部、真後ろでは全体が暗部になるようにする
+        """
+        threshold = shadow_threshold(angles)[:, None] * (1 + self.blur) - self.blur
+        values = np.arange(256, dtype=np.float32) / 255
+        lit = np.clip((values - threshold) / self.blur, 0, 1)[:, :, None]
+        return np.rint(self.shadow_color + (self.lit_color - self.shadow_color) * lit).astype(np.uint8)
+
+    def render_batch(self, angles) -> np.ndarray:
+        """複数の角度の陰影を1回の配列演算で作成（N×H×W×4, uint8）"""
+        angles = np.atleast_1d(np.asarray(angles, dtype=np.float64))
+        angles = (angles + LIGHT_ANGLE_LIMIT) % (2 * LIGHT_ANGLE_LIMIT) - LIGHT_ANGLE_LIMIT
+        tables = self.color_tables(angles)
+        sides = (angles > 0).astype(np.intp)
+        frames = np.empty(angles.shape + self.alpha.shape + (4,), dtype=np.uint8)
+        frames[..., :3] = tables[np.arange(len(angles))[:, None, None], self.channels[sides]]
+        frames[..., 3] = self.alpha
+        return frames
+
+    def render(self, angle: float) -> Image.Image:
+        """1つの角度の陰影"""
+        return Image.fromarray(self.render_batch([angle])[0], 'RGBA')
+
+
+def light_contact_sheet(preview: LightingPreview, count: int = CONTACT_SHEET_ANGLES,
+                        columns: int = CONTACT_SHEET_COLUMNS) -> Image.Image:
+    """真後ろ（-180度）から一周を count 等分した角度の陰影を、左上から順に並べた画像（角度を左上に表示）"""
+    angles = -LIGHT_ANGLE_LIMIT + np.arange(count) * (2 * LIGHT_ANGLE_LIMIT / count)
+    frames = preview.render_batch(angles)
+    columns = max(min(columns, count), 1)
+    rows = -(-count // columns)
+    width, height = preview.size
+
+    cells = np.zeros((rows * columns, height, width, 4), dtype=np.uint8)
+    cells[:count] = frames
+    sheet = cells.reshape(rows, columns, height, width, 4).transpose(0, 2, 1, 3, 4)
+    image = Image.fromarray(np.ascontiguousarray(sheet).reshape(rows * height, columns * width, 4), 'RGBA')
+    draw = ImageDraw.Draw(image)
+    for index, angle in enumerate(angles):
+        row, column = divmod(index, columns)
+        draw.text((column * width + 2, row * height + 2), f"{angle:+.0f}", fill=(255, 255, 255, 255))
+    return image
+
+
+def fit_image(image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """縦横比を保って size に収まるように縮小した画像（収まる場合はそのまま返す）"""
+    fitted = proxy_size(image.width, image.height, size)
+    if fitted == image.size:
+        return image
+    return image.resize(fitted, Image.Resampling.LANCZOS)
+
+
+def _photo_image(image: Image.Image):
+    # Tk は起動時に不要なため、初めて使うときに読み込む
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(image)
+
+
+def paste_photo_image(photo, image: Image.Image):
+    """同じサイズの PhotoImage には貼り付けて使い回す（スライダーの操作中にTkの画像を作り直さない）"""
+    if photo is not None and (photo.width(), photo.height()) == image.size:
+        photo.paste(image)
+        return photo
+    return _photo_image(image)
+
+
+class PhotoImageCache:
+    """表示用画像（PhotoImage）のキャッシュ
+
+    (結果の版, チャンネル, 表示サイズ) ごとに保持するため、チャンネル表示の切り替えや
+    ウィンドウのサイズ変更で同じ組み合わせに戻った場合は変換し直さない。
+    新しい版の画像を登録すると、古い版の画像は破棄する。
+    """
+
+    def __init__(self, factory: Callable[[Image.Image], object] = _photo_image,
+                 max_entries: int = PHOTO_CACHE_ENTRIES):
+        self.factory = factory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, object]" = OrderedDict()
+
+    def get(self, version: Hashable, channel: str, size: Tuple[int, int], image: Image.Image):
+        """image を size に収まるように縮小した PhotoImage（UIスレッドから呼ぶ）"""
+        key = (version, channel, tuple(size))
+        photo = self._entries.get(key)
+        if photo is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return photo
+
+        self.misses += 1
+        photo = self.factory(fit_image(image, size))
+        for old_key in [k for k in self._entries if k[0] != version]:
+            del self._entries[old_key]
+        self._entries[key] = photo
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return photo
+
+    def clear(self):
+        self._entries.clear()
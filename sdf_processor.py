@@ -1,9 +1,314 @@
 import numpy as np
-import cv2
-from PIL import Image, ImageTk
+from PIL import Image
 import os
+import re
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, NamedTuple, Optional, Tuple
+
+from sdf_io import decode_image, load_image
+from sdf_distance import (DEFAULT_SPREAD, DEFAULT_THRESHOLD, compute_distance_field, distance_margin,
+                          threshold_mask)
+from sdf_multiframe import MaskSequenceSynthesizer
+from sdf_output import OutputResult, OutputWriter, PNGOptions, save_png
+from sdf_dds import CompressionReport, DDSOptions, save_dds
+from sdf_mipmap import MipmapOptions, build_mip_chain, save_png_chain
+from sdf_parallel import band_ranges, run_bands
+from sdf_incremental import DirtyRect, find_changes
+from sdf_profile import stage
+from sdf_atlas import AtlasLayout, load_layout
+
+
+# 生成モード
+GENERATION_MODE_GRADIENT = "gradient"  # グラデーション画像の明度をそのまま格納
+GENERATION_MODE_DISTANCE = "distance"  # 二値化したマスクから符号付き距離場を生成
+GENERATION_MODES = (GENERATION_MODE_GRADIENT, GENERATION_MODE_DISTANCE)
+
+
+class GeneratorSettings(NamedTuple):
+    """SDF生成の設定"""
+    mode: str = GENERATION_MODE_GRADIENT
+    threshold: int = DEFAULT_THRESHOLD  # distanceモードの二値化しきい値（0-255）
+    spread: float = DEFAULT_SPREAD      # distanceモードで ±spread ピクセルを 0-255 に割り当てる
+    layout: str = ""                    # アトラスの配置ファイル（指定すると領域ごとに左右反転する）
+
+
+def get_default_output_path(gradient_path: str, extension: str = ".png") -> str:
+    """入力パスから既定の出力パス（<stem>_SDF.png）を生成"""
+    path = Path(gradient_path)
+    return str(path.parent / f"{path.stem}_SDF{extension}")
+
+
+# 出力のファイル名の末尾（<stem>_SDF と、ミップの <stem>_SDF_mip<n>）
+_GENERATED_STEM = re.compile(r"_SDF(_mip\d+)?$")
+
+
+def is_generated_output(path: str) -> bool:
+    """生成済みの出力（<stem>_SDF.* と <stem>_SDF_mip<n>.*）か（入力の一覧から除外するため）"""
+    return _GENERATED_STEM.search(Path(path).stem) is not None
+
+
+def is_dds_path(output_path: str) -> bool:
+    """DDSとして保存する出力パスか"""
+    return output_path.lower().endswith(".dds")
+
+
+def compute_gray_mask(source: np.ndarray, scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """画像配列（H×W×C または N×H×W×C）をグレースケールのマスク（H×W または N×H×W, 0-255）に変換
+
+    3チャンネル以上の場合は scratch（source からチャンネルを除いた形, uint16）に書き込んで返す
+    """
+    if source.shape[-1] < 3:
+        return source[..., 0]
+
+    # RGBの平均値を整数演算で求める（和は最大765なのでuint16に収まる）
+    # 旧実装の float64平均 → /255 → ×255 → uint8切り捨て は、全766通りの和で floor(和 / 3) と一致する
+    if scratch is None:
+        scratch = np.empty(source.shape[:-1], dtype=np.uint16)
+    np.add(source[..., 0], source[..., 1], out=scratch, dtype=np.uint16)
+    np.add(scratch, source[..., 2], out=scratch)
+    np.floor_divide(scratch, 3, out=scratch)
+    return scratch
+
+
+def pack_sdf_channels(mask: np.ndarray, alpha: Optional[np.ndarray] = None,
+                      out: Optional[np.ndarray] = None,
+                      layout: Optional[AtlasLayout] = None) -> np.ndarray:
+    """マスク（H×W または N×H×W, 0-255）をlilToon用のチャンネル配置（…×4）に格納
+
+    alpha を省略した場合は不透明（255）になる。layout を指定するとRチャンネルは領域ごとに左右反転する
+    """
+    if out is None:
+        out = np.empty(mask.shape + (4,), dtype=np.uint8)
+
+    # lilToonの実装に基づく正しいチャンネル割り当て：
+    # Rチャンネル：右からの光（左右反転マスク）
+    if layout is None:
+        out[..., 0] = mask[..., ::-1]
+    else:
+        layout.mirror(mask, out[..., 0])
+
+    # Gチャンネル：左からの光（元のマスク）
+    out[..., 1] = mask
+
+    # Bチャンネル：0に設定（liltoonでは使用しない）
+    out[..., 2] = 0
+
+    # アルファチャンネル：グラデーション画像のアルファを保持
+    if alpha is not None:
+        out[..., 3] = alpha
+    else:
+        out[..., 3] = 255
+
+    return out
+
+
+def compute_sdf_texture(source: np.ndarray, out: Optional[np.ndarray] = None,
+                        scratch: Optional[np.ndarray] = None,
+                        layout: Optional[AtlasLayout] = None) -> np.ndarray:
+    """画像配列（H×W×C または N×H×W×C）からSDFテクスチャ（…×4）を生成
+
+    out（…×4, uint8）と scratch（source からチャンネルを除いた形, uint16）を渡すと、
+    それらに直接書き込み新たな確保を行わない。
+    左右反転は行内の列を入れ替えるだけなので、行単位の帯に分割して処理しても結果は変わらない（layout 指定時を除く）
+    """
+    with stage("grayscale") as measured:
+        mask = compute_gray_mask(source, scratch)
+        measured.bytes = mask.nbytes
+    alpha = source[..., 3] if source.shape[-1] == 4 else None
+    with stage("pack") as measured:
+        out = pack_sdf_channels(mask, alpha, out, layout)
+        measured.bytes = out.nbytes
+    return out
+
+
+# バッチを分けて処理する単位（画素数。出力と作業領域が数MBに収まる大きさ）
+_BATCH_CHUNK_PIXELS = 512 * 512
+
+
+def compute_distance_texture(source: np.ndarray, threshold: int = DEFAULT_THRESHOLD,
+                             spread: float = DEFAULT_SPREAD, out: Optional[np.ndarray] = None,
+                             scratch: Optional[np.ndarray] = None,
+                             layout: Optional[AtlasLayout] = None) -> np.ndarray:
+    """画像配列（H×W×C または N×H×W×C）を二値化し、距離変換による符号付き距離場テクスチャ（…×4）を生成"""
+    with stage("grayscale") as measured:
+        mask = compute_gray_mask(source, scratch)
+        measured.bytes = mask.nbytes
+
+    # 内側（しきい値以上）が正、外側が負の距離を spread で正規化（距離変換は1枚ずつ）
+    binary = threshold_mask(mask, threshold)
+    with stage("distance") as measured:
+        distance_field = np.empty(binary.shape, dtype=np.uint8)
+        for index in np.ndindex(binary.shape[:-2]):
+            compute_distance_field(binary[index], spread, out=distance_field[index])
+        measured.bytes = distance_field.nbytes
+
+    alpha = source[..., 3] if source.shape[-1] == 4 else None
+    with stage("pack") as measured:
+        out = pack_sdf_channels(distance_field, alpha, out, layout)
+        measured.bytes = out.nbytes
+    return out
+
+
+def _layout_rows(layout: Optional[AtlasLayout], top: int, bottom: int) -> Optional[AtlasLayout]:
+    return None if layout is None else layout.rows(top, bottom)
+
+
+def _generate_bands(source: np.ndarray, settings: GeneratorSettings, out: Optional[np.ndarray],
+                    scratch: Optional[np.ndarray], layout: Optional[AtlasLayout],
+                    threads: int) -> np.ndarray:
+    """1枚の画像（H×W×C）を行の帯に分け、threads 個のスレッドで out の各行に書き込む"""
+    height, width = source.shape[:2]
+    if out is None:
+        out = np.empty((height, width, 4), dtype=np.uint8)
+    if scratch is None:
+        scratch = np.empty((height, width), dtype=np.uint16)
+    has_alpha = source.shape[-1] == 4
+
+    if settings.mode != GENERATION_MODE_DISTANCE:
+        # グレースケール化と格納を帯ごとに続けて行う（帯の作業領域がキャッシュに残っているうちに格納する）
+        def generate_band(top: int, bottom: int):
+            mask = compute_gray_mask(source[top:bottom], scratch[top:bottom])
+            pack_sdf_channels(mask, source[top:bottom, :, 3] if has_alpha else None,
+                              out[top:bottom], _layout_rows(layout, top, bottom))
+
+        with stage("generate") as measured:
+            run_bands(generate_band, band_ranges(height, width, threads), threads)
+            measured.bytes = out.nbytes
+        return out
+
+    # distanceモード：二値化 → 距離変換 → 格納 の各段階を帯ごとに並列に行う
+    # 距離変換は帯の上下に飽和距離分の余白を付けて行うため、画像全体の距離変換と結果が一致する
+    margin = distance_margin(settings.spread)
+    ranges = band_ranges(height, width, threads, min_rows=4 * margin)
+    binary = np.empty((height, width), dtype=np.uint8)
+    distance_field = np.empty((height, width), dtype=np.uint8)
+
+    def threshold_band(top: int, bottom: int):
+        mask = compute_gray_mask(source[top:bottom], scratch[top:bottom])
+        np.greater_equal(mask, settings.threshold, out=binary[top:bottom])
+
+    def distance_band(top: int, bottom: int):
+        pad_top, pad_bottom = max(top - margin, 0), min(bottom + margin, height)
+        padded = compute_distance_field(binary[pad_top:pad_bottom], settings.spread)
+        distance_field[top:bottom] = padded[top - pad_top:bottom - pad_top]
+
+    def pack_band(top: int, bottom: int):
+        pack_sdf_channels(distance_field[top:bottom], source[top:bottom, :, 3] if has_alpha else None,
+                          out[top:bottom], _layout_rows(layout, top, bottom))
+
+    for name, func, result in (("grayscale", threshold_band, binary),
+                               ("distance", distance_band, distance_field),
+                               ("pack", pack_band, out)):
+        with stage(name) as measured:
+            run_bands(func, ranges, threads)
+            measured.bytes = result.nbytes
+    return out
+
+
+def generate_sdf(source: np.ndarray, settings: GeneratorSettings = GeneratorSettings(),
+                 out: Optional[np.ndarray] = None, scratch: Optional[np.ndarray] = None,
+                 layout: Optional[AtlasLayout] = None, threads: int = 1) -> np.ndarray:
+    """画像配列からSDFテクスチャを生成（状態を持たないため、複数のスレッドから同時に呼べる）
+
+    source は H×W×C、または同じサイズの画像を重ねた N×H×W×C（uint8, C=1〜4）。
+    バッチは1回の配列演算でまとめて処理する（distanceモードの距離変換のみ1枚ずつ）。
+    out（…×4, uint8）と scratch（…, uint16）を渡すとそこに書き込み、新たな確保を行わない。
+    スレッドごとに別の out と scratch を渡すこと。
+    layout を省略した場合、settings.layout の配置ファイルを画像サイズに合わせて読み込む（キャッシュされる）。
+    threads が2以上の場合、1枚の画像を行の帯に分けて並列に処理する（結果は1スレッドと同じ）
+    """
+    if source.ndim not in (3, 4) or source.dtype != np.uint8 or not 1 <= source.shape[-1] <= 4:
+        raise ValueError(f"入力は H×W×C または N×H×W×C（uint8, C=1〜4）の配列である必要があります: "
+                         f"{source.shape}, {source.dtype}")
+    if out is not None and (out.shape != source.shape[:-1] + (4,) or out.dtype != np.uint8):
+        raise ValueError(f"out の形状は {source.shape[:-1] + (4,)}（uint8）である必要があります: "
+                         f"{out.shape}, {out.dtype}")
+    if scratch is not None and (scratch.shape != source.shape[:-1] or scratch.dtype != np.uint16):
+        raise ValueError(f"scratch の形状は {source.shape[:-1]}（uint16）である必要があります: "
+                         f"{scratch.shape}, {scratch.dtype}")
+
+    if layout is None and settings.layout:
+        layout = load_layout(settings.layout, source.shape[-3:-1])
+
+    if settings.mode == GENERATION_MODE_DISTANCE:
+        def generate(images, images_out, images_scratch):
+            return compute_distance_texture(images, settings.threshold, settings.spread,
+                                            images_out, images_scratch, layout)
+    else:
+        def generate(images, images_out, images_scratch):
+            return compute_sdf_texture(images, images_out, images_scratch, layout)
+
+    if threads > 1 and source.ndim == 3:
+        return _generate_bands(source, settings, out, scratch, layout, threads)
+
+    pixels = source.shape[-3] * source.shape[-2]
+    if source.ndim == 3 or source.shape[0] * pixels <= _BATCH_CHUNK_PIXELS:
+        return generate(source, out, scratch)
+
+    # 大きなバッチは、作業領域がCPUキャッシュに収まる枚数ずつ処理する（一度に全体を処理するより速い）
+    count = source.shape[0]
+    step = max(1, _BATCH_CHUNK_PIXELS // pixels)
+    if out is None:
+        out = np.empty(source.shape[:-1] + (4,), dtype=np.uint8)
+    chunk_scratch = None if scratch is not None else np.empty((step,) + source.shape[1:-1], dtype=np.uint16)
+    for start in range(0, count, step):
+        stop = min(start + step, count)
+        images_scratch = scratch[start:stop] if scratch is not None else chunk_scratch[:stop - start]
+        generate(source[start:stop], out[start:stop], images_scratch)
+    return out
+
+
+def _patch_mask(source: np.ndarray, top: int, bottom: int, left: int, right: int,
+                settings: GeneratorSettings) -> np.ndarray:
+    """source の矩形部分のマスク（distanceモードは周囲に余白を付けて距離変換した距離場）"""
+    if settings.mode != GENERATION_MODE_DISTANCE:
+        return compute_gray_mask(source[top:bottom, left:right])
+
+    height, width = source.shape[:2]
+    margin = distance_margin(settings.spread)
+    pad_top, pad_bottom = max(top - margin, 0), min(bottom + margin, height)
+    pad_left, pad_right = max(left - margin, 0), min(right + margin, width)
+    binary = threshold_mask(compute_gray_mask(source[pad_top:pad_bottom, pad_left:pad_right]), settings.threshold)
+    field = compute_distance_field(binary, settings.spread)
+    return field[top - pad_top:bottom - pad_top, left - pad_left:right - pad_left]
+
+
+def patch_sdf(source: np.ndarray, out: np.ndarray, rects: List[DirtyRect],
+              settings: GeneratorSettings = GeneratorSettings(),
+              layout: Optional[AtlasLayout] = None) -> np.ndarray:
+    """以前の入力から生成したSDF（out）を、入力 source で変更のあった矩形だけ再計算して更新
+
+    Rチャンネルは左右反転した位置も更新する（layout 指定時は反転先が領域ごとに異なるため、矩形を含む行全体）。
+    distanceモードは距離場が変わりうる矩形の周囲 spread 分まで再計算する。
+    結果は source から generate_sdf で全体を生成した場合と一致する
+    """
+    if source.ndim != 3 or out.shape != source.shape[:-1] + (4,):
+        raise ValueError(f"source（H×W×C）と out（H×W×4）の形状が一致しません: {source.shape}, {out.shape}")
+    if layout is None and settings.layout:
+        layout = load_layout(settings.layout, source.shape[:2])
+
+    height, width = source.shape[:2]
+    margin = distance_margin(settings.spread) if settings.mode == GENERATION_MODE_DISTANCE else 0
+    has_alpha = source.shape[-1] == 4
+    with stage("patch") as measured:
+        for rect in rects:
+            top, bottom = max(rect.top - margin, 0), min(rect.bottom + margin, height)
+            if layout is None:
+                left, right = max(rect.left - margin, 0), min(rect.right + margin, width)
+            else:
+                left, right = 0, width
+            mask = _patch_mask(source, top, bottom, left, right, settings)
+            alpha = source[top:bottom, left:right, 3] if has_alpha else None
+
+            if layout is not None:
+                pack_sdf_channels(mask, alpha, out[top:bottom], layout.rows(top, bottom))
+            else:
+                # Gとアルファは同じ位置、Rは左右反転した位置（Bは常に0なので変わらない）
+                out[top:bottom, left:right, 1] = mask
+                out[top:bottom, width - right:width - left, 0] = mask[:, ::-1]
+                out[top:bottom, left:right, 3] = 255 if alpha is None else alpha
+            measured.bytes += mask.size * 4
+    return out
 
 
 class SDFProcessor:
@@ -12,62 +317,96 @@ class SDFProcessor:
     def __init__(self):
         self.gradient_image = None
         self.result_image = None
+        self.settings = GeneratorSettings()
+        # SDF生成のスレッド数（2以上なら行の帯に分けて並列に処理する）
+        self.threads = 1
+        # True の場合、process_sdf は前回の入力から変更のあったタイルだけを再計算する
+        self.incremental = False
+        self.last_changes: Optional[List[DirtyRect]] = None  # 直近の部分更新の矩形（全体を生成した場合は None）
+        self._patch_base = None  # 部分更新の基準（入力画像, 設定, 配置, 結果）
+        # 複数マスクからの合成（距離場のキャッシュを保持するため使い回す）
+        self.mask_synthesizer = MaskSequenceSynthesizer()
+        # True の場合、同じサイズの再処理では出力バッファを使い回す
+        # （結果の配列は次の処理で書き換わるため、保持する場合は呼び出し側でコピーする）
+        self.reuse_buffers = False
+        # 使い回しのバッファ（"scratch" は常に、"out" は reuse_buffers の場合のみ保持する）
+        self._buffers = {}
+        # PNG・DDS出力の設定と、直近の保存結果（エンコード時間・書き込みサイズ・DDSの圧縮誤差）
+        self.output_options = PNGOptions()
+        self.dds_options = DDSOptions()
+        self.mipmap_options = MipmapOptions()
+        self.last_output: Optional[OutputResult] = None
+        self.last_compression_report: Optional[CompressionReport] = None
     
-    def load_gradient_image(self, image_path: str) -> bool:
-        """グラデーション画像を読み込む（日本語パス対応）"""
+    def load_gradient_image(self, image_path: str, use_cache: bool = True) -> bool:
+        """グラデーション画像を読み込む（日本語パス対応）
+        
+        use_cache が True の場合、同じファイルのデコード結果を共有キャッシュから再利用する
+        """
         try:
-            # Pillowで読み込み、RGBAに変換
-            pil_image = Image.open(image_path).convert('RGBA')
-            # NumPy配列に変換（OpenCV用）
-            self.gradient_image = np.array(pil_image)
+            if use_cache:
+                self.gradient_image = load_image(image_path).pixels
+            else:
+                self.gradient_image = decode_image(np.fromfile(image_path, dtype=np.uint8),
+                                                   os.path.splitext(image_path)[1]).pixels
             return True
         except Exception as e:
             print(f"画像読み込みエラー: {e}")
             return False
     
+    def load_mask_sequence(self, image_paths: List[str]) -> bool:
+        """光源角度順のマスク画像列を読み込み、補間したグラデーションを入力画像とする（日本語パス対応）"""
+        try:
+            masks = []
+            for image_path in image_paths:
+                # 共有キャッシュを通してデコードする（同じマスクの再読み込みではデコードを省く）
+                source = load_image(image_path).pixels
+                masks.append(threshold_mask(compute_gray_mask(source), self.settings.threshold))
+            
+            gradient = self.mask_synthesizer.synthesize(masks)
+            
+            # グラデーション画像として読み込んだ場合と同じRGBA配列にする
+            self.gradient_image = np.empty((*gradient.shape, 4), dtype=np.uint8)
+            self.gradient_image[:, :, :3] = gradient[:, :, np.newaxis]
+            self.gradient_image[:, :, 3] = 255
+            return True
+        except Exception as e:
+            print(f"マスク合成エラー: {e}")
+            return False
+    
     def create_sdf_from_gradient(self) -> np.ndarray:
         """グラデーション画像からSDFテクスチャを生成"""
+        return self._generate(GENERATION_MODE_GRADIENT)
+    
+    def create_sdf_from_mask(self) -> np.ndarray:
+        """グラデーション画像を二値化し、距離変換による符号付き距離場テクスチャを生成"""
+        return self._generate(GENERATION_MODE_DISTANCE)
+    
+    def _generate(self, mode: str) -> np.ndarray:
+        """現在の入力画像と設定で generate_sdf を呼ぶ
+
+        reuse_buffers が False の場合、出力は毎回新しい配列に書き込む（以前に返した結果は書き換えない）
+        """
         if self.gradient_image is None:
             raise ValueError("グラデーション画像が設定されていません")
         
-        height, width = self.gradient_image.shape[:2]
-        
-        # アルファチャンネルを保持（グラデーション画像から）
-        if self.gradient_image.shape[2] == 4:
-            alpha = self.gradient_image[:, :, 3]
+        shape = self.gradient_image.shape[:2]
+        scratch = self._get_buffer("scratch", shape, np.uint16)
+        if self.reuse_buffers:
+            out = self._get_buffer("out", (*shape, 4), np.uint8)
         else:
-            alpha = np.ones((height, width), dtype=np.uint8) * 255
-        
-        # グラデーション画像をグレースケールに変換してマスクとして使用
-        if self.gradient_image.shape[2] >= 3:
-            # RGBの平均値でグレースケール化
-            mask = np.mean(self.gradient_image[:, :, :3], axis=2)
-        else:
-            mask = self.gradient_image[:, :, 0]
-        
-        # マスクを正規化（0-1の範囲）
-        mask_normalized = mask.astype(np.float32) / 255.0
-        
-        # 左右反転マスクを作成
-        mask_flipped = np.fliplr(mask_normalized)
-        
-        # SDFテクスチャを作成
-        sdf_texture = np.zeros((height, width, 4), dtype=np.uint8)
-        
-        # lilToonの実装に基づく正しいチャンネル割り当て：
-        # Rチャンネル：右からの光（左右反転マスク）
-        sdf_texture[:, :, 0] = (mask_flipped * 255).astype(np.uint8)
-        
-        # Gチャンネル：左からの光（元のマスク）
-        sdf_texture[:, :, 1] = (mask_normalized * 255).astype(np.uint8)
-        
-        # Bチャンネル：0に設定（liltoonでは使用しない）
-        sdf_texture[:, :, 2] = 0
-        
-        # アルファチャンネル：グラデーション画像のアルファを保持
-        sdf_texture[:, :, 3] = alpha
-        
-        return sdf_texture
+            # 使い回さない場合は結果と同じ大きさの出力バッファを保持しない
+            self._buffers.pop("out", None)
+            out = None
+        return generate_sdf(self.gradient_image, self.settings._replace(mode=mode), out, scratch,
+                            threads=self.threads)
+    
+    def _get_buffer(self, name: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """名前ごとの使い回しのバッファを取得（直近の形状のみ保持し、形状が変わったら確保し直す）"""
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
     
     def process_sdf(self) -> bool:
         """SDFテクスチャを処理"""
@@ -75,55 +414,133 @@ class SDFProcessor:
             return False
         
         try:
-            # グラデーション画像からSDFテクスチャを生成
-            self.result_image = self.create_sdf_from_gradient()
+            layout = None
+            if self.settings.layout:
+                layout = load_layout(self.settings.layout, self.gradient_image.shape[:2])
+            self.last_changes = self._find_changes(layout) if self.incremental else None
+            if self.last_changes is not None:
+                if not self.reuse_buffers:
+                    # 以前に返した結果は書き換えず、コピーを部分更新する
+                    self.result_image = self.result_image.copy()
+                patch_sdf(self.gradient_image, self.result_image, self.last_changes, self.settings, layout)
+            # 設定された生成モードでSDFテクスチャを生成
+            elif self.settings.mode == GENERATION_MODE_DISTANCE:
+                self.result_image = self.create_sdf_from_mask()
+            else:
+                self.result_image = self.create_sdf_from_gradient()
+            self._patch_base = (self.gradient_image, self.settings, layout, self.result_image)
             return True
             
         except Exception as e:
             print(f"SDF処理エラー: {e}")
+            self._patch_base = None
             return False
     
+    def _find_changes(self, layout: Optional[AtlasLayout]) -> Optional[List[DirtyRect]]:
+        """前回の結果を部分的に更新できる場合、変更のあった矩形を返す（できない場合は None）"""
+        if self._patch_base is None:
+            return None
+        source, settings, base_layout, result = self._patch_base
+        # 結果が外から置き換えられた場合や、設定・配置が変わった場合は全体を再生成する
+        if result is not self.result_image or settings != self.settings or base_layout is not layout:
+            return None
+        return find_changes(source, self.gradient_image, threads=self.threads)
+    
     def save_result(self, output_path: str) -> bool:
-        """結果を保存（日本語パス対応）"""
+        """結果を保存（日本語パス対応。一時ファイルに書いてから置き換える）
+        
+        拡張子が .dds の場合は dds_options に従ってBC5 / BC4で圧縮したDDSとして保存する。
+        mipmap_options.enabled の場合はミップチェーンも出力する（DDSは同じファイルに、PNGは <stem>_mip<n>.png に）
+        """
         if self.result_image is None:
             return False
         
-        try:
-            # NumPy配列をPIL Imageに変換
-            pil_image = Image.fromarray(self.result_image, 'RGBA')
-            # PNGとして保存
-            pil_image.save(output_path, 'PNG')
-            return True
-        except Exception as e:
-            print(f"保存エラー: {e}")
-            return False
+        return self._saver()(self.result_image, output_path).success
+    
+    def save_result_async(self, output_path: str, writer: OutputWriter):
+        """結果の保存をバックグラウンドの writer に登録し、OutputResult の Future を返す
+        
+        結果はコピーされるため、登録後すぐに次の処理を行ってよい
+        """
+        if self.result_image is None:
+            return None
+        return writer.submit(self.result_image, output_path, save=self._saver())
+    
+    def get_mip_chain(self) -> Optional[List[np.ndarray]]:
+        """結果のミップチェーン（元の解像度から 1×1 まで）を mipmap_options のフィルタで作成
+
+        レベル0は結果のコピー（以降の処理で結果のバッファが書き換わっても変わらない）
+        """
+        if self.result_image is None:
+            return None
+        levels = build_mip_chain(self.result_image, self.mipmap_options.filter)
+        levels[0] = levels[0].copy()
+        return levels
+    
+    def _saver(self):
+        """現在の出力設定で保存する関数（設定は呼び出し時点の値に固定される）"""
+        png_options, dds_options = self.output_options, self.dds_options
+        mipmap_options = self.mipmap_options
+        
+        def save(rgba: np.ndarray, output_path: str) -> OutputResult:
+            # ミップの作成も保存側（バックグラウンドの書き込みスレッド）で行う
+            levels = build_mip_chain(rgba, mipmap_options.filter) if mipmap_options.enabled else [rgba]
+            if is_dds_path(output_path):
+                result, report = save_dds(rgba, output_path, dds_options, levels[1:])
+                self.last_compression_report = report
+                if report is not None:
+                    print(f"DDS（{report.format.upper()}）: 誤差 RMSE {report.rmse:.2f} / "
+                          f"最大 {report.max_error} / PSNR {report.psnr:.1f} dB")
+            elif len(levels) > 1:
+                result = save_png_chain(levels, output_path, png_options)
+            else:
+                result = save_png(rgba, output_path, png_options)
+            self.last_output = result
+            return result
+        
+        return save
     
     def get_result_for_display(self) -> Optional[Image.Image]:
-        """表示用の結果画像を取得"""
+        """表示用の結果画像を取得（結果のコピー。Image.fromarray は配列のメモリを共有するため）"""
         if self.result_image is None:
             return None
         
-        return Image.fromarray(self.result_image, 'RGBA')
+        return Image.fromarray(self.result_image.copy(), 'RGBA')
     
-    def get_preview_channels(self) -> Tuple[Optional[Image.Image], Optional[Image.Image], Optional[Image.Image]]:
-        """チャンネル別プレビュー画像を取得"""
+    def get_preview_channels(self, max_size: Optional[Tuple[int, int]] = None
+                             ) -> Tuple[Optional[Image.Image], Optional[Image.Image], Optional[Image.Image]]:
+        """チャンネル別プレビュー画像を取得
+
+        max_size（幅, 高さ）を指定すると、結果を一定間隔で間引いたビューから表示サイズの画像だけを作成する
+        （フル解像度のコピーを作らないため、8Kでも数ミリ秒で終わる）
+        """
         if self.result_image is None:
             return None, None, None
         
+        view = self.result_image
+        if max_size is not None:
+            height, width = view.shape[:2]
+            step = max(-(-width // max_size[0]), -(-height // max_size[1]), 1)
+            view = view[::step, ::step]
+        with stage("preview", view.nbytes * 3):
+            return self._build_preview_channels(view)
+    
+    @staticmethod
+    def _build_preview_channels(view: np.ndarray) -> Tuple[Image.Image, Image.Image, Image.Image]:
+        """結果（またはそのビュー）からR・G・合成のプレビュー画像を作成"""
         # Rチャンネル（左からの光）
-        r_channel = np.zeros_like(self.result_image)
-        r_channel[:, :, 0] = self.result_image[:, :, 0]
-        r_channel[:, :, 3] = self.result_image[:, :, 3]
+        r_channel = np.zeros_like(view)
+        r_channel[:, :, 0] = view[:, :, 0]
+        r_channel[:, :, 3] = view[:, :, 3]
         r_image = Image.fromarray(r_channel, 'RGBA')
         
         # Gチャンネル（右からの光）
-        g_channel = np.zeros_like(self.result_image)
-        g_channel[:, :, 1] = self.result_image[:, :, 1]
-        g_channel[:, :, 3] = self.result_image[:, :, 3]
+        g_channel = np.zeros_like(view)
+        g_channel[:, :, 1] = view[:, :, 1]
+        g_channel[:, :, 3] = view[:, :, 3]
         g_image = Image.fromarray(g_channel, 'RGBA')
         
-        # 合成結果
-        combined = self.result_image.copy()
-        combined_image = Image.fromarray(combined, 'RGBA')
+        # 合成結果（結果のバッファは再処理で書き換わるためコピーする）
+        combined_image = Image.fromarray(np.array(view), 'RGBA')
         
         return r_image, g_image, combined_image
@@ -0,0 +1,230 @@
+"""処理段階ごとの計測（処理時間・データサイズ・メモリの増減）
+
+デコード・グレースケール化・チャンネル格納・プレビュー・縮小・PNGエンコードなどを
+stage() で囲み、段階ごとの記録をGUIのステータス表示とJSON Lines形式のログに出力する。
+無効な間の stage() は共有の空のコンテキストを返すだけなので、処理への影響はない。
+
+環境変数 SDF_PROFILE_LOG にパスを指定すると、起動時から計測してログを追記する
+（子プロセスにも引き継がれるため、並列処理の各プロセスの記録が同じファイルに残る）。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PROFILE_LOG_ENV = "SDF_PROFILE_LOG"
+
+# ステータス表示での段階名（表示順）
+STAGE_LABELS = {
+    "decode": "デコード",
+    "diff": "差分",
+    "proxy": "プロキシ",
+    "grayscale": "グレー",
+    "pack": "格納",
+    "generate": "生成",
+    "distance": "距離変換",
+    "patch": "部分更新",
+    "preview": "プレビュー",
+    "mipmap": "ミップ",
+    "png_encode": "PNG",
+    "dds_encode": "DDS",
+    "write": "書込",
+}
+
+
+class StageRecord(NamedTuple):
+    """1段階分の計測結果"""
+    name: str
+    seconds: float
+    bytes: int                      # 段階が出力したデータのサイズ
+    # 段階の開始から終了までのメモリ（RSS）の増減（同時に動く他のスレッドの分も含む。取得できない環境では None）
+    rss_delta_mb: Optional[float]
+
+
+def _windows_memory():
+    """Windows でプロセスの (現在のメモリ, ピークメモリ)（バイト）を返す関数"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL("kernel32")
+    psapi = ctypes.WinDLL("psapi")
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters),
+                                           wintypes.DWORD]
+    process = kernel32.GetCurrentProcess()
+
+    def memory() -> Tuple[Optional[int], Optional[int]]:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        if not psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None, None
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+
+    return memory
+
+
+def _posix_memory() -> Tuple[Optional[int], Optional[int]]:
+    """POSIX でプロセスの (現在のメモリ, ピークメモリ)（現在のメモリは /proc がある Linux のみ）"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        current = None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return current, peak if sys.platform == "darwin" else peak * 1024
+
+
+class _NullStage:
+    """無効時の stage()（何もしない）"""
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """計測中の段階（with の中で bytes に出力サイズを設定できる）"""
+
+    def __init__(self, profiler: "Profiler", name: str, nbytes: int):
+        self.profiler = profiler
+        self.name = name
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self.start_rss = self.profiler.current_rss()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 失敗した段階は記録しない
+        if exc_type is None:
+            self.profiler.record(self.name, time.perf_counter() - self.start, self.bytes, self.start_rss)
+        return False
+
+
+class Profiler:
+    """段階ごとの計測結果を集めるクラス"""
+
+    def __init__(self):
+        self.enabled = False
+        self.version = 0        # 記録が追加されるたびに増える（表示の更新判定用）
+        self._latest: Dict[str, StageRecord] = {}
+        self._log = None
+        self._lock = threading.Lock()
+        self._memory = None
+
+    def enable(self, log_path: Optional[str] = None):
+        """計測を開始（log_path を指定するとJSON Lines形式で追記する）"""
+        with self._lock:
+            if self._memory is None:
+                self._memory = _windows_memory() if resource is None else _posix_memory
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            if log_path:
+                # 1行ずつ書き込むため、複数のプロセスから追記しても行が混ざらない
+                self._log = open(log_path, "a", encoding="utf-8", buffering=1)
+            self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def stage(self, name: str, nbytes: int = 0):
+        """段階を計測するコンテキストマネージャー"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, nbytes)
+
+    def current_rss(self) -> Optional[int]:
+        """プロセスの現在のメモリ（バイト。取得できない環境では None）"""
+        return self._memory()[0] if self._memory is not None else None
+
+    def peak_rss_mb(self) -> Optional[float]:
+        """プロセス全体のピークメモリ（MB。段階ごとの値ではない）"""
+        peak = self._memory()[1] if self._memory is not None else None
+        return peak / (1024 * 1024) if peak else None
+
+    def record(self, name: str, seconds: float, nbytes: int = 0, start_rss: Optional[int] = None):
+        """段階の記録を追加（start_rss は段階の開始時点のメモリ。終了時点との差を記録する）"""
+        end_rss = self.current_rss() if start_rss is not None else None
+        delta = (end_rss - start_rss) / (1024 * 1024) if end_rss is not None else None
+        record = StageRecord(name, seconds, int(nbytes), delta)
+        with self._lock:
+            self._latest[name] = record
+            self.version += 1
+            if self._log is not None:
+                self._log.write(json.dumps({
+                    "time": time.time(), "pid": os.getpid(), "thread": threading.current_thread().name,
+                    "stage": name, "seconds": round(seconds, 6), "bytes": record.bytes,
+                    "rss_delta_mb": round(delta, 1) if delta is not None else None,
+                }, ensure_ascii=False) + "\n")
+
+    def latest(self) -> Dict[str, StageRecord]:
+        """各段階の直近の記録"""
+        with self._lock:
+            return dict(self._latest)
+
+    def format_status(self) -> str:
+        """ステータス表示用の1行（例: デコード 45ms +64MB · グレー 8ms · PNG 120ms · プロセスのピーク 310MB）
+
+        段階ごとにメモリの増減（1MB以上の場合）を、最後にプロセス全体のピークメモリを表示する
+        """
+        latest = self.latest()
+        parts = []
+        for name, label in STAGE_LABELS.items():
+            if name in latest:
+                record = latest[name]
+                part = f"{label} {record.seconds * 1000:.0f}ms"
+                if record.rss_delta_mb is not None and abs(record.rss_delta_mb) >= 1:
+                    part += f" {record.rss_delta_mb:+.0f}MB"
+                parts.append(part)
+        peak = self.peak_rss_mb()
+        if parts and peak:
+            parts.append(f"プロセスのピーク {peak:.0f}MB")
+        return " · ".join(parts)
+
+
+profiler = Profiler()
+
+
+def stage(name: str, nbytes: int = 0):
+    """共有の計測器で段階を計測（無効時は何もしない）"""
+    return profiler.stage(name, nbytes)
+
+
+def enable(log_path: Optional[str] = None):
+    profiler.enable(log_path)
+
+
+def disable():
+    profiler.disable()
+
+
+if os.environ.get(PROFILE_LOG_ENV):
+    enable(os.environ[PROFILE_LOG_ENV])
@@ -0,0 +1,540 @@
+"""画像シーケンス・複数フレームの画像のストリーミング処理
+
+連番のファイル（face_0001.png …）、マルチページTIFF、APNG の各フレームを
+デコード → SDF生成 → エンコード の3段階で処理する。段階ごとに別のスレッドで動かし、
+間を上限付きのキューでつなぐため、数千フレームでもメモリ使用量は一定で、
+デコードとエンコードは生成と重なって進む。
+SDF生成は1つの SDFProcessor で部分更新を有効にして行うため、前のフレームから変化した部分だけを再計算する。
+出力は入力に合わせて連番のファイル、またはマルチページTIFF・APNG（フレームごとに追記）に書き出す。
+"""
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from sdf_io import decode_image
+from sdf_output import PNGOptions, encode_png, replace_file, save_png, temporary_path
+from sdf_processor import GeneratorSettings, SDFProcessor, get_default_output_path, is_generated_output
+
+
+# 段階の間のキューに置けるフレーム数の既定値（先読み・書き出し待ちの上限）
+DEFAULT_PREFETCH = 2
+
+# 表示時間の指定がない入力をAPNGにする場合の1フレームの表示時間（ミリ秒）
+DEFAULT_FRAME_DURATION_MS = 100
+
+# 複数フレームとして書き出せる形式
+MULTIFRAME_EXTENSIONS = (".tif", ".tiff", ".png", ".apng")
+
+# キューの空き・到着を待つ間に、他の段階の失敗を確認する間隔（秒）
+_POLL_SECONDS = 0.1
+
+# 連番の指定（printf 形式の %04d / %d、または #### ）
+_PLACEHOLDER = re.compile(r"%0?(\d*)d|#+")
+
+
+class Frame(NamedTuple):
+    """パイプラインを流れる1フレーム"""
+    number: int                     # 連番（出力のファイル名に使う）
+    pixels: np.ndarray              # H×W×4（uint8）
+    duration_ms: Optional[int] = None
+
+
+class StageStats(NamedTuple):
+    """段階ごとの計測結果
+
+    starved_seconds は前の段階を待った時間、blocked_seconds は次の段階のキューが一杯で待った時間（背圧）
+    """
+    name: str
+    frames: int
+    busy_seconds: float
+    starved_seconds: float
+    blocked_seconds: float
+
+    def format(self, label: str) -> str:
+        rate = self.frames / self.busy_seconds if self.busy_seconds > 0 else float("inf")
+        return (f"{label}: {self.frames} フレーム / 処理 {self.busy_seconds:.2f} 秒（{rate:.1f} fps）/ "
+                f"入力待ち {self.starved_seconds:.2f} 秒 / 出力待ち {self.blocked_seconds:.2f} 秒")
+
+
+class SequenceResult(NamedTuple):
+    """処理結果"""
+    frames: int
+    seconds: float
+    outputs: List[str]
+    stages: List[StageStats]
+    patched_frames: int = 0         # 前のフレームとの差分だけを再計算したフレーム数
+
+    def format(self) -> str:
+        labels = {"decode": "デコード", "generate": "SDF生成", "encode": "エンコード"}
+        lines = [f"{self.frames} フレーム / {self.seconds:.2f} 秒"
+                 f"（{self.frames / max(self.seconds, 1e-9):.1f} fps, 部分更新 {self.patched_frames} フレーム）"]
+        lines += ["  " + stats.format(labels.get(stats.name, stats.name)) for stats in self.stages]
+        if self.stages:
+            slowest = max(self.stages, key=lambda stats: stats.busy_seconds)
+            lines.append(f"  最も時間のかかった段階: {labels.get(slowest.name, slowest.name)}")
+        return "\n".join(lines)
+
+
+def _split_placeholder(pattern: str) -> Optional[Tuple[str, str, Optional[int]]]:
+    """連番の指定を含むパスを (前, 後, 桁数) に分割（桁数の指定がなければ None）"""
+    directory, name = os.path.split(pattern)
+    match = None
+    for match in _PLACEHOLDER.finditer(name):
+        pass
+    if match is None:
+        return None
+    digits = len(match.group(0)) if match.group(0).startswith("#") else (int(match.group(1) or 0) or None)
+    return os.path.join(directory, name[:match.start()]), name[match.end():], digits
+
+
+def format_frame_path(pattern: str, number: int) -> str:
+    """連番の指定（%04d・#### など）に番号を埋め込んだパス"""
+    prefix, suffix, digits = _split_placeholder(pattern)
+    return f"{prefix}{number:0{digits or 1}d}{suffix}"
+
+
+def find_sequence(path: str) -> Optional[List[Tuple[int, str]]]:
+    """連番のファイルを番号順に列挙（連番でなければ None）
+
+    path は連番の指定（face_%04d.png・face_####.png）か、連番の1ファイル（face_0001.png）
+    """
+    parts = _split_placeholder(path)
+    if parts is None:
+        directory, name = os.path.split(path)
+        stem, extension = os.path.splitext(name)
+        match = re.search(r"\d+$", stem)
+        if match is None or not os.path.isfile(path):
+            return None
+        parts = (os.path.join(directory, stem[:match.start()]), extension, len(match.group(0)))
+
+    prefix, suffix, digits = parts
+    directory, name_prefix = os.path.split(prefix)
+    number = r"(\d+)" if digits is None else rf"(\d{{{digits}}})"
+    pattern = re.compile(re.escape(name_prefix) + number + re.escape(suffix) + "$", re.IGNORECASE)
+    frames = []
+    for name in os.listdir(directory or "."):
+        match = pattern.match(name)
+        if match and not is_generated_output(name):
+            frames.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(frames) or None
+
+
+def is_multiframe(path: str) -> bool:
+    """複数フレームを含む画像ファイル（マルチページTIFF・APNGなど）か"""
+    try:
+        with Image.open(path) as image:
+            return getattr(image, "n_frames", 1) > 1
+    except (OSError, ValueError):
+        return False
+
+
+def read_sequence(frames: List[Tuple[int, str]]) -> Iterator[Frame]:
+    """連番のファイルを1枚ずつデコード（各ファイルは一度しか読まないのでキャッシュしない）"""
+    for number, path in frames:
+        pixels = decode_image(np.fromfile(path, dtype=np.uint8), os.path.splitext(path)[1]).pixels
+        yield Frame(number, pixels)
+
+
+def read_multiframe(path: str) -> Iterator[Frame]:
+    """複数フレームの画像を1フレームずつデコード（フレームの合成はPillowが行う）"""
+    with Image.open(path) as image:
+        for index in range(getattr(image, "n_frames", 1)):
+            image.seek(index)
+            duration = image.info.get("duration")
+            yield Frame(index + 1, np.array(image.convert("RGBA")),
+                        int(duration) if duration is not None else None)
+
+
+class SequenceWriter:
+    """フレームごとに別のPNGファイルとして保存（各ファイルは一時ファイルから置き換える）"""
+
+    def __init__(self, path_for: Callable[[Frame], str], options: PNGOptions = PNGOptions()):
+        self.path_for = path_for
+        self.options = options
+        self.outputs: List[str] = []
+
+    def write(self, frame: Frame):
+        path = self.path_for(frame)
+        result = save_png(frame.pixels, path, self.options)
+        if not result.success:
+            raise RuntimeError(f"保存に失敗しました: {path}（{result.error}）")
+        self.outputs.append(path)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        # 保存済みのフレームはそのまま残す
+        pass
+
+
+class _StreamingFileWriter:
+    """フレームを1つのファイルに追記する書き出しの共通部分（一時ファイルに書き、close() で置き換える）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.outputs = [path]
+        self.frames = 0
+        self.size: Optional[Tuple[int, int]] = None
+        self._temp_path = temporary_path(path)
+        self._file = open(self._temp_path, "w+b")
+
+    def write(self, frame: Frame):
+        height, width = frame.pixels.shape[:2]
+        if self.size is None:
+            self.size = (width, height)
+            self._start(width, height)
+        elif self.size != (width, height):
+            raise ValueError(f"フレーム {frame.number} のサイズ {width}×{height} が"
+                             f"最初のフレーム（{self.size[0]}×{self.size[1]}）と異なります")
+        self._write_frame(frame)
+        self.frames += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.frames == 0:
+                raise ValueError("書き出すフレームがありません")
+            self._finish()
+            self._file.close()
+            replace_file(self._temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """書きかけの一時ファイルを破棄（出力パスの既存ファイルはそのまま残る）"""
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def _start(self, width: int, height: int):
+        raise NotImplementedError
+
+    def _write_frame(self, frame: Frame):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+
+# TIFFのタグ（番号, 型）。型は 3: SHORT / 4: LONG
+_TIFF_SHORT = 3
+_TIFF_LONG = 4
+_TIFF_DEFLATE = 8
+_TIFF_PREDICTOR_HORIZONTAL = 2
+
+
+class MultiPageTIFFWriter(_StreamingFileWriter):
+    """フレームごとにページを追記するマルチページTIFF（RGBA, Deflate圧縮・水平差分予測）"""
+
+    def __init__(self, path: str, compress_level: int = 6):
+        super().__init__(path)
+        self.compress_level = compress_level
+        # 次のIFDの位置を書き込む場所（最初はヘッダー内）
+        self._next_ifd_offset_at = 4
+
+    def _start(self, width: int, height: int):
+        # リトルエンディアン / 42 / 最初のIFDの位置（ページの追記時に書き込む）
+        self._file.write(b"II" + struct.pack("<HI", 42, 0))
+
+    def _write_frame(self, frame: Frame):
+        height, width = frame.pixels.shape[:2]
+        # 水平差分予測（左隣の画素との差分, uint8の桁あふれは仕様どおりmod 256）
+        predicted = frame.pixels.copy()
+        np.subtract(frame.pixels[:, 1:], frame.pixels[:, :-1], out=predicted[:, 1:])
+        data = zlib.compress(predicted.tobytes(), self.compress_level)
+
+        bits_offset = self._tell()
+        self._file.write(struct.pack("<4H", 8, 8, 8, 8))
+        data_offset = self._tell()
+        self._file.write(data)
+        if self._file.tell() % 2:
+            self._file.write(b"\0")
+
+        tags = [
+            (256, _TIFF_LONG, 1, width),                  # ImageWidth
+            (257, _TIFF_LONG, 1, height),                 # ImageLength
+            (258, _TIFF_SHORT, 4, bits_offset),           # BitsPerSample（8, 8, 8, 8）
+            (259, _TIFF_SHORT, 1, _TIFF_DEFLATE),         # Compression
+            (262, _TIFF_SHORT, 1, 2),                     # PhotometricInterpretation（RGB）
+            (273, _TIFF_LONG, 1, data_offset),            # StripOffsets
+            (277, _TIFF_SHORT, 1, 4),                     # SamplesPerPixel
+            (278, _TIFF_LONG, 1, height),                 # RowsPerStrip（1ページ1ストリップ）
+            (279, _TIFF_LONG, 1, len(data)),              # StripByteCounts
+            (284, _TIFF_SHORT, 1, 1),                     # PlanarConfiguration（画素ごと）
+            (317, _TIFF_SHORT, 1, _TIFF_PREDICTOR_HORIZONTAL),  # Predictor
+            (338, _TIFF_SHORT, 1, 2),                     # ExtraSamples（アルファ, 乗算なし）
+        ]
+        ifd_offset = self._tell()
+        entries = [struct.pack("<HHI", tag, kind, count)
+                   + (struct.pack("<HH", value, 0) if kind == _TIFF_SHORT and count == 1
+                      else struct.pack("<I", value))
+                   for tag, kind, count, value in tags]
+        self._file.write(struct.pack("<H", len(entries)) + b"".join(entries))
+        next_offset_at = self._file.tell()
+        self._file.write(struct.pack("<I", 0))
+
+        # 直前のページ（最初のページはヘッダー）から、このページのIFDを指す
+        self._file.seek(self._next_ifd_offset_at)
+        self._file.write(struct.pack("<I", ifd_offset))
+        self._file.seek(0, os.SEEK_END)
+        self._next_ifd_offset_at = next_offset_at
+
+    def _tell(self) -> int:
+        offset = self._file.tell()
+        if offset >= 2 ** 32:
+            raise ValueError("TIFFの出力が4GBを超えます（BigTIFFには対応していません）")
+        return offset
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_APNG_DISPOSE_NONE = 0
+_APNG_BLEND_SOURCE = 0
+
+
+def _png_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    """PNGのチャンクを (種類, データ) の順に列挙"""
+    position = len(_PNG_SIGNATURE)
+    while position < len(data):
+        length, = struct.unpack(">I", data[position:position + 4])
+        chunk_type = data[position + 4:position + 8]
+        yield chunk_type, data[position + 8:position + 8 + length]
+        position += length + 12
+
+
+class APNGWriter(_StreamingFileWriter):
+    """フレームごとに追記するAPNG（各フレームは画像全体を置き換える）
+
+    フレームは通常のPNGと同じエンコーダで圧縮し、その画像データを fdAT として格納する。
+    総フレーム数は書き終えてから acTL に書き込む
+    """
+
+    def __init__(self, path: str, options: PNGOptions = PNGOptions()):
+        super().__init__(path)
+        # フレームごとにチャンネル数が変わらないよう、アルファは常に残す
+        self.options = options._replace(compact_channels=False)
+        self._sequence = 0
+        self._actl_at = 0
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self._file.write(struct.pack(">I", len(data)) + chunk_type + data
+                         + struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+    def _start(self, width: int, height: int):
+        self._file.write(_PNG_SIGNATURE)
+
+    def _write_frame(self, frame: Frame):
+        height, width = frame.pixels.shape[:2]
+        chunks = list(_png_chunks(encode_png(frame.pixels, self.options)))
+        if self.frames == 0:
+            self._write_chunk(b"IHDR", dict(chunks)[b"IHDR"])
+            self._actl_at = self._file.tell()
+            # フレーム数は close() で書き込む / 0 は無限ループ
+            self._write_chunk(b"acTL", struct.pack(">II", 0, 0))
+
+        duration = frame.duration_ms if frame.duration_ms is not None else DEFAULT_FRAME_DURATION_MS
+        self._write_chunk(b"fcTL", struct.pack(">IIIIIHHBB", self._sequence, width, height, 0, 0,
+                                               duration, 1000, _APNG_DISPOSE_NONE, _APNG_BLEND_SOURCE))
+        self._sequence += 1
+        for chunk_type, data in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            if self.frames == 0:
+                # 最初のフレームは通常のPNGとしても表示される画像（IDAT）
+                self._write_chunk(b"IDAT", data)
+            else:
+                self._write_chunk(b"fdAT", struct.pack(">I", self._sequence) + data)
+                self._sequence += 1
+
+    def _finish(self):
+        self._write_chunk(b"IEND", b"")
+        self._file.seek(self._actl_at)
+        self._write_chunk(b"acTL", struct.pack(">II", self.frames, 0))
+
+
+class _StageTimer:
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.busy = self.starved = self.blocked = 0.0
+
+    def stats(self) -> StageStats:
+        return StageStats(self.name, self.frames, self.busy, self.starved, self.blocked)
+
+
+def run_pipeline(frames: Iterator[Frame], compute: Callable[[Frame], Frame], write: Callable[[Frame], None],
+                 prefetch: int = DEFAULT_PREFETCH) -> List[StageStats]:
+    """デコード（frames の列挙）・生成（compute）・エンコード（write）をそれぞれのスレッドで実行
+
+    段階の間のキューには最大 prefetch フレームまでしか置かないため、遅い段階に合わせて前の段階が待つ。
+    いずれかの段階で例外が発生した場合は、全ての段階を止めてからその例外を送出する
+    """
+    decoded = queue.Queue(maxsize=max(prefetch, 1))
+    computed = queue.Queue(maxsize=max(prefetch, 1))
+    timers = [_StageTimer("decode"), _StageTimer("generate"), _StageTimer("encode")]
+    failed = threading.Event()
+    errors = []
+
+    def put(target: queue.Queue, item, timer: _StageTimer):
+        start = time.perf_counter()
+        while not failed.is_set():
+            try:
+                target.put(item, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                pass
+        timer.blocked += time.perf_counter() - start
+
+    def get(source: queue.Queue, timer: _StageTimer):
+        start = time.perf_counter()
+        item = None
+        while True:
+            try:
+                item = source.get(timeout=_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if failed.is_set():
+                    break
+        timer.starved += time.perf_counter() - start
+        return item
+
+    def stage_loop(timer: _StageTimer, next_item: Callable[[], Optional[Frame]],
+                   process: Callable[[Frame], Optional[Frame]], target: Optional[queue.Queue]):
+        try:
+            while not failed.is_set():
+                item = next_item()
+                if item is None:
+                    break
+                start = time.perf_counter()
+                result = process(item)
+                timer.busy += time.perf_counter() - start
+                timer.frames += 1
+                if target is not None:
+                    put(target, result, timer)
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            if target is not None:
+                put(target, None, timer)
+
+    iterator = iter(frames)
+    decode_timer = timers[0]
+
+    def next_frame() -> Optional[Frame]:
+        # デコードは列挙の中で行われるため、列挙にかかった時間を処理時間とする
+        start = time.perf_counter()
+        frame = next(iterator, None)
+        decode_timer.busy += time.perf_counter() - start
+        return frame
+
+    threads = [
+        threading.Thread(target=stage_loop, name="SDFSequenceDecode",
+                         args=(decode_timer, next_frame, lambda frame: frame, decoded)),
+        threading.Thread(target=stage_loop, name="SDFSequenceGenerate",
+                         args=(timers[1], lambda: get(decoded, timers[1]), compute, computed)),
+        threading.Thread(target=stage_loop, name="SDFSequenceEncode",
+                         args=(timers[2], lambda: get(computed, timers[2]), write, None)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 途中で止めた場合も、デコード中のファイルを閉じる
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+    if errors:
+        raise errors[0]
+    return [timer.stats() for timer in timers]
+
+
+def _multiframe_output_path(input_path: str, output_dir: Optional[str]) -> str:
+    """複数フレームの入力に対する既定の出力パス（TIFF・PNGは同じ形式、それ以外はAPNG）"""
+    extension = os.path.splitext(input_path)[1].lower()
+    path = get_default_output_path(input_path, extension if extension in MULTIFRAME_EXTENSIONS else ".png")
+    return os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+
+
+def process_sequence(input_path: str, output_path: Optional[str] = None, output_dir: Optional[str] = None,
+                     settings: GeneratorSettings = GeneratorSettings(), options: PNGOptions = PNGOptions(),
+                     prefetch: int = DEFAULT_PREFETCH, threads: int = 1) -> SequenceResult:
+    """連番のファイルまたは複数フレームの画像を処理
+
+    input_path は連番の指定（face_%04d.png・face_####.png）、連番の1ファイル、または複数フレームの画像。
+    output_path を省略すると入力に合わせて出力する（連番 → 各ファイルの <stem>_SDF.png、
+    複数フレーム → <stem>_SDF.tif / .png）。連番の指定を含む output_path には連番のファイルとして、
+    含まない output_path（.tif・.tiff・.png・.apng）には1つの複数フレームの画像として書き出す
+    """
+    if is_multiframe(input_path):
+        frames = read_multiframe(input_path)
+        default_path = _multiframe_output_path(input_path, output_dir)
+        sequence_output = None
+    else:
+        sequence = find_sequence(input_path)
+        if sequence is None:
+            if not os.path.isfile(input_path):
+                raise ValueError(f"入力が見つかりません: {input_path}")
+            sequence = [(0, input_path)]
+        paths = dict(sequence)
+        frames = read_sequence(sequence)
+        default_path = None
+
+        def sequence_output(frame: Frame) -> str:
+            path = get_default_output_path(paths[frame.number])
+            return os.path.join(output_dir, os.path.basename(path)) if output_dir else path
+
+    output_path = output_path or default_path
+    for directory in (output_dir, os.path.dirname(output_path or "")):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    if output_path is None:
+        writer = SequenceWriter(sequence_output, options)
+    elif _split_placeholder(output_path) is not None:
+        writer = SequenceWriter(lambda frame: format_frame_path(output_path, frame.number), options)
+    else:
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension in (".tif", ".tiff"):
+            writer = MultiPageTIFFWriter(output_path, options.compress_level)
+        elif extension in (".png", ".apng"):
+            writer = APNGWriter(output_path, options)
+        else:
+            raise ValueError(f"複数フレームの出力は {' / '.join(MULTIFRAME_EXTENSIONS)} のいずれかです: "
+                             f"{output_path}")
+
+    processor = SDFProcessor()
+    processor.settings = settings
+    processor.threads = threads
+    # 連続するフレームは似ていることが多いため、前のフレームから変化した部分だけを再計算する
+    processor.incremental = True
+    processor.reuse_buffers = True
+    patched = 0
+
+    def compute(frame: Frame) -> Frame:
+        nonlocal patched
+        processor.gradient_image = frame.pixels
+        if not processor.process_sdf():
+            raise RuntimeError(f"フレーム {frame.number} のSDF処理に失敗しました")
+        if processor.last_changes is not None:
+            patched += 1
+        # 結果のバッファは次のフレームの部分更新に使うため、エンコード用にコピーする
+        return frame._replace(pixels=processor.result_image.copy())
+
+    start = time.perf_counter()
+    try:
+        stages = run_pipeline(frames, compute, writer.write, prefetch)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return SequenceResult(stages[-1].frames, time.perf_counter() - start, writer.outputs, stages, patched)
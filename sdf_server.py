@@ -0,0 +1,327 @@
+"""常駐するSDF変換サーバー（ローカルのTCPソケット）
+
+1枚ごとにPythonを起動すると、NumPy・Pillow・OpenCV の読み込み（EXEでは展開も）に
+SDF生成そのものより長い時間がかかる。サーバーとして起動しておけば読み込みは1回で済み、
+デコード結果・アトラスの配置・出力バッファのキャッシュも要求をまたいで使い回せる。
+
+要求は接続ごとのスレッドで受け取り、上限付きのワーカープールで並列に処理する。
+待ち行列が上限に達した場合は、待たせずに失敗（混雑）を返す。
+通信の形式は sdf_client.py を参照。外部から接続されないよう、既定では 127.0.0.1 でのみ待ち受ける。
+"""
+import math
+import os
+import socketserver
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from sdf_client import DEFAULT_HOST, DEFAULT_PORT, read_message, write_message
+from sdf_dds import DDS_FORMATS, DDS_QUALITY_HIGH, DDSOptions
+from sdf_io import decode_image, image_cache, load_image
+from sdf_mipmap import MIP_FILTERS, MipmapOptions
+from sdf_output import COMPRESSION_PRESETS, DEFAULT_COMPRESSION, PNGOptions
+from sdf_processor import (GENERATION_MODES, GeneratorSettings, SDFProcessor,
+                           generate_sdf, get_default_output_path)
+
+
+# 待ち行列（処理待ちの要求）の既定の上限
+DEFAULT_MAX_QUEUE = 64
+
+# 処理時間のパーセンタイルの計算に使う直近の要求数
+LATENCY_SAMPLES = 1000
+
+# 要求の options に指定できる項目と既定値（名前はコマンドライン版の引数と同じ）
+REQUEST_OPTIONS = {
+    "mode": GeneratorSettings().mode,
+    "threshold": GeneratorSettings().threshold,
+    "spread": GeneratorSettings().spread,
+    "layout": "",
+    "format": "png",
+    "compression": DEFAULT_COMPRESSION,
+    "compact_channels": False,
+    "mipmaps": False,
+    "mip_filter": MipmapOptions().filter,
+    "dds_format": DDSOptions().format,
+    "dds_quality": DDSOptions().quality,
+    "dds_flip_y": False,
+}
+
+
+class ServerBusy(Exception):
+    """待ち行列が上限に達していることを表す例外"""
+
+
+class LatencyStats:
+    """直近の処理時間のパーセンタイル（スレッドセーフ）"""
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self._samples = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """p50・p90・p99・最大（ミリ秒。記録がなければ None）"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"p50": None, "p90": None, "p99": None, "max": None, "count": 0}
+
+        def percentile(p: float) -> float:
+            # 最近傍順位法（記録された値のいずれかを返す）
+            return round(samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)] * 1000, 3)
+
+        return {"p50": percentile(50), "p90": percentile(90), "p99": percentile(99),
+                "max": round(samples[-1] * 1000, 3), "count": len(samples)}
+
+
+def parse_options(options: Dict[str, Any]) -> Tuple[GeneratorSettings, PNGOptions, DDSOptions,
+                                                    MipmapOptions, str]:
+    """要求の options を生成設定・PNG・DDS・ミップマップの設定と出力形式に変換"""
+    unknown = set(options) - set(REQUEST_OPTIONS)
+    if unknown:
+        raise ValueError(f"不明なオプションです: {', '.join(sorted(unknown))}")
+    values = dict(REQUEST_OPTIONS, **options)
+
+    choices = {"mode": GENERATION_MODES, "format": ("png", "dds"), "compression": tuple(COMPRESSION_PRESETS),
+               "mip_filter": MIP_FILTERS, "dds_format": DDS_FORMATS, "dds_quality": range(DDS_QUALITY_HIGH + 1)}
+    for name, allowed in choices.items():
+        if values[name] not in allowed:
+            raise ValueError(f"{name} の値が不正です: {values[name]}（{' / '.join(map(str, allowed))}）")
+    if not 0 <= int(values["threshold"]) <= 255:
+        raise ValueError(f"threshold は 0-255 である必要があります: {values['threshold']}")
+
+    settings = GeneratorSettings(values["mode"], int(values["threshold"]), float(values["spread"]),
+                                 values["layout"])
+    png_options = COMPRESSION_PRESETS[values["compression"]]._replace(
+        compact_channels=bool(values["compact_channels"]))
+    dds_options = DDSOptions(values["dds_format"], values["dds_quality"], flip_y=bool(values["dds_flip_y"]))
+    mipmap_options = MipmapOptions(bool(values["mipmaps"]), values["mip_filter"])
+    return settings, png_options, dds_options, mipmap_options, values["format"]
+
+
+class SDFServer:
+    """SDF変換サーバー
+
+    workers は同時に処理する要求の数、max_queue は処理待ちにできる要求の数の上限。
+    threads は1要求あたりのスレッド数（SDF生成とPNGエンコードを行の帯に分けて並列に行う）。
+    port に 0 を指定すると空いているポートを使う（実際のアドレスは address で取得できる）
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = os.cpu_count() or 1,
+                 max_queue: int = DEFAULT_MAX_QUEUE, threads: int = 1):
+        self.workers = max(workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self.threads = threads
+        self.latency = LatencyStats()     # 受信から応答まで（待ち時間を含む）
+        self.queue_wait = LatencyStats()  # 受信から処理開始まで
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queued = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="SDFServerWorker")
+        self._thread: Optional[threading.Thread] = None
+        self._server = _TCPServer((host, port), _RequestHandler)
+        self._server.sdf_server = self
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def warm_up(self):
+        """OpenCVの読み込みなど、初回の要求だけにかかる準備を先に済ませる"""
+        sample = np.zeros((8, 8, 4), dtype=np.uint8)
+        for mode in GENERATION_MODES:
+            generate_sdf(sample, GeneratorSettings(mode))
+        # OpenCVは読み込みに時間がかかるため、初めて使うときに読み込む（サーバーでは起動時に読み込んでおく）
+        import cv2  # noqa: F401
+
+    def serve_forever(self):
+        """停止されるまで要求を待ち受ける（呼び出し元のスレッドで実行）"""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._executor.shutdown(wait=True)
+
+    def start(self):
+        """バックグラウンドのスレッドで待ち受けを開始"""
+        self._thread = threading.Thread(target=self.serve_forever, name="SDFServer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """待ち受けを停止し、処理中の要求の完了を待つ（待ち受けのスレッド以外から呼ぶ）"""
+        self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {"queue_depth": self._queued, "active": self._active, "completed": self.completed,
+                      "failed": self.failed, "rejected": self.rejected}
+        return dict(counts, workers=self.workers, max_queue=self.max_queue,
+                    uptime_seconds=round(time.time() - self._started_at, 3),
+                    latency_ms=self.latency.summary(), queue_wait_ms=self.queue_wait.summary(),
+                    image_cache=image_cache.stats())
+
+    def handle(self, request: Dict[str, Any], payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+        """1件の要求を処理して応答を返す（接続ごとのスレッドから呼ばれる）"""
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}, b""
+        if op == "stats":
+            return dict(self.stats(), ok=True), b""
+        if op == "shutdown":
+            # 停止は待ち受けの終了まで待つため、応答を先に返せるように別のスレッドで行う
+            threading.Thread(target=self._server.shutdown, name="SDFServerShutdown").start()
+            return {"ok": True}, b""
+        if op == "process":
+            received_at = time.perf_counter()
+            try:
+                response, data = self._submit(lambda: self._process(request, payload), received_at).result()
+            except ServerBusy:
+                return {"ok": False, "error": f"待ち行列が上限（{self.max_queue} 件）に達しています"}, b""
+            self.latency.record(time.perf_counter() - received_at)
+            return dict(response, ok=True), data
+        raise ValueError(f"不明な要求です: {op}")
+
+    def _submit(self, func: Callable[[], Any], received_at: float):
+        """ワーカープールに登録（待ち行列が上限に達していれば ServerBusy）"""
+        with self._lock:
+            # 処理中と処理待ちの合計が、ワーカー数と待ち行列の上限の和を超えないようにする
+            if self._queued + self._active >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ServerBusy()
+            self._queued += 1
+
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            self.queue_wait.record(time.perf_counter() - received_at)
+            try:
+                result = func()
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+            with self._lock:
+                self.completed += 1
+            return result
+
+        return self._executor.submit(run)
+
+    def _processor(self) -> SDFProcessor:
+        """ワーカースレッドごとの SDFProcessor（保存に使う）"""
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            processor = self._local.processor = SDFProcessor()
+            processor.threads = self.threads
+        return processor
+
+    def _generate(self, source: np.ndarray, settings: GeneratorSettings) -> np.ndarray:
+        """SDFを生成（失敗した場合の例外はそのままクライアントへの応答になる）
+
+        出力と作業域のバッファはワーカースレッドごとに、同じサイズの要求をまたいで使い回す
+        """
+        shape = source.shape[:2]
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[1].shape != shape:
+            buffers = self._local.buffers = (np.empty(shape + (4,), dtype=np.uint8),
+                                             np.empty(shape, dtype=np.uint16))
+        return generate_sdf(source, settings, buffers[0], buffers[1], threads=self.threads)
+
+    def _process(self, request: Dict[str, Any], payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+        settings, png_options, dds_options, mipmap_options, output_format = parse_options(
+            request.get("options") or {})
+
+        processor = self._processor()
+        processor.settings = settings
+        processor.output_options = png_options._replace(threads=self.threads)
+        processor.dds_options = dds_options
+        processor.mipmap_options = mipmap_options
+
+        output_path = request.get("output")
+        if "input" in request:
+            # 同じファイルの再処理ではデコードしない
+            source = load_image(request["input"]).pixels
+            output_path = output_path or get_default_output_path(request["input"], f".{output_format}")
+        elif "width" in request:
+            source = _raw_pixels(request, payload)
+        elif "extension" in request:
+            source = decode_image(np.frombuffer(payload, dtype=np.uint8), request["extension"]).pixels
+        else:
+            raise ValueError("input（パス）・width と height（画素データ）・extension（画像ファイルの内容）"
+                             "のいずれかを指定してください")
+
+        processor.result_image = self._generate(source, settings)
+        if output_path:
+            if not processor.save_result(output_path):
+                error = processor.last_output.error if processor.last_output is not None else None
+                raise RuntimeError(f"保存に失敗しました: {output_path}（{error or '不明なエラー'}）")
+            output = processor.last_output
+            return {"output": output_path, "bytes": output.bytes_written,
+                    "encode_seconds": round(output.encode_seconds, 6)}, b""
+
+        result = processor.result_image
+        return {"width": result.shape[1], "height": result.shape[0], "channels": 4}, result.tobytes()
+
+
+def _raw_pixels(request: Dict[str, Any], payload: bytes) -> np.ndarray:
+    """画素データの要求を H×W×C の配列に変換（コピーしない）"""
+    width, height, channels = request["width"], request["height"], request.get("channels", 4)
+    if not all(isinstance(v, int) for v in (width, height, channels)) or width <= 0 or height <= 0 \
+            or not 1 <= channels <= 4:
+        raise ValueError(f"画像のサイズが不正です: {width}×{height}×{channels}")
+    if len(payload) != width * height * channels:
+        raise ValueError(f"データの長さ（{len(payload)} バイト）が {width}×{height}×{channels} と一致しません")
+    return np.frombuffer(payload, dtype=np.uint8).reshape(height, width, channels)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    sdf_server: SDFServer
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """1つの接続の要求を順に処理する"""
+
+    def handle(self):
+        server = self.server.sdf_server
+        while True:
+            try:
+                message = read_message(self.rfile)
+            except (ValueError, ConnectionError) as e:
+                # 区切りがわからなくなるため、応答してから接続を閉じる
+                self._respond({"ok": False, "error": f"通信エラー: {e}"})
+                return
+            if message is None:
+                return
+            request, payload = message
+            try:
+                response, data = server.handle(request, payload)
+            except Exception as e:
+                response, data = {"ok": False, "error": str(e)}, b""
+            if not self._respond(response, data):
+                return
+
+    def _respond(self, response: Dict[str, Any], data: bytes = b"") -> bool:
+        try:
+            write_message(self.wfile, response, data)
+            return True
+        except OSError:
+            return False
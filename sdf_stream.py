@@ -0,0 +1,395 @@
+"""巨大テクスチャ（8K/16K）向けのストリーミング処理
+
+画像を水平方向の帯（複数行）に分割して処理し、出力は行単位のPNGエンコーダか
+メモリマップした .npy に書き出す。左右反転は行内で完結するため、帯同士は独立している。
+どちらも一時ファイルに書き出し、完了後に出力パスへ置き換える。
+入力も、PNG（インターレースなし）は帯ごとに展開し、.npy はメモリマップで読むため、画像全体をデコードしない。
+"""
+import os
+import struct
+import zlib
+from typing import Optional
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from sdf_output import PNGOptions, replace_file, temporary_path
+from sdf_processor import compute_sdf_texture
+
+
+# 既定の作業メモリ上限（MB）
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+# 1画素あたりの作業メモリ見積もり（バイト。入力の読み込みは BandSource.bytes_per_pixel で別に見積もる）
+# グレースケール作業域 2 + 出力 4 + PNGフィルタ行 4 + 圧縮前のバイト列 4 + 余裕
+_WORKING_BYTES_PER_PIXEL = 20
+
+# 圧縮されたIDATを一度に読む大きさ
+_READ_CHUNK_SIZE = 64 * 1024
+
+# PNGのフィルタの単位（1画素のバイト数）ごとの、バイト列のまま展開できるPillowのモード
+_UNFILTER_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+# IDATチャンクを書き出す単位
+_IDAT_CHUNK_SIZE = 1024 * 1024
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_FILTER_UP = 2
+
+
+class StreamingPNGWriter:
+    """行単位でRGBA PNGを書き出すエンコーダ（画像全体をメモリに保持しない）
+
+    書き込み中は一時ファイルに出力し、close() で全行が揃ったときだけ path に置き換える
+    """
+
+    def __init__(self, path: str, width: int, height: int, compress_level: int = 6):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._temp_path = temporary_path(path)
+        self._file = open(self._temp_path, "wb")
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_size = 0
+        # Upフィルタ用の直前の行（先頭行は0の行を参照する）
+        self._previous_row = np.zeros(width * 4, dtype=np.uint8)
+
+        self._file.write(_PNG_SIGNATURE)
+        self.bytes_written += len(_PNG_SIGNATURE)
+        # 8bit / カラータイプ6（RGBA） / 圧縮0 / フィルタ0 / インターレースなし
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes):
+        self.bytes_written += len(data) + 12
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+    def _emit(self, data: bytes, force: bool = False):
+        if data:
+            self._pending.append(data)
+            self._pending_size += len(data)
+        if self._pending_size >= _IDAT_CHUNK_SIZE or (force and self._pending_size):
+            self._write_chunk(b"IDAT", b"".join(self._pending))
+            self._pending = []
+            self._pending_size = 0
+
+    def write_rows(self, rows: np.ndarray):
+        """RGBA行（N×W×4, uint8）を追記"""
+        count = rows.shape[0]
+        if self.rows_written + count > self.height:
+            raise ValueError("画像の高さを超える行が書き込まれました")
+
+        flat = rows.reshape(count, self.width * 4)
+        filtered = np.empty((count, self.width * 4 + 1), dtype=np.uint8)
+        filtered[:, 0] = _PNG_FILTER_UP
+        # Upフィルタ：真上の行との差分（uint8の桁あふれはPNG仕様どおりmod 256）
+        np.subtract(flat[0], self._previous_row, out=filtered[0, 1:])
+        np.subtract(flat[1:], flat[:-1], out=filtered[1:, 1:])
+        self._previous_row = flat[-1].copy()
+
+        self._emit(self._compressor.compress(filtered.tobytes()))
+        self.rows_written += count
+
+    def close(self):
+        """残りのデータとIENDを書き出して閉じ、出力パスに置き換える"""
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"書き込まれた行数が不足しています: {self.rows_written}/{self.height}")
+            self._emit(self._compressor.flush(), force=True)
+            self._write_chunk(b"IEND", b"")
+            self._file.close()
+            replace_file(self._temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """書きかけの一時ファイルを破棄（出力パスの既存ファイルはそのまま残る）"""
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PNGRowReader:
+    """インターレースなしのPNGを先頭から順に行単位で展開するクラス
+
+    IDATは上限を指定して少しずつ展開し、フィルタの復元はPillowのデコーダで帯ごとに行う
+    （直前の帯の最後の行をフィルタなしの行として先頭に付けるため、帯の境界でも結果は変わらない）。
+    ヘッダーだけを読むため、Pillowの展開爆弾チェック（画像全体をデコードする場合の上限）は適用しない。
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self.header = PngImagePlugin.PngImageFile(self._file)
+            if self.header.info.get("interlace"):
+                raise ValueError("インターレースPNGは行単位で展開できません")
+            self._file.seek(8)
+            self._chunk_remaining = self._find_idat()
+        except BaseException:
+            self._file.close()
+            raise
+
+        self.width, self.height = self.header.size
+        self._rawmode = self.header.tile[0].args
+        self._stride = (self.width * self._bits_per_pixel + 7) // 8
+        # フィルタの単位（1画素のバイト数。1バイト未満は1）
+        self._filter_bytes = max(1, self._bits_per_pixel // 8)
+        self._previous = np.zeros(self._stride, dtype=np.uint8)
+        self._decompressor = zlib.decompressobj()
+        self._compressed = b""
+
+    def _find_idat(self) -> int:
+        """IHDR から色深度を読み、最初のIDATのデータの先頭まで進めてその長さを返す"""
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+        self._file.read(8)  # IHDRの長さとチャンクの種類
+        width, height, bit_depth, color_type = struct.unpack(">IIBB", self._file.read(10))
+        self._bits_per_pixel = bit_depth * channels[color_type]
+        self._file.seek(7, os.SEEK_CUR)  # IHDRの残りとCRC
+        while True:
+            length, chunk_type = struct.unpack(">I4s", self._read_exact(8))
+            if chunk_type == b"IDAT":
+                return length
+            self._file.seek(length + 4, os.SEEK_CUR)
+
+    def _read_exact(self, size: int) -> bytes:
+        data = self._file.read(size)
+        if len(data) != size:
+            raise ValueError("PNGが途中で終わっています")
+        return data
+
+    def _read_compressed(self) -> bytes:
+        """IDATのデータを最大 _READ_CHUNK_SIZE バイト読む（IDATが終われば空）"""
+        while not self._chunk_remaining:
+            if self._chunk_remaining is None:
+                return b""
+            self._file.read(4)  # CRC
+            length, chunk_type = struct.unpack(">I4s", self._read_exact(8))
+            self._chunk_remaining = length if chunk_type == b"IDAT" else None
+        data = self._read_exact(min(self._chunk_remaining, _READ_CHUNK_SIZE))
+        self._chunk_remaining -= len(data)
+        return data
+
+    def _read_filtered(self, rows: int) -> np.ndarray:
+        """フィルタ済みの行（rows ×（1 + 行のバイト数））を展開"""
+        size = rows * (self._stride + 1)
+        buffer = bytearray()
+        while len(buffer) < size:
+            if not self._compressed:
+                self._compressed = self._read_compressed()
+                if not self._compressed and self._decompressor.eof:
+                    break
+                if not self._compressed:
+                    buffer += self._decompressor.flush()
+                    break
+            buffer += self._decompressor.decompress(self._compressed, size - len(buffer))
+            self._compressed = self._decompressor.unconsumed_tail
+        if len(buffer) < size:
+            raise ValueError("PNGの画像データが途中で終わっています")
+        return np.frombuffer(bytes(buffer), dtype=np.uint8).reshape(rows, self._stride + 1)
+
+    def _unfilter(self, filtered: np.ndarray) -> np.ndarray:
+        """フィルタを復元した行（rows × 行のバイト数）
+
+        フィルタは1画素のバイト数おきのバイト列ごとに独立しているため、16bitのRGB(A)は
+        3・4バイトずつの組に分けてPillowのデコーダで復元する
+        """
+        rows = filtered.shape[0]
+        lanes = 1 if self._filter_bytes <= 4 else 2
+        group = self._filter_bytes // lanes
+        pixels = self._stride // self._filter_bytes
+        data = filtered[:, 1:].reshape(rows, pixels, lanes, group)
+        previous = self._previous.reshape(pixels, lanes, group)
+        mode = _UNFILTER_MODES[group]
+
+        unfiltered = np.empty((rows, pixels, lanes, group), dtype=np.uint8)
+        stream = np.empty((rows + 1, 1 + pixels * group), dtype=np.uint8)
+        stream[0, 0] = 0
+        stream[1:, 0] = filtered[:, 0]
+        for lane in range(lanes):
+            stream[0, 1:] = previous[:, lane].reshape(-1)
+            stream[1:, 1:] = data[:, :, lane].reshape(rows, -1)
+            # 無圧縮のzlibとして渡し、フィルタの復元だけをPillowで行う
+            image = Image.frombytes(mode, (pixels, rows + 1), zlib.compress(stream.tobytes(), 0), "zip", mode)
+            unfiltered[:, :, lane] = np.asarray(image).reshape(rows + 1, pixels, group)[1:]
+        unfiltered = unfiltered.reshape(rows, self._stride)
+        self._previous = unfiltered[-1].copy()
+        return unfiltered
+
+    def read_rows(self, rows: int) -> Image.Image:
+        """次の rows 行を、Pillowで画像全体を開いた場合と同じモード・パレット・透過色の画像として取得"""
+        raw = self._unfilter(self._read_filtered(rows))
+        image = Image.frombytes(self.header.mode, (self.width, rows), raw.tobytes(), "raw", self._rawmode)
+        if self.header.palette is not None:
+            image.putpalette(self.header.palette)
+        image.info = dict(self.header.info)
+        return image
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        """1帯の展開に使うメモリの1画素あたりの見積もり（展開・フィルタの復元・RGBA変換）"""
+        return 4 * -(-self._bits_per_pixel // 8) + 8
+
+    def close(self):
+        self._file.close()
+
+
+class BandSource:
+    """入力画像を帯単位で読み出すクラス（帯は上から順に読む）
+
+    .npy はメモリマップで読み、PNG（インターレースなし）は帯ごとに展開するため、
+    入力も含めて作業メモリが上限内に収まる。その他の形式はPillowで元の色深度のまま一度だけデコードし
+    （Pillowの展開爆弾チェックが適用される）、RGBA化は帯ごとに行う。
+    """
+
+    def __init__(self, path: str):
+        self._array = None
+        self._image = None
+        self._png = None
+        self._next_row = 0
+        # 画像全体を保持するためのメモリ（帯の大きさによらない）と、帯の1画素あたりのメモリ
+        self.resident_bytes = 0
+        self.bytes_per_pixel = 4
+
+        if path.lower().endswith(".npy"):
+            self._array = np.load(path, mmap_mode="r")
+            if self._array.dtype != np.uint8 or self._array.ndim not in (2, 3):
+                raise ValueError(".npy 入力は uint8 の H×W または H×W×C 配列である必要があります")
+            self.height, self.width = self._array.shape[:2]
+            self.bytes_per_pixel = 2 * (self._array.shape[2] if self._array.ndim == 3 else 1) + 4
+            return
+
+        try:
+            self._png = PNGRowReader(path)
+            self.width, self.height = self._png.width, self._png.height
+            self.bytes_per_pixel = self._png.bytes_per_pixel
+            return
+        except (SyntaxError, ValueError, KeyError, struct.error):
+            # PNG以外・インターレースPNGは画像全体をデコードする
+            self._png = None
+
+        self._image = Image.open(path)
+        self._image.load()
+        self.width, self.height = self._image.size
+        # Pillowは1チャンネルの8bit以外を1画素4バイトで保持する
+        self.resident_bytes = self.width * self.height * (1 if self._image.mode in ("1", "L", "P") else 4)
+
+    @property
+    def streamed(self) -> bool:
+        """画像全体をデコードせずに読めるか"""
+        return self._image is None
+
+    def read_band(self, top: int, bottom: int) -> np.ndarray:
+        """[top, bottom) の行をH×W×C配列として取得（PNGは上から順に読む必要がある）"""
+        if self._array is not None:
+            band = np.asarray(self._array[top:bottom])
+            if band.ndim == 2:
+                band = band[:, :, np.newaxis]
+            return band
+
+        if self._png is not None:
+            if top != self._next_row:
+                raise ValueError("PNGの帯は上から順に読む必要があります")
+            self._next_row = bottom
+            return np.asarray(self._png.read_rows(bottom - top).convert("RGBA"))
+
+        band_image = self._image.crop((0, top, self.width, bottom)).convert("RGBA")
+        return np.asarray(band_image)
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        if self._png is not None:
+            self._png.close()
+            self._png = None
+        self._array = None
+
+
+def rows_per_band(width: int, memory_budget_mb: float, source_bytes_per_pixel: int = 4,
+                  resident_bytes: int = 0) -> int:
+    """作業メモリ上限から1帯あたりの行数を算出（上限に収まらない場合は 0）
+
+    source_bytes_per_pixel は入力の帯の読み込みに使うメモリ、resident_bytes は帯によらず保持する入力のメモリ
+    """
+    budget_bytes = int(memory_budget_mb * 1024 * 1024) - resident_bytes
+    return max(0, budget_bytes // (width * (_WORKING_BYTES_PER_PIXEL + source_bytes_per_pixel)))
+
+
+def process_streaming(input_path: str, output_path: str,
+                      memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                      band_rows: Optional[int] = None,
+                      options: PNGOptions = PNGOptions()) -> bool:
+    """帯単位でSDFテクスチャを生成して保存
+
+    出力パスが .npy の場合はメモリマップ配列、それ以外は行単位のPNGとして書き出す。
+    （行単位のPNG出力は常にRGBAで、options の compact_channels は使わない）
+    """
+    source = None
+    temp_path = None
+    try:
+        source = BandSource(input_path)
+        width, height = source.width, source.height
+        step = band_rows or rows_per_band(width, memory_budget_mb, source.bytes_per_pixel,
+                                          source.resident_bytes)
+        if not step:
+            # 入力全体のデコードだけで上限を超える（または1行も収まらない）場合は、1行ずつ処理する
+            print(f"警告: 作業メモリ上限 {memory_budget_mb} MB に収まりません"
+                  f"（入力の保持に {source.resident_bytes / (1024 * 1024):.0f} MB。"
+                  f"PNG（インターレースなし）か .npy の入力は帯ごとに読み込みます）: {input_path}")
+            step = 1
+
+        # 帯の作業バッファは最初に一度だけ確保して使い回す
+        step = min(step, height)
+        scratch = np.empty((step, width), dtype=np.uint16)
+
+        if output_path.lower().endswith(".npy"):
+            temp_path = temporary_path(output_path)
+            output = np.lib.format.open_memmap(temp_path, mode="w+",
+                                               dtype=np.uint8, shape=(height, width, 4))
+            for top in range(0, height, step):
+                bottom = min(top + step, height)
+                # メモリマップ上の出力先に直接書き込む
+                compute_sdf_texture(source.read_band(top, bottom), out=output[top:bottom],
+                                    scratch=scratch[:bottom - top])
+            output.flush()
+            # メモリマップを閉じてから置き換える
+            del output
+            replace_file(temp_path, output_path)
+        else:
+            band = np.empty((step, width, 4), dtype=np.uint8)
+            with StreamingPNGWriter(output_path, width, height, options.compress_level) as writer:
+                for top in range(0, height, step):
+                    bottom = min(top + step, height)
+                    rows = bottom - top
+                    writer.write_rows(compute_sdf_texture(source.read_band(top, bottom),
+                                                          out=band[:rows], scratch=scratch[:rows]))
+        return True
+    except Exception as e:
+        print(f"ストリーミング処理エラー: {e}")
+        # 書きかけの出力は残さない（出力パスの既存ファイルはそのまま）
+        if temp_path is not None and os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        return False
+    finally:
+        if source is not None:
+            source.close()
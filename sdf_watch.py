@@ -0,0 +1,349 @@
+"""複数ファイル・フォルダの変更監視
+
+1つの Observer で複数のファイルとフォルダを監視し、ファイルごとに書き込みの完了を検出してから通知する。
+書き込み完了は、ファイルのサイズと更新時刻が一定間隔の間変化しないこと
+（Linuxでは書き込みモードで開かれたファイルが閉じられたこと）で判定し、固定時間の待機は行わない。
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+# 書き込み完了の判定間隔（秒）と、変化なしが続く必要のある回数
+DEFAULT_SETTLE_INTERVAL = 0.05
+DEFAULT_SETTLE_CHECKS = 2
+
+# 書き込みが終わらないまま、この時間（秒）を過ぎたファイルは諦める
+DEFAULT_MAX_WAIT = 30.0
+
+# デコード失敗時に書き込み完了の判定をやり直す回数の上限
+DEFAULT_MAX_RETRIES = 5
+
+# 書き込みを表すイベント（closed は Linux で書き込みモードのファイルが閉じられたとき）
+_WRITE_EVENTS = ("created", "modified", "moved", "closed")
+
+
+def _normalize(path: str) -> str:
+    """パスを正規化（Windowsの大文字小文字とスラッシュを統一）"""
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+class LatencyStats:
+    """保存から各段階までの所要時間の統計（直近 max_samples 件）"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.max_samples)).append(seconds)
+
+    def summary(self, name: str) -> Optional[dict]:
+        """件数・平均・中央値・95パーセンタイル・最大（秒）"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        count = len(samples)
+        return {
+            "count": count,
+            "mean": sum(samples) / count,
+            "p50": samples[(count - 1) // 2],
+            "p95": samples[min(count - 1, int(count * 0.95))],
+            "max": samples[-1],
+        }
+
+    def format(self) -> str:
+        with self._lock:
+            names = list(self._samples)
+        lines = []
+        for name in names:
+            s = self.summary(name)
+            if s is not None:
+                lines.append(f"{name}: {s['count']} 件, 平均 {s['mean'] * 1000:.0f} ms, "
+                             f"中央値 {s['p50'] * 1000:.0f} ms, p95 {s['p95'] * 1000:.0f} ms, "
+                             f"最大 {s['max'] * 1000:.0f} ms")
+        return "\n".join(lines)
+
+
+class _PendingFile:
+    """書き込み完了待ちのファイル"""
+
+    def __init__(self, path: str, saved_at: float):
+        self.path = path
+        self.first_event = saved_at
+        self.saved_at = saved_at      # 最後に書き込みが観測された時刻（time.monotonic）
+        self.last_stat: Optional[Tuple[int, int]] = None
+        self.stable_count = 0
+        self.closed = False
+
+
+class _EventHandler:
+    """watchdog のイベントハンドラー（Observer は dispatch() だけを呼ぶため、watchdog を継承せずに済む）"""
+
+    def __init__(self, watcher: "MultiFileWatcher"):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        if event.is_directory or event.event_type not in _WRITE_EVENTS:
+            return
+        # 一時ファイルに書いてから置き換える保存方式では、移動先が対象のファイルになる
+        path = getattr(event, "dest_path", "") or event.src_path
+        self.watcher.notify_changed(path, closed=event.event_type == "closed")
+
+
+class MultiFileWatcher:
+    """複数のファイル・フォルダを1つの Observer で監視するクラス
+
+    on_ready(path, saved_at) は書き込みが完了したファイルごとに監視スレッドから呼ばれる。
+    saved_at は最後に書き込みが観測された時刻（time.monotonic）で、
+    処理完了後に record_output() へ渡すと保存から出力までの時間が統計に記録される。
+    """
+
+    def __init__(self, on_ready: Callable[[str, float], None],
+                 accept: Optional[Callable[[str], bool]] = None,
+                 settle_interval: float = DEFAULT_SETTLE_INTERVAL,
+                 settle_checks: int = DEFAULT_SETTLE_CHECKS,
+                 max_wait: float = DEFAULT_MAX_WAIT,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.on_ready = on_ready
+        self.accept = accept
+        self.settle_interval = settle_interval
+        self.settle_checks = settle_checks
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.stats = LatencyStats()
+
+        self._files: Set[str] = set()
+        self._directories: Dict[str, bool] = {}   # フォルダ → サブフォルダも監視するか
+        self._watches: Dict[Tuple[str, bool], object] = {}
+        self._pending: Dict[str, _PendingFile] = {}
+        self._retries: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._observer = None
+        self._settle_thread = None
+        self._stopping = False
+
+    # 監視対象の管理
+
+    def watch_file(self, path: str):
+        """ファイルを監視対象に追加"""
+        with self._condition:
+            self._files.add(_normalize(path))
+            self._sync_watches()
+
+    def watch_directory(self, path: str, recursive: bool = False):
+        """フォルダ内の（accept を満たす）ファイルを監視対象に追加"""
+        with self._condition:
+            self._directories[_normalize(path)] = recursive
+            self._sync_watches()
+
+    def unwatch(self, path: str):
+        """ファイルまたはフォルダを監視対象から外す"""
+        key = _normalize(path)
+        with self._condition:
+            self._files.discard(key)
+            self._directories.pop(key, None)
+            for pending_key in [k for k in self._pending if not self._matches(k)]:
+                del self._pending[pending_key]
+            self._sync_watches()
+
+    def unwatch_all(self):
+        with self._condition:
+            self._files.clear()
+            self._directories.clear()
+            self._pending.clear()
+            self._sync_watches()
+
+    @property
+    def watched_count(self) -> int:
+        with self._condition:
+            return len(self._files) + len(self._directories)
+
+    def _required_watches(self) -> Set[Tuple[str, bool]]:
+        """必要な (フォルダ, 再帰) の組（ファイルは親フォルダを非再帰で監視する）"""
+        required = set(self._directories.items())
+        for path in self._files:
+            required.add((os.path.dirname(path), False))
+        return required
+
+    def _sync_watches(self):
+        if self._observer is None:
+            return
+        required = self._required_watches()
+        for key in [k for k in self._watches if k not in required]:
+            self._observer.unschedule(self._watches.pop(key))
+        for directory, recursive in required - set(self._watches):
+            if os.path.isdir(directory):
+                self._watches[(directory, recursive)] = self._observer.schedule(
+                    self._handler, directory, recursive=recursive)
+
+    def _matches(self, key: str) -> bool:
+        if key in self._files:
+            return True
+        parent = os.path.dirname(key)
+        for directory, recursive in self._directories.items():
+            if parent == directory or (recursive and parent.startswith(directory + os.sep)):
+                return self.accept is None or self.accept(key)
+        return False
+
+    # 開始・停止
+
+    def start(self):
+        """監視を開始（開始前に追加した監視対象も有効になる）"""
+        with self._condition:
+            if self._observer is not None:
+                return
+            # watchdog は監視を始めるときに読み込む（起動と sdf_cli の batch を速くするため）
+            from watchdog.observers import Observer
+
+            self._stopping = False
+            self._handler = _EventHandler(self)
+            self._observer = Observer()
+            self._sync_watches()
+        self._observer.start()
+        self._settle_thread = threading.Thread(target=self._settle_loop,
+                                               name="SDFWatchSettle", daemon=True)
+        self._settle_thread.start()
+
+    def stop(self):
+        """監視を停止"""
+        with self._condition:
+            observer = self._observer
+            if observer is None:
+                return
+            self._observer = None
+            self._watches.clear()
+            self._pending.clear()
+            self._stopping = True
+            self._condition.notify_all()
+        observer.stop()
+        observer.join()
+        self._settle_thread.join()
+        self._settle_thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._observer is not None
+
+    # 書き込み完了の検出
+
+    def notify_changed(self, path: str, closed: bool = False):
+        """ファイルへの書き込みを通知（監視スレッドから呼ばれる）"""
+        key = _normalize(path)
+        now = time.monotonic()
+        with self._condition:
+            if not self._matches(key):
+                return
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _PendingFile(path, now)
+                # 新しい保存なので、デコード失敗による再試行回数をリセット
+                self._retries.pop(key, None)
+            else:
+                pending.saved_at = now
+                pending.stable_count = 0
+            pending.closed = closed
+            self._condition.notify()
+
+    def retry(self, path: str, saved_at: float) -> bool:
+        """デコードに失敗したファイルの書き込み完了判定をやり直す（上限を超えたら False）"""
+        key = _normalize(path)
+        with self._condition:
+            count = self._retries.get(key, 0) + 1
+            if count > self.max_retries or self._observer is None:
+                self._retries.pop(key, None)
+                return False
+            self._retries[key] = count
+            if key not in self._pending:
+                pending = self._pending[key] = _PendingFile(path, saved_at)
+                # 再試行時は直前の状態から変化がないことを改めて確認する
+                pending.last_stat = self._stat(key)
+            self._condition.notify()
+            return True
+
+    def record_output(self, saved_at: float) -> float:
+        """出力の完了を記録し、保存から出力までの時間（秒）を返す"""
+        latency = time.monotonic() - saved_at
+        self.stats.add("保存→出力", latency)
+        return latency
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def _readable(path: str) -> bool:
+        """他のプロセスが排他的に開いていないか（Windowsでは書き込み中のファイルを開けないことがある）"""
+        try:
+            with open(path, "rb"):
+                return True
+        except OSError:
+            return False
+
+    def _settle_loop(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                # 新しいイベントで起こされても、判定間隔は短くしない
+                deadline = time.monotonic() + self.settle_interval
+                remaining = self.settle_interval
+                while not self._stopping and remaining > 0:
+                    self._condition.wait(remaining)
+                    remaining = deadline - time.monotonic()
+                if self._stopping:
+                    return
+                candidates = [(key, pending, pending.saved_at) for key, pending in self._pending.items()]
+
+            # ファイルの状態の取得はロックの外で行い、比較と判定の更新はロックを取って行う
+            stats = [(key, pending, saved_at, self._stat(key)) for key, pending, saved_at in candidates]
+            settled = []
+            with self._condition:
+                for key, pending, saved_at, stat in stats:
+                    # 取得中に新しい書き込みがあった場合は、次の判定で比べ直す
+                    if self._pending.get(key) is not pending or pending.saved_at != saved_at:
+                        continue
+                    if stat is None or stat[0] == 0:
+                        # 削除→リネームによる保存の途中や、書き込み開始直後
+                        pending.last_stat = stat
+                        pending.stable_count = 0
+                    elif pending.closed or stat == pending.last_stat:
+                        pending.stable_count += 1
+                        pending.last_stat = stat
+                        if pending.closed or pending.stable_count >= self.settle_checks:
+                            settled.append((key, pending, saved_at))
+                    else:
+                        pending.last_stat = stat
+                        pending.stable_count = 0
+
+            ready = []
+            readable = {key: self._readable(key) for key, _, _ in settled}
+            now = time.monotonic()
+            with self._condition:
+                for key, pending, saved_at in settled:
+                    # 判定中に新しい書き込みがあった場合は待ち直す
+                    if self._pending.get(key) is pending and pending.saved_at == saved_at and readable[key]:
+                        del self._pending[key]
+                        ready.append(pending)
+                for key, pending, _ in candidates:
+                    if self._pending.get(key) is pending and now - pending.first_event > self.max_wait:
+                        print(f"書き込みが完了しないため監視をスキップしました: {pending.path}")
+                        del self._pending[key]
+
+            for pending in ready:
+                self.stats.add("保存→検出", time.monotonic() - pending.saved_at)
+                try:
+                    self.on_ready(pending.path, pending.saved_at)
+                except Exception as e:
+                    print(f"ファイル監視コールバックエラー: {e}")
@@ -0,0 +1,133 @@
+"""GUI用のバックグラウンド処理
+
+重い処理（デコード・SDF生成・PNG保存）をUIスレッドから切り離して実行する。
+同じキー（入力ファイルなど）の要求は最新の1件にまとめ、新しい要求が来たら処理中の古いジョブは中止する。
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class JobCancelled(Exception):
+    """ジョブが新しい要求によって中止されたことを表す例外"""
+
+
+class Job:
+    """バックグラウンドで実行する1件の処理"""
+
+    def __init__(self, key: Hashable, func: Callable[["Job"], Any],
+                 on_done: Optional[Callable[[Any], None]] = None,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self.key = key
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check_cancelled(self):
+        """中止されていれば JobCancelled を送出（処理の区切りごとに呼ぶ）"""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def wait(self, seconds: float):
+        """指定時間待つ（中止された場合はすぐに JobCancelled を送出）"""
+        if self._cancelled.wait(seconds):
+            raise JobCancelled()
+
+
+class ProcessingWorker:
+    """ジョブキューを処理するワーカースレッド
+
+    完了・失敗時のコールバックと処理中状態の通知は dispatch 経由で呼び出すので、
+    dispatch にUIスレッドへ処理を渡す関数を指定すればコールバックはUIスレッドで実行される。
+    """
+
+    def __init__(self, dispatch: Callable[[Callable[[], None]], None],
+                 on_busy_changed: Optional[Callable[[bool], None]] = None):
+        self.dispatch = dispatch
+        self.on_busy_changed = on_busy_changed
+        self.coalesced = 0
+        self.cancelled = 0
+        self._pending = OrderedDict()
+        self._running = None
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._busy = False  # ワーカースレッドのみが参照する
+        self._thread = threading.Thread(target=self._run, name="SDFProcessingWorker", daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Hashable, func: Callable[[Job], Any],
+               on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None) -> Job:
+        """ジョブを登録（同じキーの未処理ジョブは置き換え、処理中のジョブは中止する）"""
+        job = Job(key, func, on_done, on_error)
+        with self._condition:
+            if key in self._pending:
+                del self._pending[key]
+                self.coalesced += 1
+            if self._running is not None and self._running.key == key:
+                self._running.cancel()
+            self._pending[key] = job
+            self._condition.notify()
+        return job
+
+    @property
+    def busy(self) -> bool:
+        with self._condition:
+            return self._running is not None or bool(self._pending)
+
+    def _notify_busy(self, busy: bool):
+        if self.on_busy_changed is not None:
+            self.dispatch(lambda: self.on_busy_changed(busy))
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                _, job = self._pending.popitem(last=False)
+                self._running = job
+
+            if not self._busy:
+                self._busy = True
+                self._notify_busy(True)
+
+            try:
+                result = job.func(job)
+                job.check_cancelled()
+            except JobCancelled:
+                self.cancelled += 1
+            except Exception as e:
+                if job.on_error is not None:
+                    self.dispatch(lambda e=e, job=job: job.on_error(e))
+                else:
+                    print(f"バックグラウンド処理エラー: {e}")
+            else:
+                if job.on_done is not None:
+                    self.dispatch(lambda result=result, job=job: job.on_done(result))
+
+            with self._condition:
+                self._running = None
+                idle = not self._pending
+            if idle:
+                self._busy = False
+                self._notify_busy(False)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """ワーカーを停止（処理中のジョブには中止を通知し、終了を最大 timeout 秒待つ）"""
+        with self._condition:
+            self._stopping = True
+            self._pending.clear()
+            if self._running is not None:
+                self._running.cancel()
+            self._condition.notify_all()
+        self._thread.join(timeout)
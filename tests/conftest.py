@@ -0,0 +1,5 @@
+import os
+import sys
+
+# テストからリポジトリ直下のモジュールを読み込む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
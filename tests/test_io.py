@@ -0,0 +1,121 @@
+"""画像の読み込みとデコード結果のキャッシュ"""
+import io
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import sdf_io
+from sdf_io import ImageCache
+
+
+def save_image(path: str, value: int):
+    Image.fromarray(np.full((16, 16, 4), value, dtype=np.uint8)).save(path)
+
+
+def test_concurrent_loads_of_same_file_decode_once(tmp_path, monkeypatch):
+    path = str(tmp_path / "a.png")
+    save_image(path, 10)
+    calls = []
+    decode = sdf_io.decode_image
+
+    def slow_decode(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.1)
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(sdf_io, "decode_image", slow_decode)
+    cache = ImageCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.load(path))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats()["misses"] == 1
+
+
+def test_different_files_decode_in_parallel(tmp_path, monkeypatch):
+    paths = [str(tmp_path / f"{index}.png") for index in range(4)]
+    for index, path in enumerate(paths):
+        save_image(path, index)
+    decode = sdf_io.decode_image
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_decode(*args, **kwargs):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.1)
+        with lock:
+            active.pop()
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(sdf_io, "decode_image", slow_decode)
+    cache = ImageCache()
+    threads = [threading.Thread(target=cache.load, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) > 1
+
+
+def test_failed_load_is_not_cached(tmp_path):
+    path = str(tmp_path / "broken.png")
+    with open(path, "wb") as f:
+        f.write(b"not an image")
+    cache = ImageCache()
+    for _ in range(2):
+        try:
+            cache.load(path)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("壊れた画像が読み込めてしまった")
+    assert cache.stats()["misses"] == 2
+
+
+def pillow_decode(data: bytes) -> np.ndarray:
+    with Image.open(io.BytesIO(data)) as image:
+        return np.asarray(image.convert("RGBA"))
+
+
+def encode(image: Image.Image, image_format: str = "PNG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+BASE = np.random.default_rng(0).integers(0, 256, (20, 30, 4)).astype(np.uint8)
+
+
+DECODE_CASES = [
+    ("rgba", encode(Image.fromarray(BASE)), ".png"),
+    ("rgb", encode(Image.fromarray(BASE[:, :, :3])), ".png"),
+    ("gray", encode(Image.fromarray(BASE[:, :, 0])), ".png"),
+    ("gray_alpha", encode(Image.fromarray(BASE).convert("LA")), ".png"),
+    ("gray_trns", encode(Image.fromarray(BASE[:, :, 0]), transparency=int(BASE[0, 0, 0])), ".png"),
+    ("rgb_trns", encode(Image.fromarray(BASE[:, :, :3]), transparency=tuple(int(v) for v in BASE[0, 0, :3])),
+     ".png"),
+    ("palette", encode(Image.fromarray(BASE[:, :, :3]).quantize(40)), ".png"),
+    ("palette_trns", encode(Image.fromarray(BASE[:, :, :3]).quantize(40), transparency=2), ".png"),
+    ("palette_alpha", encode(Image.fromarray(BASE).quantize(40, method=Image.Quantize.FASTOCTREE)), ".png"),
+    ("bilevel", encode(Image.fromarray(BASE[:, :, 0] > 128)), ".png"),
+    ("gray16", encode(Image.fromarray(BASE[:, :, 0].astype(np.uint16) * 257)), ".png"),
+    ("jpeg", encode(Image.fromarray(BASE[:, :, :3]), "JPEG"), ".jpg"),
+    ("jpeg_cmyk", encode(Image.fromarray(BASE).convert("CMYK"), "JPEG"), ".jpg"),
+]
+
+
+@pytest.mark.parametrize("name, data, extension", DECODE_CASES, ids=[case[0] for case in DECODE_CASES])
+def test_decode_matches_pillow(name, data, extension):
+    decoded = sdf_io.decode_image(np.frombuffer(data, dtype=np.uint8), extension)
+    np.testing.assert_array_equal(decoded.pixels, pillow_decode(data))
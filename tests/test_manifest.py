@@ -0,0 +1,111 @@
+"""マニフェストによる再生成の判定"""
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+import sdf_cli
+from sdf_manifest import MANIFEST_VERSION, BuildManifest
+from sdf_output import save_png
+
+
+@pytest.fixture
+def gradient(tmp_path):
+    ramp = np.linspace(0, 255, 64).astype(np.uint8)
+    rgba = np.zeros((64, 64, 4), dtype=np.uint8)
+    rgba[:, :, :3] = ramp[None, :, None]
+    rgba[:, :, 3] = 255
+    path = str(tmp_path / "face.png")
+    save_png(rgba, path)
+    return path
+
+
+def run_batch(gradient, tmp_path, capsys, *options) -> str:
+    """batch を実行し、マニフェストの集計の行を返す"""
+    manifest = str(tmp_path / "manifest.json")
+    assert sdf_cli.main(["batch", gradient, "-j", "1", "--manifest", manifest, *options]) == 0
+    return capsys.readouterr().out.strip().splitlines()[-1]
+
+
+REBUILT = "マニフェスト: 最新 0 件 / 再生成 1 件"
+SKIPPED = "マニフェスト: 最新 1 件 / 再生成 0 件"
+
+
+def test_unchanged_settings_are_skipped(gradient, tmp_path, capsys):
+    assert run_batch(gradient, tmp_path, capsys, "--mipmaps") == REBUILT
+    assert run_batch(gradient, tmp_path, capsys, "--mipmaps") == SKIPPED
+    # ミップマップを出力しない場合、フィルタの違いでは再生成しない
+    assert run_batch(gradient, tmp_path, capsys) == REBUILT
+    assert run_batch(gradient, tmp_path, capsys, "--mip-filter", "box") == SKIPPED
+
+
+def test_mipmaps_option_regenerates(gradient, tmp_path, capsys):
+    run_batch(gradient, tmp_path, capsys)
+    assert not glob.glob(str(tmp_path / "face_SDF_mip*.png"))
+
+    assert run_batch(gradient, tmp_path, capsys, "--mipmaps") == REBUILT
+    assert glob.glob(str(tmp_path / "face_SDF_mip*.png"))
+
+
+def test_missing_mip_level_regenerates(gradient, tmp_path, capsys):
+    run_batch(gradient, tmp_path, capsys, "--mipmaps")
+    levels = sorted(glob.glob(str(tmp_path / "face_SDF_mip*.png")))
+    assert len(levels) == 6
+
+    os.remove(levels[-1])
+    assert run_batch(gradient, tmp_path, capsys, "--mipmaps") == REBUILT
+    assert os.path.exists(levels[-1])
+
+
+@pytest.mark.parametrize("first, second", [
+    (["--format", "dds", "--dds-format", "bc5"], ["--format", "dds", "--dds-format", "bc4"]),
+    (["--format", "dds", "--dds-quality", "0"], ["--format", "dds", "--dds-quality", "2"]),
+    (["--mipmaps"], ["--mipmaps", "--mip-filter", "box"]),
+    (["--compression", "fast"], ["--compression", "small"]),
+    ([], ["--compact-channels"]),
+])
+def test_output_option_change_regenerates(gradient, tmp_path, capsys, first, second):
+    assert run_batch(gradient, tmp_path, capsys, *first) == REBUILT
+    assert run_batch(gradient, tmp_path, capsys, *first) == SKIPPED
+    assert run_batch(gradient, tmp_path, capsys, *second) == REBUILT
+
+
+def test_old_manifest_version_is_discarded(gradient, tmp_path, capsys):
+    run_batch(gradient, tmp_path, capsys)
+    manifest = BuildManifest(str(tmp_path / "manifest.json"))
+    assert manifest.entries
+    with open(manifest.path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION - 1, "entries": manifest.entries}, f)
+    assert run_batch(gradient, tmp_path, capsys) == REBUILT
+
+
+def dds_fourcc(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(88)[84:88]
+
+
+@pytest.mark.parametrize("option", [["--dds-quality", "2"], ["--dds-flip-y"]])
+def test_dds_option_change_regenerates(gradient, tmp_path, capsys, option):
+    assert run_batch(gradient, tmp_path, capsys, "--format", "dds") == REBUILT
+    assert run_batch(gradient, tmp_path, capsys, "--format", "dds", *option) == REBUILT
+    assert run_batch(gradient, tmp_path, capsys, "--format", "dds", *option) == SKIPPED
+
+
+def test_dds_format_change_rewrites_output(gradient, tmp_path, capsys):
+    output = str(tmp_path / "face_SDF.dds")
+    run_batch(gradient, tmp_path, capsys, "--format", "dds", "--dds-format", "bc5")
+    assert dds_fourcc(output) == b"ATI2"
+
+    assert run_batch(gradient, tmp_path, capsys, "--format", "dds", "--dds-format", "bc4") == REBUILT
+    assert dds_fourcc(output) == b"ATI1"
+
+
+def test_batch_with_mipmaps_ignores_its_own_outputs(gradient, tmp_path):
+    # フォルダ指定で再実行しても、前回のミップのファイル（face_SDF_mip<n>.png）を入力として扱わない
+    assert sdf_cli.main(["batch", str(tmp_path), "-j", "1", "--mipmaps"]) == 0
+    outputs = sorted(os.listdir(tmp_path))
+    assert "face_SDF_mip1.png" in outputs
+    assert sdf_cli.main(["batch", str(tmp_path), "-j", "1", "--mipmaps"]) == 0
+    assert sorted(os.listdir(tmp_path)) == outputs
@@ -0,0 +1,22 @@
+"""バックグラウンドの書き込みスレッド"""
+import numpy as np
+import pytest
+
+from sdf_output import OutputWriter
+
+
+def test_writer_keeps_running_after_save_error(tmp_path):
+    writer = OutputWriter()
+
+    def broken_save(rgba, output_path):
+        raise OSError("書き込めません")
+
+    rgba = np.zeros((4, 4, 4), dtype=np.uint8)
+    failed = writer.submit(rgba, str(tmp_path / "broken.png"), save=broken_save)
+    written = writer.submit(rgba, str(tmp_path / "ok.png"))
+
+    with pytest.raises(OSError, match="書き込めません"):
+        failed.result(timeout=5)
+    assert written.result(timeout=5).success
+    assert (tmp_path / "ok.png").exists()
+    writer.close(timeout=5)
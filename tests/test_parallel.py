@@ -0,0 +1,36 @@
+"""行の帯に分けた並列処理"""
+import threading
+
+import sdf_parallel
+from sdf_parallel import band_ranges, run_bands
+
+
+def test_replaced_pool_stays_usable_until_its_callers_finish():
+    with sdf_parallel._shared_executor(2) as old:
+        # 別の呼び出しがより多くのスレッドを要求して、共有のプールが作り直される
+        with sdf_parallel._shared_executor(64) as new:
+            assert new is not old
+        assert old.submit(lambda: 1).result() == 1
+    # 最後の使用者が終わったら古いプールは停止する
+    assert old not in sdf_parallel._executor_users
+    assert old._shutdown
+
+
+def test_concurrent_calls_with_growing_thread_counts():
+    ranges = band_ranges(512, 8, 16)
+    errors = []
+
+    def call(threads):
+        try:
+            for _ in range(20):
+                assert run_bands(lambda top, bottom: bottom - top, ranges, threads) == \
+                    [bottom - top for top, bottom in ranges]
+        except Exception as e:
+            errors.append(e)
+
+    callers = [threading.Thread(target=call, args=(threads,)) for threads in range(2, 10)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert errors == []
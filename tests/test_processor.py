@@ -0,0 +1,98 @@
+"""SDFProcessor の結果の配列"""
+import numpy as np
+from PIL import Image
+
+import sdf_processor
+from sdf_processor import SDFProcessor, generate_sdf
+
+
+def make_gradient(value: int, height: int = 32, width: int = 48) -> np.ndarray:
+    gradient = np.zeros((height, width, 4), dtype=np.uint8)
+    gradient[:, :, :3] = (np.arange(width) * 255 // (width - 1) // 2 + value).astype(np.uint8)[None, :, None]
+    gradient[:, :, 3] = 255
+    return gradient
+
+
+def test_create_sdf_returns_new_array_each_call():
+    processor = SDFProcessor()
+    processor.gradient_image = make_gradient(0)
+    first = processor.create_sdf_from_gradient()
+    expected = first.copy()
+
+    processor.gradient_image = make_gradient(10)
+    second = processor.create_sdf_from_gradient()
+
+    assert second is not first
+    # 出力バッファは保持せず、作業バッファだけを使い回す
+    assert set(processor._buffers) == {"scratch"}
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(second, generate_sdf(make_gradient(10)))
+
+
+def test_reuse_buffers_writes_into_same_array():
+    processor = SDFProcessor()
+    processor.reuse_buffers = True
+    processor.gradient_image = make_gradient(0)
+    first = processor.create_sdf_from_gradient()
+    processor.gradient_image = make_gradient(10)
+    second = processor.create_sdf_from_gradient()
+
+    assert second is first
+    np.testing.assert_array_equal(second, generate_sdf(make_gradient(10)))
+
+
+def test_incremental_update_keeps_previous_result():
+    processor = SDFProcessor()
+    processor.incremental = True
+    # 変更が一部のタイルに収まる大きさ
+    processor.gradient_image = make_gradient(0, 256, 384)
+    processor.process_sdf()
+    first = processor.result_image
+    expected = first.copy()
+
+    edited = make_gradient(0, 256, 384)
+    edited[4:8, 4:8, :3] = 200
+    processor.gradient_image = edited
+    processor.process_sdf()
+
+    assert processor.last_changes is not None
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(processor.result_image, generate_sdf(edited))
+
+
+def test_display_and_mip_results_are_copies():
+    processor = SDFProcessor()
+    processor.reuse_buffers = True
+    processor.gradient_image = make_gradient(0)
+    processor.process_sdf()
+    display = processor.get_result_for_display()
+    level0 = processor.get_mip_chain()[0]
+    expected = processor.result_image.copy()
+
+    processor.gradient_image = make_gradient(10)
+    processor.process_sdf()
+
+    np.testing.assert_array_equal(np.asarray(display), expected)
+    np.testing.assert_array_equal(level0, expected)
+
+
+def test_mask_sequence_is_loaded_through_image_cache(tmp_path, monkeypatch):
+    paths = []
+    for index in range(3):
+        mask = np.zeros((16, 16), dtype=np.uint8)
+        mask[:, :4 + index * 4] = 255
+        path = str(tmp_path / f"マスク{index}.png")
+        Image.fromarray(mask).save(path)
+        paths.append(path)
+    loaded = []
+    load_image = sdf_processor.load_image
+
+    def recording_load(image_path, *args):
+        loaded.append(image_path)
+        return load_image(image_path, *args)
+
+    monkeypatch.setattr(sdf_processor, "load_image", recording_load)
+    processor = SDFProcessor()
+    assert processor.load_mask_sequence(paths)
+    assert loaded == paths
+    assert processor.gradient_image.shape == (16, 16, 4)
@@ -0,0 +1,31 @@
+"""処理段階ごとの計測"""
+import json
+import sys
+
+import numpy as np
+import pytest
+
+from sdf_profile import Profiler
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="現在のメモリは Linux（/proc）でのみ取得できる")
+def test_rss_delta_is_per_stage(tmp_path):
+    log_path = tmp_path / "profile.jsonl"
+    profiler = Profiler()
+    profiler.enable(str(log_path))
+    with profiler.stage("decode"):
+        # 段階の中で確保して保持するメモリ
+        held = np.ones(64 * 1024 * 1024, dtype=np.uint8)
+    with profiler.stage("png_encode"):
+        pass
+    profiler.disable()
+
+    latest = profiler.latest()
+    assert latest["decode"].rss_delta_mb > 50
+    # 前の段階の使用量は後の段階に含まれない
+    assert abs(latest["png_encode"].rss_delta_mb) < 10
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["stage"] for record in records] == ["decode", "png_encode"]
+    assert records[0]["rss_delta_mb"] > 50
+    assert "プロセスのピーク" in profiler.format_status()
+    del held
@@ -0,0 +1,35 @@
+"""常駐サーバーの要求の処理"""
+import numpy as np
+import pytest
+
+from sdf_client import SDFClient, ServerError
+from sdf_processor import generate_sdf
+from sdf_server import SDFServer
+
+
+@pytest.fixture
+def server():
+    server = SDFServer(port=0, workers=1)
+    server.start()
+    yield server
+    server.shutdown()
+
+
+def test_pixels_round_trip(server):
+    source = np.random.default_rng(0).integers(0, 256, (24, 32, 4), dtype=np.uint8)
+    with SDFClient(*server.address) as client:
+        result = client.process_pixels(source.tobytes(), 32, 24)
+    np.testing.assert_array_equal(np.frombuffer(result.pixels, np.uint8).reshape(24, 32, 4),
+                                  generate_sdf(source))
+
+
+def test_generation_error_reaches_client(server, tmp_path):
+    source = np.zeros((24, 32, 4), dtype=np.uint8)
+    missing_layout = str(tmp_path / "missing_layout.json")
+    with SDFClient(*server.address) as client:
+        with pytest.raises(ServerError) as error:
+            client.process_pixels(source.tobytes(), 32, 24, layout=missing_layout)
+        assert "missing_layout.json" in str(error.value)
+        assert "SDF処理に失敗しました" not in str(error.value)
+        # 失敗の後も同じ接続で処理を続けられる
+        assert client.ping()["ok"]
@@ -0,0 +1,122 @@
+"""ストリーミング処理の入力（帯ごとのPNGの展開）"""
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from sdf_processor import generate_sdf
+from sdf_stream import BandSource, process_streaming
+
+HEIGHT, WIDTH = 37, 53
+
+
+def make_pixels(channels: int, dtype=np.uint8) -> np.ndarray:
+    rng = np.random.default_rng(channels)
+    y, x = np.mgrid[:HEIGHT, :WIDTH]
+    ramp = np.stack([x * 5 + y, y * 7, x * y, x + y * 3][:channels], axis=-1)
+    maximum = np.iinfo(dtype).max
+    return ((ramp * (maximum // 255) + rng.integers(0, maximum // 8, ramp.shape)) % maximum).astype(dtype)
+
+
+def paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def encode_png(pixels: np.ndarray, color_type: int) -> bytes:
+    """行ごとにフィルタ0〜4を順に使うPNG（8bit / 16bit）"""
+    bit_depth = pixels.dtype.itemsize * 8
+    rows = pixels.astype(pixels.dtype.newbyteorder(">")).reshape(HEIGHT, -1).view(np.uint8)
+    bpp = rows.shape[1] // WIDTH
+    previous = np.zeros(rows.shape[1], dtype=np.int64)
+    data = bytearray()
+    for index, row in enumerate(rows.astype(np.int64)):
+        kind = index % 5
+        filtered = []
+        for i, value in enumerate(row):
+            left = row[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            upper_left = previous[i - bpp] if i >= bpp else 0
+            predictor = (0, left, up, (left + up) // 2, paeth(left, up, upper_left))[kind]
+            filtered.append((value - predictor) % 256)
+        data += bytes([kind]) + bytes(filtered)
+        previous = row
+
+    def chunk(chunk_type: bytes, body: bytes) -> bytes:
+        return (struct.pack(">I", len(body)) + chunk_type + body
+                + struct.pack(">I", zlib.crc32(body, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+    compressed = zlib.compress(bytes(data))
+    # IDATを複数のチャンクに分ける
+    idat = b"".join(chunk(b"IDAT", compressed[i:i + 97]) for i in range(0, len(compressed), 97))
+    header = struct.pack(">IIBBBBB", WIDTH, HEIGHT, bit_depth, color_type, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + idat + chunk(b"IEND", b"")
+
+
+def read_all(path: str, band_rows: int) -> np.ndarray:
+    source = BandSource(path)
+    try:
+        assert source.streamed
+        return np.concatenate([source.read_band(top, min(top + band_rows, source.height))
+                               for top in range(0, source.height, band_rows)])
+    finally:
+        source.close()
+
+
+@pytest.mark.parametrize("channels, color_type, dtype", [
+    (1, 0, np.uint8), (2, 4, np.uint8), (3, 2, np.uint8), (4, 6, np.uint8),
+    (1, 0, np.uint16), (2, 4, np.uint16), (3, 2, np.uint16), (4, 6, np.uint16),
+])
+@pytest.mark.parametrize("band_rows", [1, 7, HEIGHT])
+def test_all_filters_match_pillow(tmp_path, channels, color_type, dtype, band_rows):
+    path = str(tmp_path / "input.png")
+    with open(path, "wb") as f:
+        f.write(encode_png(make_pixels(channels, dtype), color_type))
+    with Image.open(path) as image:
+        expected = np.asarray(image.convert("RGBA"))
+    np.testing.assert_array_equal(read_all(path, band_rows), expected)
+
+
+@pytest.mark.parametrize("mode, options", [
+    ("P", {}), ("P", {"transparency": 3}), ("P", {"bits": 4}),
+    ("L", {"transparency": 17}), ("RGB", {"transparency": (10, 20, 30)}), ("1", {}),
+])
+def test_palette_and_transparency_match_pillow(tmp_path, mode, options):
+    image = Image.fromarray(make_pixels(3))
+    image = image.quantize(12 if options.get("bits") else 50) if mode == "P" else image.convert(mode)
+    path = str(tmp_path / "input.png")
+    image.save(path, **options)
+    with Image.open(path) as image:
+        expected = np.asarray(image.convert("RGBA"))
+    np.testing.assert_array_equal(read_all(path, 5), expected)
+
+
+def test_streaming_output_matches_generate_sdf(tmp_path):
+    source = make_pixels(4)
+    path = str(tmp_path / "input.png")
+    Image.fromarray(source).save(path)
+    output = str(tmp_path / "output.png")
+    assert process_streaming(path, output, band_rows=6)
+    with Image.open(output) as image:
+        np.testing.assert_array_equal(np.asarray(image), generate_sdf(source))
+
+
+def test_does_not_change_pillow_limit(tmp_path):
+    path = str(tmp_path / "input.png")
+    Image.fromarray(make_pixels(4)).save(path)
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = 100
+    try:
+        assert read_all(path, 8).shape == (HEIGHT, WIDTH, 4)
+        # 画像全体をデコードする形式には、展開爆弾チェックがそのまま適用される
+        bmp = str(tmp_path / "input.bmp")
+        Image.fromarray(make_pixels(3)).save(bmp)
+        with pytest.raises(Image.DecompressionBombError):
+            BandSource(bmp)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
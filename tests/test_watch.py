@@ -0,0 +1,31 @@
+"""書き込み完了の検出"""
+import threading
+
+from sdf_watch import MultiFileWatcher
+
+
+def test_write_during_stat_restarts_settling(tmp_path):
+    path = tmp_path / "face.png"
+    path.write_bytes(b"data")
+    ready = threading.Event()
+    stat_calls = []
+
+    watcher = MultiFileWatcher(lambda p, saved_at: ready.set(), settle_interval=0.02, settle_checks=1)
+
+    def stat_while_writing(key):
+        stat_calls.append(key)
+        if len(stat_calls) <= 3:
+            # 状態の取得中に別のスレッドが書き込みを通知する
+            watcher.notify_changed(str(path))
+        return 4, 0
+
+    watcher._stat = stat_while_writing
+    watcher.watch_file(str(path))
+    watcher.start()
+    try:
+        watcher.notify_changed(str(path))
+        assert ready.wait(5)
+    finally:
+        watcher.stop()
+    # 書き込みの通知があった回の状態は判定に使われない
+    assert len(stat_calls) >= 4